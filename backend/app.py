@@ -1,28 +1,85 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from dotenv import load_dotenv
 import os
 import json
+import threading
+import time
 from datetime import datetime
 
 from utils.google_doc_converter import convert_google_doc_to_json
-from utils.analyzer import analyze_weekly_entries
-from utils.long_term_analyzer import analyze_long_term_trends, compare_time_periods
+from utils.long_term_analyzer import NO_SUMMARIES_ERROR, analyze_long_term_trends, compare_time_periods
+from utils.llm_scheduler import get_scheduler
+from utils.metrics import observe_request, render_metrics
+from utils.timing import finish_request, log_request, server_timing_header, span, start_request, timed
+from utils.usage import GROUP_BY_FIELDS, load_usage, reset_usage_context, set_usage_context, summarize_usage
+from utils.sentiment import annotate_entry
+from utils.semantic_search import SORT_ORDERS, search_entries
+from utils.fulltext_index import search_caseload, QuerySyntaxError
+from utils.indexing import on_entries_written
+from utils.topic_trends import get_topic_series
+from utils.sentiment_series import get_sentiment_series, DEFAULT_MAX_POINTS
+from utils.cohort_archive import SEVERITIES, cohort_topics, latest_weeks, weekly_cohort_stats
+from utils.auto_analysis import auto_analysis_enabled, get_debouncer, schedule_reanalysis
+from utils.weekly_scheduler import get_weekly_scheduler, weekly_scheduler_enabled
+from utils.storage import DAILY_ENTRY_PATTERN, SUMMARY_FILE_PATTERN, patient_lock, summary_week_range, write_json
+from utils.weekly_pipeline import ANALYSIS_MODES, aggregate_week_entries, analyze_and_save_week, build_weekly_data
 
 # Load environment variables
 load_dotenv()
 
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Counts response serialization as a Server-Timing span"""
+
+    def dumps(self, obj, **kwargs):
+        with span('serialize'):
+            return super().dumps(obj, **kwargs)
+
+
 app = Flask(__name__)
-CORS(app)
+app.json = TimedJSONProvider(app)
+CORS(app, expose_headers=['Server-Timing'])
 
 # Configuration
 FRONTEND_URL = os.getenv('FRONTEND_URL', 'http://localhost:3000')
 
-# Data folder is now in backend directory
-BASE_DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+# Data folder is now in backend directory (BASE_DATA_DIR overrides it, e.g. for load tests)
+BASE_DATA_DIR = os.getenv('BASE_DATA_DIR') or os.path.join(os.path.dirname(__file__), 'data')
 PATIENTS_REGISTRY_PATH = os.path.join(BASE_DATA_DIR, 'patients.json')
 
 
+_runners_lock = threading.Lock()
+_runners_started = False
+
+
+def start_background_runners():
+    """
+    Start the opt-in background work of a serving process
+
+    Called from the server's startup hook (gunicorn post_worker_init, the ASGI
+    lifespan, `python app.py`), never at import, so scripts, benchmarks and a
+    REPL that import this module make no LLM calls. Idempotent: a gunicorn
+    worker serving the ASGI app runs both hooks but starts the runners once.
+    """
+    global _runners_started
+    with _runners_lock:
+        if _runners_started:
+            return
+        _runners_started = True
+
+    # Pick up weeks left dirty by a previous process (debounced re-analysis)
+    if auto_analysis_enabled() and os.path.isdir(BASE_DATA_DIR):
+        get_debouncer().resume(BASE_DATA_DIR)
+
+    # Close each patient's week at local midnight and pre-compute the summary
+    if weekly_scheduler_enabled():
+        get_weekly_scheduler(BASE_DATA_DIR, load_patient_registry).start()
+
+
+@timed('registry')
 def load_patient_registry():
     """Load patient metadata from registry or infer from directories"""
     if os.path.exists(PATIENTS_REGISTRY_PATH):
@@ -47,6 +104,7 @@ def load_patient_registry():
     return patients
 
 
+@timed('resolve_dir')
 def resolve_patient_dir(patient_id):
     """Return the storage directory for a patient without creating it"""
     candidate = os.path.join(BASE_DATA_DIR, patient_id)
@@ -59,17 +117,18 @@ def resolve_patient_dir(patient_id):
     raise FileNotFoundError(f"Patient '{patient_id}' not found")
 
 
-def extract_week_range(filename):
-    """Parse week start/end dates from a summary filename"""
-    if not filename.startswith('summary_'):
-        return None, None
+def read_json_file(path):
+    """Load a JSON file, timing the read and the parse as separate spans"""
+    with span('read'):
+        with open(path, 'r') as f:
+            text = f.read()
+    with span('parse'):
+        return json.loads(text)
 
-    week_part = filename.replace('summary_', '').replace('.json', '')
-    if '_to_' in week_part:
-        start, end = week_part.split('_to_')
-        return start, end
 
-    return None, None
+def extract_week_range(filename):
+    """Parse week start/end dates from a summary filename"""
+    return summary_week_range(filename) or (None, None)
 
 
 def build_weekly_analysis(summary_data, patient_id, filename):
@@ -117,12 +176,100 @@ def build_weekly_analysis(summary_data, patient_id, filename):
     }
 
 
+def analysis_error(analysis):
+    """Error body for a failed analysis (sent with analysis_error_status)"""
+    return {
+        "error": analysis.get('error', 'Analysis failed'),
+        "details": analysis.get('exception')
+    }
+
+
+def analysis_error_status(analysis):
+    """404 when there was nothing to analyze (no LLM call was made), 502 when the LLM call failed"""
+    return 404 if analysis.get('error') == NO_SUMMARIES_ERROR else 502
+
+
+def analysis_failed_response(analysis):
+    """Report a failed analysis without writing it to disk"""
+    return jsonify(analysis_error(analysis)), analysis_error_status(analysis)
+
+
+def failed_period_analysis(comparison):
+    """The first period analysis of a comparison that failed, or None"""
+    for period in ('period_1', 'period_2'):
+        analysis = comparison[period]['analysis']
+        if 'error' in analysis:
+            return analysis
+    return None
+
+
+def build_week_response(analysis, weekly_data, shared):
+    """Simple 3-section response (theme, summary, plan) for a weekly analysis"""
+    # Build simple summary text
+    mood_trends = analysis.get('mood_trends', {})
+    patterns = analysis.get('patterns', [])
+
+    summary_text = f"Week of {weekly_data['week_start']} to {weekly_data['week_end']}. "
+    summary_text += f"Analyzed {len(weekly_data.get('entries', []))} journal entries. "
+    summary_text += f"Overall mood: {mood_trends.get('overall_sentiment', 'neutral')} "
+    summary_text += f"(score: {mood_trends.get('sentiment_score', 0):.2f}). "
+
+    if patterns:
+        summary_text += f"Primary concerns: {', '.join([p.get('title', '') for p in patterns[:3]])}."
+
+    return {
+        "theme": patterns[0].get('title', 'Weekly Insights') if patterns else 'Weekly Insights',
+        "summary": summary_text,
+        "plan": analysis.get('clinical_prompts', []),
+        "analysis_mode": analysis.get('analysis_mode', 'full'),
+        "deduplicated": shared
+    }
+
+
 def get_patient_data_dir(patient_id):
     """Get or create data directory for a specific patient"""
     patient_dir = os.path.join(BASE_DATA_DIR, patient_id)
     os.makedirs(patient_dir, exist_ok=True)
     return patient_dir
 
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.timing = start_request()
+    # LLM calls made by this request are recorded against its route in the usage ledger
+    g.usage_token = set_usage_context(endpoint=request.url_rule.rule if request.url_rule else None)
+
+
+@app.after_request
+def record_request_latency(response):
+    started = g.get('request_started')
+    if started is None:
+        return response
+
+    token, spans = g.pop('timing')
+    finish_request(token)
+    total_ms = (time.perf_counter() - started) * 1000
+    header = server_timing_header(spans, total_ms)
+    response.headers['Server-Timing'] = header
+    log_request(request.method, request.path, response.status_code, header, total_ms)
+
+    if request.endpoint != 'metrics':
+        # Label by route template, not the concrete path, to keep cardinality bounded
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        observe_request(request.method, route, response.status_code, total_ms / 1000)
+    return response
+
+
+@app.teardown_request
+def discard_request_timing(exc):
+    # after_request is skipped when a view raises; never leak spans into the next request
+    if 'timing' in g:
+        finish_request(g.pop('timing')[0])
+    if 'usage_token' in g:
+        reset_usage_context(g.pop('usage_token'))
+
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -131,6 +278,27 @@ def health_check():
         "message": "Therapist Copilot Backend API is running"
     }), 200
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics, aggregated across gunicorn workers in multiprocess mode"""
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
+@app.route('/api/llm-scheduler', methods=['GET'])
+def llm_scheduler_metrics():
+    """Queue depth, wait time and retry counters for this worker's LLM scheduler"""
+    return jsonify(get_scheduler().metrics()), 200
+
+@app.route('/api/weekly-scheduler', methods=['GET'])
+def weekly_scheduler_status():
+    """Next scheduled weekly analysis per patient and this worker's leader status"""
+    return jsonify(get_weekly_scheduler(BASE_DATA_DIR, load_patient_registry).status()), 200
+
+@app.route('/api/auto-analysis', methods=['GET'])
+def auto_analysis_status():
+    """Pending debounced re-analyses and run counters for this worker"""
+    return jsonify(get_debouncer().metrics()), 200
+
 @app.route('/api/convert-google-doc', methods=['POST'])
 def convert_google_doc():
     """
@@ -155,21 +323,24 @@ def convert_google_doc():
         # Get patient-specific directory
         patient_dir = get_patient_data_dir(patient_id)
 
-        # Convert Google Doc to JSON entry
-        entry = convert_google_doc_to_json(doc_url, entry_date)
+        # Convert Google Doc to JSON entry and score it locally
+        entry = annotate_entry(convert_google_doc_to_json(doc_url, entry_date))
 
         # Save as daily JSON file
         filename = f"{entry['date']}.json"
         filepath = os.path.join(patient_dir, filename)
 
-        with open(filepath, 'w') as f:
-            json.dump(entry, f, indent=2)
+        with patient_lock(patient_dir):
+            write_json(filepath, entry)
+            on_entries_written(patient_dir, [entry])
+        dirty_weeks = schedule_reanalysis(patient_id, patient_dir, [entry])
 
         return jsonify({
             "success": True,
             "message": "Entry converted and saved",
             "entry": entry,
-            "file": filename
+            "file": filename,
+            "reanalysis_scheduled": [f"{start} to {end}" for start, end in dirty_weeks]
         }), 200
 
     except Exception as e:
@@ -199,38 +370,10 @@ def aggregate_week():
         # Get patient-specific directory
         patient_dir = get_patient_data_dir(patient_id)
 
-        # Find all daily JSON files in the date range
-        from datetime import datetime, timedelta
-        start_date = datetime.strptime(week_start, '%Y-%m-%d')
-        end_date = datetime.strptime(week_end, '%Y-%m-%d')
-
-        entries = []
-        current_date = start_date
-
-        while current_date <= end_date:
-            date_str = current_date.strftime('%Y-%m-%d')
-            filepath = os.path.join(patient_dir, f"{date_str}.json")
-
-            if os.path.exists(filepath):
-                with open(filepath, 'r') as f:
-                    entry = json.load(f)
-                    entries.append(entry)
-
-            current_date += timedelta(days=1)
-
-        # Create weekly aggregated file
-        weekly_data = {
-            "patient_id": patient_id,
-            "week_start": week_start,
-            "week_end": week_end,
-            "entries": entries
-        }
-
+        # Collect daily JSON files in the date range and write the weekly file
+        weekly_data = aggregate_week_entries(patient_dir, patient_id, week_start, week_end)
+        entries = weekly_data['entries']
         weekly_filename = f"week_{week_start}_to_{week_end}.json"
-        weekly_filepath = os.path.join(patient_dir, weekly_filename)
-
-        with open(weekly_filepath, 'w') as f:
-            json.dump(weekly_data, f, indent=2)
 
         return jsonify({
             "success": True,
@@ -252,7 +395,8 @@ def analyze_week():
     {
         "patient_id": "patient_123",  # Required for multi-user
         "week_start": "2025-01-12",
-        "week_end": "2025-01-18"
+        "week_end": "2025-01-18",
+        "mode": "auto"  # Optional: "auto" (incremental update when possible) or "full"
     }
     """
     try:
@@ -260,9 +404,12 @@ def analyze_week():
         patient_id = data.get('patient_id', 'default')
         week_start = data.get('week_start')
         week_end = data.get('week_end')
+        mode = data.get('mode', 'auto')
 
         if not week_start or not week_end:
             return jsonify({"error": "week_start and week_end are required"}), 400
+        if mode not in ANALYSIS_MODES:
+            return jsonify({"error": f"mode must be one of {', '.join(ANALYSIS_MODES)}"}), 400
 
         # Get patient-specific directory
         patient_dir = get_patient_data_dir(patient_id)
@@ -274,39 +421,18 @@ def analyze_week():
         if not os.path.exists(weekly_filepath):
             return jsonify({"error": f"Weekly file not found: {week_file}"}), 404
 
-        with open(weekly_filepath, 'r') as f:
-            weekly_data = json.load(f)
-
-        # Analyze using ChatGPT
-        analysis = analyze_weekly_entries(weekly_data)
+        weekly_data = read_json_file(weekly_filepath)
 
-        # Save analysis summary
-        summary_filename = f"summary_{weekly_data['week_start']}_to_{weekly_data['week_end']}.json"
-        summary_filepath = os.path.join(patient_dir, summary_filename)
+        # Analyze using ChatGPT (only new or edited entries when a summary exists) and
+        # save the summary; identical concurrent requests share one call.
+        # A failed analysis is never persisted over the summary file.
+        analysis, summary_filename, shared = analyze_and_save_week(patient_dir, weekly_data, mode,
+                                                                   base_data_dir=BASE_DATA_DIR)
 
-        with open(summary_filepath, 'w') as f:
-            json.dump(analysis, f, indent=2)
+        if 'error' in analysis:
+            return analysis_failed_response(analysis)
 
-        # Build simple summary text
-        mood_trends = analysis.get('mood_trends', {})
-        patterns = analysis.get('patterns', [])
-
-        summary_text = f"Week of {weekly_data['week_start']} to {weekly_data['week_end']}. "
-        summary_text += f"Analyzed {len(weekly_data.get('entries', []))} journal entries. "
-        summary_text += f"Overall mood: {mood_trends.get('overall_sentiment', 'neutral')} "
-        summary_text += f"(score: {mood_trends.get('sentiment_score', 0):.2f}). "
-
-        if patterns:
-            summary_text += f"Primary concerns: {', '.join([p.get('title', '') for p in patterns[:3]])}."
-
-        # Simple 3-section response
-        response_data = {
-            "theme": analysis.get('patterns', [])[0].get('title', 'Weekly Insights') if analysis.get('patterns') else 'Weekly Insights',
-            "summary": summary_text,
-            "plan": analysis.get('clinical_prompts', [])
-        }
-
-        return jsonify(response_data), 200
+        return jsonify(build_week_response(analysis, weekly_data, shared)), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -324,7 +450,8 @@ def process_full_pipeline():
             {"url": "https://docs.google.com/...", "date": "2025-01-13"}
         ],
         "week_start": "2025-01-12",
-        "week_end": "2025-01-18"
+        "week_end": "2025-01-18",
+        "mode": "auto"  # Optional: "auto" (incremental update when possible) or "full"
     }
     """
     try:
@@ -333,6 +460,10 @@ def process_full_pipeline():
         doc_urls = data.get('doc_urls', [])
         week_start = data.get('week_start')
         week_end = data.get('week_end')
+        mode = data.get('mode', 'auto')
+
+        if mode not in ANALYSIS_MODES:
+            return jsonify({"error": f"mode must be one of {', '.join(ANALYSIS_MODES)}"}), 400
 
         # Get patient-specific directory
         patient_dir = get_patient_data_dir(patient_id)
@@ -343,83 +474,33 @@ def process_full_pipeline():
             "analysis": None
         }
 
-        # Step 1: Convert all Google Docs
-        for doc_data in doc_urls:
-            entry = convert_google_doc_to_json(doc_data['url'], doc_data.get('date'))
-            filename = f"{entry['date']}.json"
-            filepath = os.path.join(patient_dir, filename)
-
-            with open(filepath, 'w') as f:
-                json.dump(entry, f, indent=2)
-
-            results['converted_entries'].append(entry)
-
-        # Step 2: Aggregate into weekly file
-        from datetime import datetime, timedelta
-        start_date = datetime.strptime(week_start, '%Y-%m-%d')
-        end_date = datetime.strptime(week_end, '%Y-%m-%d')
-
-        entries = []
-        current_date = start_date
-
-        while current_date <= end_date:
-            date_str = current_date.strftime('%Y-%m-%d')
-            filepath = os.path.join(patient_dir, f"{date_str}.json")
-
-            if os.path.exists(filepath):
-                with open(filepath, 'r') as f:
-                    entry = json.load(f)
-                    entries.append(entry)
-
-            current_date += timedelta(days=1)
-
-        weekly_data = {
-            "patient_id": patient_id,
-            "week_start": week_start,
-            "week_end": week_end,
-            "entries": entries
-        }
+        # Step 1: Convert all Google Docs (kept in memory until the final write)
+        converted = [
+            annotate_entry(convert_google_doc_to_json(doc_data['url'], doc_data.get('date')))
+            for doc_data in doc_urls
+        ]
+        results['converted_entries'] = converted
 
+        # Step 2: Aggregate: merge with entries already on disk in one range read
+        weekly_data = build_weekly_data(patient_dir, patient_id, week_start, week_end, converted)
+        entries = weekly_data['entries']
         weekly_filename = f"week_{week_start}_to_{week_end}.json"
-        weekly_filepath = os.path.join(patient_dir, weekly_filename)
-
-        with open(weekly_filepath, 'w') as f:
-            json.dump(weekly_data, f, indent=2)
 
         results['aggregation'] = {
             "entry_count": len(entries),
             "file": weekly_filename
         }
 
-        # Step 3: Analyze
-        analysis = analyze_weekly_entries(weekly_data)
+        # Step 3: Analyze, then write entries, weekly file and summary in one batch
+        # (entries are saved even if the analysis fails; identical concurrent
+        # requests share one call)
+        analysis, summary_filename, shared = analyze_and_save_week(patient_dir, weekly_data, mode,
+                                                                   new_entries=converted, base_data_dir=BASE_DATA_DIR)
 
-        summary_filename = f"summary_{week_start}_to_{week_end}.json"
-        summary_filepath = os.path.join(patient_dir, summary_filename)
-
-        with open(summary_filepath, 'w') as f:
-            json.dump(analysis, f, indent=2)
-
-        # Build simple summary text
-        mood_trends = analysis.get('mood_trends', {})
-        patterns = analysis.get('patterns', [])
-
-        summary_text = f"Week of {week_start} to {week_end}. "
-        summary_text += f"Analyzed {len(entries)} journal entries. "
-        summary_text += f"Overall mood: {mood_trends.get('overall_sentiment', 'neutral')} "
-        summary_text += f"(score: {mood_trends.get('sentiment_score', 0):.2f}). "
-
-        if patterns:
-            summary_text += f"Primary concerns: {', '.join([p.get('title', '') for p in patterns[:3]])}."
-
-        # Simple 3-section response
-        response_data = {
-            "theme": analysis.get('patterns', [])[0].get('title', 'Weekly Insights') if analysis.get('patterns') else 'Weekly Insights',
-            "summary": summary_text,
-            "plan": analysis.get('clinical_prompts', [])
-        }
+        if 'error' in analysis:
+            return analysis_failed_response(analysis)
 
-        return jsonify(response_data), 200
+        return jsonify(build_week_response(analysis, weekly_data, shared)), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -431,27 +512,33 @@ def analyze_long_term():
 
     Expected payload:
     {
+        "patient_id": "patient_123",  # Required for multi-user
         "start_date": "2025-01-01",
         "end_date": "2025-03-31"
     }
     """
     try:
         data = request.json
+        patient_id = data.get('patient_id', 'default')
         start_date = data.get('start_date')
         end_date = data.get('end_date')
 
         if not start_date or not end_date:
             return jsonify({"error": "start_date and end_date are required"}), 400
 
+        patient_dir = get_patient_data_dir(patient_id)
+
         # Perform long-term analysis
-        analysis = analyze_long_term_trends(start_date, end_date, DATA_DIR)
+        analysis = analyze_long_term_trends(start_date, end_date, patient_dir)
+
+        if 'error' in analysis:
+            return analysis_failed_response(analysis)
 
         # Save long-term analysis
         filename = f"long_term_analysis_{start_date}_to_{end_date}.json"
-        filepath = os.path.join(DATA_DIR, filename)
 
-        with open(filepath, 'w') as f:
-            json.dump(analysis, f, indent=2)
+        with patient_lock(patient_dir):
+            write_json(os.path.join(patient_dir, filename), analysis)
 
         return jsonify({
             "success": True,
@@ -469,31 +556,38 @@ def compare_periods():
 
     Expected payload:
     {
+        "patient_id": "patient_123",  # Required for multi-user
         "period1": {"start": "2025-01-01", "end": "2025-01-31"},
         "period2": {"start": "2025-02-01", "end": "2025-02-28"}
     }
     """
     try:
         data = request.json
+        patient_id = data.get('patient_id', 'default')
         period1 = data.get('period1')
         period2 = data.get('period2')
 
         if not period1 or not period2:
             return jsonify({"error": "period1 and period2 are required"}), 400
 
+        patient_dir = get_patient_data_dir(patient_id)
+
         # Compare the two periods
         comparison = compare_time_periods(
             period1['start'], period1['end'],
             period2['start'], period2['end'],
-            DATA_DIR
+            patient_dir
         )
 
+        failed = failed_period_analysis(comparison)
+        if failed:
+            return analysis_failed_response(failed)
+
         # Save comparison
         filename = f"comparison_{period1['start']}_vs_{period2['start']}.json"
-        filepath = os.path.join(DATA_DIR, filename)
 
-        with open(filepath, 'w') as f:
-            json.dump(comparison, f, indent=2)
+        with patient_lock(patient_dir):
+            write_json(os.path.join(patient_dir, filename), comparison)
 
         return jsonify({
             "success": True,
@@ -523,15 +617,13 @@ def list_patients():
             except FileNotFoundError:
                 continue
 
-            entry_files = [
-                f for f in os.listdir(patient_dir)
-                if f.endswith('.json') and not f.startswith('week_') and not f.startswith('summary_')
-            ]
+            with span('listdir'):
+                filenames = os.listdir(patient_dir)
 
-            summary_files = [
-                f for f in os.listdir(patient_dir)
-                if f.startswith('summary_') and f.endswith('.json')
-            ]
+            # Daily entries only; long-term and comparison files share the directory
+            entry_files = [f for f in filenames if DAILY_ENTRY_PATTERN.match(f)]
+
+            summary_files = [f for f in filenames if SUMMARY_FILE_PATTERN.match(f)]
 
             latest_week = None
             if summary_files:
@@ -560,17 +652,13 @@ def get_patient_analyses(patient_id):
     """Return stored weekly analyses for a patient"""
     try:
         patient_dir = resolve_patient_dir(patient_id)
-        summary_files = [
-            f for f in os.listdir(patient_dir)
-            if f.startswith('summary_') and f.endswith('.json')
-        ]
+        with span('listdir'):
+            summary_files = [f for f in os.listdir(patient_dir) if SUMMARY_FILE_PATTERN.match(f)]
 
         analyses = []
         for filename in summary_files:
-            summary_path = os.path.join(patient_dir, filename)
-            with open(summary_path, 'r') as summary_file:
-                summary_data = json.load(summary_file)
-                analyses.append(build_weekly_analysis(summary_data, patient_id, filename))
+            summary_data = read_json_file(os.path.join(patient_dir, filename))
+            analyses.append(build_weekly_analysis(summary_data, patient_id, filename))
 
         analyses.sort(key=lambda item: item.get('week_start') or '', reverse=True)
 
@@ -580,10 +668,305 @@ def get_patient_analyses(patient_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+
+@app.route('/api/patients/<patient_id>/search', methods=['GET'])
+def search_patient_entries(patient_id):
+    """
+    Semantic search over a patient's journal entries
+
+    Query parameters:
+        q: Search text, e.g. "mother"
+        limit: Maximum results (default 10)
+        sort: "relevance" (default) or "recent"
+    """
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({"error": "q is required"}), 400
+
+        limit = max(1, min(int(request.args.get('limit', 10)), 100))
+        sort = request.args.get('sort', 'relevance')
+        if sort not in SORT_ORDERS:
+            return jsonify({"error": f"sort must be one of {', '.join(SORT_ORDERS)}"}), 400
+
+        try:
+            patient_dir = resolve_patient_dir(patient_id)
+        except FileNotFoundError as e:
+            return jsonify({"error": str(e)}), 404
+
+        return jsonify(search_entries(patient_dir, query, limit=limit, sort=sort)), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/patients/<patient_id>/topics', methods=['GET'])
+def get_patient_topics(patient_id):
+    """
+    Topic x week counts from a patient's weekly analyses
+
+    Query parameters:
+        start, end: Optional week-start range (YYYY-MM-DD, inclusive)
+        top: Optional number of topics to return, ranked by total count
+        topic: Optional comma-separated topics to restrict to
+    """
+    try:
+        patient_dir = resolve_patient_dir(patient_id)
+        top = request.args.get('top')
+        topics = request.args.get('topic')
+
+        series = get_topic_series(
+            patient_dir,
+            start=request.args.get('start'),
+            end=request.args.get('end'),
+            top=int(top) if top else None,
+            topics=topics.split(',') if topics else None
+        )
+        series['patient_id'] = patient_id
+        return jsonify(series), 200
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/patients/<patient_id>/sentiment', methods=['GET'])
+def get_patient_sentiment(patient_id):
+    """
+    Compact sentiment series for charts, downsampled on the server
+
+    Query parameters:
+        granularity: "entry" (local per-entry score, default) or "week" (weekly analysis score)
+        start, end: Optional inclusive date range (YYYY-MM-DD)
+        points: Maximum points to return (default 200); longer ranges are bucketed
+    """
+    try:
+        patient_dir = resolve_patient_dir(patient_id)
+        series = get_sentiment_series(
+            patient_dir,
+            granularity=request.args.get('granularity', 'entry'),
+            start=request.args.get('start'),
+            end=request.args.get('end'),
+            max_points=int(request.args.get('points', DEFAULT_MAX_POINTS))
+        )
+        series['patient_id'] = patient_id
+        return jsonify(series), 200
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/usage', methods=['GET'])
+def get_llm_usage():
+    """
+    LLM usage and estimated cost from the usage ledger
+
+    Query parameters:
+        group_by: "patient" (default), "therapist", "day", "model" or "endpoint"
+        start, end: Optional inclusive date range (YYYY-MM-DD, UTC days)
+        patient_id: Optional filter to one patient
+        therapist: Optional filter to one therapist's caseload
+    """
+    try:
+        group_by = request.args.get('group_by', 'patient')
+        if group_by not in GROUP_BY_FIELDS:
+            return jsonify({"error": f"group_by must be one of {', '.join(GROUP_BY_FIELDS)}"}), 400
+
+        therapist_of = {patient.get('id'): patient.get('therapist') for patient in load_patient_registry()}
+        records = load_usage(request.args.get('start'), request.args.get('end'))
+
+        patient_id = request.args.get('patient_id')
+        if patient_id:
+            records = [record for record in records if record.get('patient_id') == patient_id]
+        therapist = request.args.get('therapist')
+        if therapist:
+            records = [record for record in records if therapist_of.get(record.get('patient_id')) == therapist]
+
+        return jsonify(summarize_usage(records, group_by, therapist_of)), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def cohort_patient_ids():
+    """Patients selected by the therapist / patient_id query parameters (None = everyone)"""
+    patient_id = request.args.get('patient_id')
+    if patient_id:
+        return [candidate.strip() for candidate in patient_id.split(',') if candidate.strip()]
+    therapist = request.args.get('therapist')
+    if therapist:
+        return [
+            patient['id'] for patient in load_patient_registry()
+            if patient.get('id') and (patient.get('therapist') or '').lower() == therapist.lower()
+        ]
+    return None
+
+@app.route('/api/cohort/weekly', methods=['GET'])
+def get_cohort_weekly():
+    """
+    Per-week sentiment and severity aggregates across patients (cohort archive)
+
+    Query parameters:
+        start, end: Optional inclusive range of week start dates (YYYY-MM-DD)
+        therapist: Optional filter to one therapist's caseload
+        patient_id: Optional comma-separated patient ids
+    """
+    try:
+        stats = weekly_cohort_stats(BASE_DATA_DIR, request.args.get('start'), request.args.get('end'),
+                                    cohort_patient_ids())
+        return jsonify(stats), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/cohort/topics', methods=['GET'])
+def get_cohort_topics():
+    """
+    Most frequent topics across patients (cohort archive)
+
+    Query parameters:
+        start, end: Optional inclusive range of week start dates (YYYY-MM-DD)
+        therapist: Optional filter to one therapist's caseload
+        patient_id: Optional comma-separated patient ids
+        limit: Maximum topics (default 20)
+    """
+    try:
+        limit = max(1, min(int(request.args.get('limit', 20)), 200))
+        topics = cohort_topics(BASE_DATA_DIR, request.args.get('start'), request.args.get('end'),
+                               cohort_patient_ids(), limit)
+        return jsonify({"topics": topics}), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def build_dashboard_row(patient, latest):
+    """One caseload dashboard row from a registry record and its latest_weeks entry (or None)"""
+    latest = latest or {}
+    score = latest.get('score')
+    previous_score = latest.get('previous_score')
+    severity_counts = latest.get('severity_counts', {})
+    highest_severity = next((severity for severity in reversed(SEVERITIES) if severity_counts.get(severity)), None)
+
+    return {
+        "patient_id": patient['id'],
+        "name": patient.get('name', patient['id']),
+        "latest_week": {"start": latest['week_start'], "end": latest['week_end']} if latest else None,
+        "sentiment_score": score,
+        "previous_week_start": latest.get('previous_week_start'),
+        "previous_sentiment_score": previous_score,
+        "week_over_week_change": round(score - previous_score, 3)
+        if score is not None and previous_score is not None else None,
+        "highest_severity": highest_severity,
+        "open_concerns": latest.get('concerns', []),
+        "entry_count": latest.get('entry_count')
+    }
+
+@app.route('/api/therapists/<name>/dashboard', methods=['GET'])
+def get_therapist_dashboard(name):
+    """
+    Caseload overview for one therapist, built from the cohort archive
+
+    Each patient's latest analyzed week: sentiment score, change from the
+    previous analyzed week, highest pattern severity and open concerns.
+    Patients needing attention come first (highest severity, then largest
+    drop, then lowest score).
+    """
+    try:
+        caseload = [
+            patient for patient in load_patient_registry()
+            if patient.get('id') and (patient.get('therapist') or '').lower() == name.lower()
+        ]
+        if not caseload:
+            return jsonify({"error": f"No patients found for therapist {name}"}), 404
+
+        latest = latest_weeks(BASE_DATA_DIR, [patient['id'] for patient in caseload])
+        rows = [build_dashboard_row(patient, latest.get(patient['id'])) for patient in caseload]
+
+        def attention(row):
+            severity_rank = SEVERITIES.index(row['highest_severity']) + 1 if row['highest_severity'] else 0
+            change = row['week_over_week_change']
+            score = row['sentiment_score']
+            return (-severity_rank, change if change is not None else float('inf'),
+                    score if score is not None else float('inf'))
+
+        rows.sort(key=attention)
+        return jsonify({
+            "therapist": caseload[0].get('therapist'),
+            "summary": {
+                "patients": len(rows),
+                "analyzed": sum(row['latest_week'] is not None for row in rows),
+                "high_severity": sum(row['highest_severity'] == 'high' for row in rows),
+                "declining": sum((row['week_over_week_change'] or 0) < 0 for row in rows),
+                "with_open_concerns": sum(bool(row['open_concerns']) for row in rows)
+            },
+            "patients": rows
+        }), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/search', methods=['GET'])
+def search_fulltext():
+    """
+    Keyword search over entries and analyses for one patient or a caseload
+
+    Query parameters:
+        q: Query with AND/OR/NOT, "quoted phrases", prefix* and (grouping)
+        patient_id: Search a single patient
+        therapist: Search every patient assigned to this therapist
+        kind: Optional "entry" or "summary" to restrict results
+        limit: Maximum results (default 20)
+    """
+    try:
+        query = request.args.get('q', '').strip()
+        patient_id = request.args.get('patient_id')
+        therapist = request.args.get('therapist')
+        kind = request.args.get('kind')
+        limit = max(1, min(int(request.args.get('limit', 20)), 200))
+
+        if not query:
+            return jsonify({"error": "q is required"}), 400
+        if not patient_id and not therapist:
+            return jsonify({"error": "patient_id or therapist is required"}), 400
+
+        if patient_id:
+            patient_ids = [patient_id]
+        else:
+            patient_ids = [
+                patient['id'] for patient in load_patient_registry()
+                if patient.get('id') and (patient.get('therapist') or '').lower() == therapist.lower()
+            ]
+
+        patient_dirs = {}
+        for candidate in patient_ids:
+            try:
+                patient_dirs[candidate] = resolve_patient_dir(candidate)
+            except FileNotFoundError:
+                if patient_id:
+                    raise
+
+        results = search_caseload(patient_dirs, query, kinds=[kind] if kind else None, limit=limit)
+        results['patients_searched'] = len(patient_dirs)
+        return jsonify(results), 200
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
+    except (QuerySyntaxError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 if __name__ == '__main__':
     # Ensure base data directory exists
     os.makedirs(BASE_DATA_DIR, exist_ok=True)
 
+    # In debug mode the reloader's parent process only watches files; the
+    # serving child (WERKZEUG_RUN_MAIN=true) starts the runners
+    debug = True
+    if not debug or os.getenv('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_runners()
+
     # Run the app
     port = int(os.getenv('PORT', 5050))
-    app.run(host='0.0.0.0', port=port, debug=True)
+    app.run(host='0.0.0.0', port=port, debug=debug)
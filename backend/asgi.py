@@ -0,0 +1,251 @@
+"""
+ASGI Entry Point
+
+Async serving mode: the routes that wait on the LLM run as async Starlette
+endpoints on the AsyncOpenAI client, so one process can hold hundreds of
+analyses in flight while still answering every other route instantly. All
+other routes are the Flask app from app.py, mounted unchanged.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 4
+
+Responses match the Flask routes of the same paths. Flask routes run in
+a2wsgi's thread pool, so a slow one never blocks the event loop.
+"""
+import os
+import time
+from contextlib import asynccontextmanager
+
+from a2wsgi import WSGIMiddleware
+from anyio import to_thread
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse as StarletteJSONResponse
+from starlette.routing import Mount, Route
+
+from app import (
+    BASE_DATA_DIR,
+    analysis_error,
+    analysis_error_status,
+    app as flask_app,
+    build_week_response,
+    failed_period_analysis,
+    get_patient_data_dir,
+    read_json_file,
+    start_background_runners,
+)
+from utils.google_doc_converter import convert_google_doc_to_json
+from utils.long_term_analyzer import analyze_long_term_trends_async, compare_time_periods_async
+from utils.metrics import observe_request
+from utils.timing import finish_request, log_request, server_timing_header, span, start_request
+from utils.usage import reset_usage_context, set_usage_context
+from utils.sentiment import annotate_entry
+from utils.storage import patient_lock, write_json
+from utils.weekly_pipeline import ANALYSIS_MODES, analyze_and_save_week_async, build_weekly_data
+
+
+class JSONResponse(StarletteJSONResponse):
+    """Counts response serialization as a Server-Timing span"""
+
+    def render(self, content):
+        with span('serialize'):
+            return super().render(content)
+
+
+def _save_json(patient_dir, filename, data):
+    with patient_lock(patient_dir):
+        write_json(os.path.join(patient_dir, filename), data)
+
+
+def _convert_docs(doc_urls):
+    return [
+        annotate_entry(convert_google_doc_to_json(doc_data['url'], doc_data.get('date')))
+        for doc_data in doc_urls
+    ]
+
+
+async def analyze_week(request):
+    """Async /api/analyze-week (same payload and response as the Flask route)"""
+    try:
+        data = await request.json()
+        patient_id = data.get('patient_id', 'default')
+        week_start = data.get('week_start')
+        week_end = data.get('week_end')
+        mode = data.get('mode', 'auto')
+
+        if not week_start or not week_end:
+            return JSONResponse({"error": "week_start and week_end are required"}, 400)
+        if mode not in ANALYSIS_MODES:
+            return JSONResponse({"error": f"mode must be one of {', '.join(ANALYSIS_MODES)}"}, 400)
+
+        # Directory creation and file reads are blocking I/O; keep them off the loop
+        patient_dir = await to_thread.run_sync(get_patient_data_dir, patient_id)
+        week_file = f"week_{week_start}_to_{week_end}.json"
+        weekly_filepath = os.path.join(patient_dir, week_file)
+
+        if not await to_thread.run_sync(os.path.exists, weekly_filepath):
+            return JSONResponse({"error": f"Weekly file not found: {week_file}"}, 404)
+
+        weekly_data = await to_thread.run_sync(read_json_file, weekly_filepath)
+
+        analysis, _, shared = await analyze_and_save_week_async(patient_dir, weekly_data, mode,
+                                                                base_data_dir=BASE_DATA_DIR)
+
+        if 'error' in analysis:
+            return JSONResponse(analysis_error(analysis), analysis_error_status(analysis))
+
+        return JSONResponse(build_week_response(analysis, weekly_data, shared), 200)
+
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, 500)
+
+
+async def process_full_pipeline(request):
+    """Async /api/process-full-pipeline (same payload and response as the Flask route)"""
+    try:
+        data = await request.json()
+        patient_id = data.get('patient_id', 'default')
+        doc_urls = data.get('doc_urls', [])
+        week_start = data.get('week_start')
+        week_end = data.get('week_end')
+        mode = data.get('mode', 'auto')
+
+        if mode not in ANALYSIS_MODES:
+            return JSONResponse({"error": f"mode must be one of {', '.join(ANALYSIS_MODES)}"}, 400)
+
+        # Directory creation, document fetches and the range read are blocking I/O; keep them off the loop
+        patient_dir = await to_thread.run_sync(get_patient_data_dir, patient_id)
+        converted = await to_thread.run_sync(_convert_docs, doc_urls)
+        weekly_data = await to_thread.run_sync(build_weekly_data, patient_dir, patient_id,
+                                               week_start, week_end, converted)
+
+        analysis, _, shared = await analyze_and_save_week_async(patient_dir, weekly_data, mode,
+                                                                new_entries=converted, base_data_dir=BASE_DATA_DIR)
+
+        if 'error' in analysis:
+            return JSONResponse(analysis_error(analysis), analysis_error_status(analysis))
+
+        return JSONResponse(build_week_response(analysis, weekly_data, shared), 200)
+
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, 500)
+
+
+async def analyze_long_term(request):
+    """Async /api/analyze-long-term (same payload and response as the Flask route)"""
+    try:
+        data = await request.json()
+        patient_id = data.get('patient_id', 'default')
+        start_date = data.get('start_date')
+        end_date = data.get('end_date')
+
+        if not start_date or not end_date:
+            return JSONResponse({"error": "start_date and end_date are required"}, 400)
+
+        patient_dir = await to_thread.run_sync(get_patient_data_dir, patient_id)
+        analysis = await analyze_long_term_trends_async(start_date, end_date, patient_dir)
+
+        if 'error' in analysis:
+            return JSONResponse(analysis_error(analysis), analysis_error_status(analysis))
+
+        filename = f"long_term_analysis_{start_date}_to_{end_date}.json"
+        await to_thread.run_sync(_save_json, patient_dir, filename, analysis)
+
+        return JSONResponse({
+            "success": True,
+            "analysis": analysis,
+            "file": filename
+        }, 200)
+
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, 500)
+
+
+async def compare_periods(request):
+    """Async /api/compare-periods (same payload and response as the Flask route)"""
+    try:
+        data = await request.json()
+        patient_id = data.get('patient_id', 'default')
+        period1 = data.get('period1')
+        period2 = data.get('period2')
+
+        if not period1 or not period2:
+            return JSONResponse({"error": "period1 and period2 are required"}, 400)
+
+        patient_dir = await to_thread.run_sync(get_patient_data_dir, patient_id)
+        comparison = await compare_time_periods_async(
+            period1['start'], period1['end'],
+            period2['start'], period2['end'],
+            patient_dir
+        )
+
+        failed = failed_period_analysis(comparison)
+        if failed:
+            return JSONResponse(analysis_error(failed), analysis_error_status(failed))
+
+        filename = f"comparison_{period1['start']}_vs_{period2['start']}.json"
+        await to_thread.run_sync(_save_json, patient_dir, filename, comparison)
+
+        return JSONResponse({
+            "success": True,
+            "comparison": comparison,
+            "file": filename
+        }, 200)
+
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, 500)
+
+
+class RequestTimingMiddleware:
+    """Server-Timing header and latency histogram for the async routes (as app.py does for Flask)"""
+
+    def __init__(self, app, route):
+        self.app = app
+        self.route = route
+
+    async def __call__(self, scope, receive, send):
+        started = time.perf_counter()
+        token, spans = start_request()
+        usage_token = set_usage_context(endpoint=self.route)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                total_ms = (time.perf_counter() - started) * 1000
+                header = server_timing_header(spans, total_ms)
+                message.setdefault('headers', []).append((b'server-timing', header.encode('latin-1')))
+                log_request(scope['method'], scope['path'], status, header, total_ms)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            finish_request(token)
+            reset_usage_context(usage_token)
+            observe_request(scope['method'], self.route, status, time.perf_counter() - started)
+
+
+def async_route(path, endpoint):
+    # Flask-CORS covers the mounted routes (including preflight requests for these paths)
+    return Route(path, endpoint, methods=['POST'], middleware=[
+        Middleware(RequestTimingMiddleware, route=path),
+        Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'],
+                   expose_headers=['Server-Timing'])
+    ])
+
+
+@asynccontextmanager
+async def lifespan(app):
+    start_background_runners()
+    yield
+
+
+app = Starlette(lifespan=lifespan, routes=[
+    async_route('/api/analyze-week', analyze_week),
+    async_route('/api/process-full-pipeline', process_full_pipeline),
+    async_route('/api/analyze-long-term', analyze_long_term),
+    async_route('/api/compare-periods', compare_periods),
+    Mount('/', app=WSGIMiddleware(flask_app)),
+])
@@ -0,0 +1,82 @@
+"""Fixtures for the storage/read-path benchmarks.
+
+Datasets come from scripts/generate_synthetic_data.py (seeded, so identical on
+every machine) and are generated once per size and cached on disk, so repeat
+runs (and runs on other commits) measure the same files:
+
+    $BENCH_DATA_DIR/<patients>x<years>/   (default: <tmp>/therapist-copilot-bench)
+
+Sizes come from --bench-datasets (PATIENTSxYEARS, comma separated). The default
+covers small and mid-sized deployments; add 10000x5 for the full capacity run.
+The fake_llm fixture is shared with the offline tests (backend/conftest.py).
+"""
+
+from __future__ import annotations
+
+import os
+import shutil
+import sys
+import tempfile
+from datetime import date, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+from scripts.generate_synthetic_data import generate
+
+os.environ.setdefault('OPENAI_API_KEY', 'benchmark')
+
+DEFAULT_DATASETS = '10x1,10x5,1000x1'
+FIRST_WEEK = date(2020, 1, 5)  # A Sunday, so weeks run Sunday to Saturday
+
+
+def pytest_addoption(parser: pytest.Parser) -> None:
+    parser.addoption('--bench-datasets', default=DEFAULT_DATASETS,
+                     help='Comma-separated dataset sizes as PATIENTSxYEARS (e.g. 10x1,1000x1,10000x5)')
+
+
+def pytest_generate_tests(metafunc: pytest.Metafunc) -> None:
+    if 'dataset' in metafunc.fixturenames:
+        specs = [spec.strip() for spec in metafunc.config.getoption('bench_datasets').split(',') if spec.strip()]
+        metafunc.parametrize('dataset', specs, indirect=True, scope='session')
+
+
+@pytest.fixture(scope='session')
+def dataset(request: pytest.FixtureRequest) -> SimpleNamespace:
+    spec = request.param
+    patients, years = (int(part) for part in spec.lower().split('x'))
+    cache_root = Path(os.getenv('BENCH_DATA_DIR') or Path(tempfile.gettempdir()) / 'therapist-copilot-bench')
+    root = cache_root / spec
+    if not (root / '.complete').exists():
+        if root.exists():
+            shutil.rmtree(root)
+        # An entry every day, so PATIENTSxYEARS is the exact entry count
+        generate(root, patients, years, first_week=FIRST_WEEK.isoformat(), adherence=1.0)
+        (root / '.complete').touch()
+
+    last_week = FIRST_WEEK + timedelta(weeks=52 * years - 1)
+    return SimpleNamespace(
+        spec=spec,
+        root=root,
+        patients=patients,
+        years=years,
+        patient_id='patient-00000',
+        patient_dir=root / 'patient-00000',
+        first_week=FIRST_WEEK,
+        last_week_start=last_week.isoformat(),
+        last_week_end=(last_week + timedelta(days=6)).isoformat(),
+    )
+
+
+@pytest.fixture
+def app_client(dataset: SimpleNamespace, monkeypatch: pytest.MonkeyPatch):
+    """Flask test client serving the dataset"""
+    import app as backend_app
+    monkeypatch.setattr(backend_app, 'BASE_DATA_DIR', str(dataset.root))
+    monkeypatch.setattr(backend_app, 'PATIENTS_REGISTRY_PATH', str(dataset.root / 'patients.json'))
+    return backend_app.app.test_client()
@@ -0,0 +1,103 @@
+"""Storage and read-path benchmarks.
+
+    cd backend
+    pytest benchmarks --benchmark-autosave                    # saves .benchmarks/<machine>/NNNN_<commit>.json
+    pytest benchmarks --benchmark-compare                     # compare with the last saved run
+    pytest benchmarks --bench-datasets 10000x5 --benchmark-autosave
+
+LLM calls go to an in-process fake, so the analysis benchmark measures only
+the code around the model call (prompt building, repair, persistence).
+"""
+
+from __future__ import annotations
+
+import json
+import shutil
+from datetime import timedelta
+
+import pytest
+
+from utils.long_term_analyzer import get_weekly_summaries_in_range
+from utils.weekly_pipeline import aggregate_week_entries, analyze_and_save_week
+
+
+@pytest.mark.benchmark(group='list_patients')
+def test_list_patients(benchmark, dataset, app_client):
+    response = benchmark(app_client.get, '/api/patients')
+    assert response.status_code == 200
+    assert len(response.get_json()['patients']) == dataset.patients
+
+
+@pytest.mark.benchmark(group='get_patient_analyses')
+def test_get_patient_analyses(benchmark, dataset, app_client):
+    response = benchmark(app_client.get, f'/api/patients/{dataset.patient_id}/analyses')
+    assert response.status_code == 200
+    assert len(response.get_json()['analyses']) == 52 * dataset.years
+
+
+@pytest.mark.benchmark(group='aggregate_week')
+def test_aggregate_week(benchmark, dataset):
+    weekly_data = benchmark(aggregate_week_entries, str(dataset.patient_dir), dataset.patient_id,
+                            dataset.last_week_start, dataset.last_week_end)
+    assert len(weekly_data['entries']) == 7
+
+
+@pytest.mark.benchmark(group='get_weekly_summaries_in_range')
+def test_get_weekly_summaries_in_range(benchmark, dataset):
+    # The most recent year, as a long-term analysis request would ask for
+    end = dataset.first_week + timedelta(weeks=52 * dataset.years)
+    start = end - timedelta(weeks=52)
+    summaries = benchmark(get_weekly_summaries_in_range, start.isoformat(), end.isoformat(), str(dataset.patient_dir))
+    assert len(summaries) == 52
+
+
+@pytest.mark.benchmark(group='build_weekly_analysis')
+def test_build_weekly_analysis(benchmark, dataset):
+    from app import build_weekly_analysis
+
+    filename = f"summary_{dataset.last_week_start}_to_{dataset.last_week_end}.json"
+    summary = json.loads((dataset.patient_dir / filename).read_text())
+    analysis = benchmark(build_weekly_analysis, summary, dataset.patient_id, filename)
+    assert analysis['week_start'] == dataset.last_week_start
+
+
+@pytest.mark.benchmark(group='analyze_and_save_week')
+def test_analyze_and_save_week(benchmark, dataset, fake_llm, tmp_path):
+    # Summary and index writes go to a copy, so the cached dataset stays identical across runs
+    patient_dir = tmp_path / dataset.patient_id
+    shutil.copytree(dataset.patient_dir, patient_dir)
+    weekly_data = aggregate_week_entries(str(patient_dir), dataset.patient_id,
+                                         dataset.last_week_start, dataset.last_week_end)
+    inflight_dir = patient_dir / '.derived' / 'inflight'
+    rounds = []
+
+    def clear_shared_results():
+        # Otherwise every round after the first returns the single-flight result of the previous one
+        rounds.append(None)
+        for path in inflight_dir.glob('*.json'):
+            path.unlink()
+
+    analysis, _, shared = benchmark.pedantic(analyze_and_save_week, args=(str(patient_dir), weekly_data, 'full'),
+                                             setup=clear_shared_results, rounds=50)
+    assert 'error' not in analysis and not shared
+    # One LLM call per round actually run (a single round under --benchmark-disable)
+    assert rounds and fake_llm.calls == len(rounds)
+
+
+@pytest.mark.benchmark(group='cohort_weekly')
+def test_cohort_weekly(benchmark, dataset, app_client):
+    # Warm the archive so the benchmark measures queries, not the one-off build
+    app_client.get('/api/cohort/weekly')
+    response = benchmark(app_client.get, '/api/cohort/weekly')
+    assert response.status_code == 200
+    assert response.get_json()['weeks'] == 52 * dataset.years
+
+
+@pytest.mark.benchmark(group='therapist_dashboard')
+def test_therapist_dashboard(benchmark, dataset, app_client):
+    therapist = json.loads((dataset.root / 'patients.json').read_text())['patients'][0]['therapist']
+    path = f'/api/therapists/{therapist}/dashboard'
+    app_client.get(path)
+    response = benchmark(app_client.get, path)
+    assert response.status_code == 200
+    assert response.get_json()['summary']['analyzed'] == response.get_json()['summary']['patients']
@@ -0,0 +1,107 @@
+"""Shared pytest fixtures for the offline tests (test_*.py) and the benchmarks.
+
+Nothing here reaches the network: `fake_llm` answers analyzer calls in-process
+and `mock_llm` points the OpenAI SDK at scripts/mock_openai_server.py.
+"""
+
+from __future__ import annotations
+
+import json
+import random
+import threading
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Iterator
+
+import pytest
+
+from scripts.generate_synthetic_data import build_summary
+from scripts.mock_openai_server import MockConfig, MockOpenAIServer, start_mock_server
+from utils.storage import patient_lock
+
+FAKE_WEEK = date(2020, 1, 5)
+
+# Scripts that call a running server at import time, not pytest tests. The benchmarks
+# run on their own (python -m pytest benchmarks).
+collect_ignore = ['test_backend.py', 'test_multi_user.py', 'test_new_entry.py', 'quick_test.py', 'benchmarks']
+
+
+class FakeCompletions:
+    """Stands in for client.chat.completions: instant, schema-valid analysis JSON"""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        days = [((FAKE_WEEK + timedelta(days=offset)).isoformat(), -0.2, ['work', 'sleep']) for offset in range(7)]
+        self.content = json.dumps(build_summary(random.Random(1), FAKE_WEEK, days))
+
+    def create(self, **kwargs: Any) -> SimpleNamespace:
+        self.calls += 1
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=self.content))],
+            usage=SimpleNamespace(prompt_tokens=1500, completion_tokens=400, total_tokens=1900,
+                                  prompt_tokens_details=None)
+        )
+
+
+def _fresh_scheduler(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    from utils import llm_scheduler
+    monkeypatch.setenv('USAGE_LEDGER_DIR', str(tmp_path / 'usage'))
+    # A fresh scheduler with budgets high enough that rate limiting never shows up in timings
+    monkeypatch.setenv('LLM_REQUESTS_PER_MINUTE', '100000000')
+    monkeypatch.setenv('LLM_TOKENS_PER_MINUTE', '100000000000')
+    monkeypatch.setattr(llm_scheduler, '_scheduler', None)
+
+
+@pytest.fixture
+def fake_llm(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> FakeCompletions:
+    """Route analyzer calls to FakeCompletions; usage records go to a temp ledger"""
+    from utils import llm_client
+    completions = FakeCompletions()
+    monkeypatch.setattr(llm_client, '_client', SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+    _fresh_scheduler(monkeypatch, tmp_path)
+    return completions
+
+
+def write_while_locked(patient_dir: str, write: Callable[[], None], hold: float = 0.3) -> threading.Thread:
+    """Start a writer thread that takes the patient lock, waits `hold` seconds, then runs `write`
+
+    Returns once the lock is held, so a read path called next races the writer.
+    """
+    locked = threading.Event()
+
+    def writer() -> None:
+        with patient_lock(patient_dir):
+            locked.set()
+            time.sleep(hold)
+            write()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    locked.wait(5)
+    return thread
+
+
+@pytest.fixture
+def locked_writer() -> Callable[..., threading.Thread]:
+    return write_while_locked
+
+
+@pytest.fixture(scope='session')
+def mock_server() -> Iterator[MockOpenAIServer]:
+    server = start_mock_server(latency='fixed:0')
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def mock_llm(mock_server: MockOpenAIServer, monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> MockOpenAIServer:
+    """Real OpenAI SDK calls against the local mock server; set `.config` to inject failures"""
+    from utils import llm_client
+    mock_server.config = MockConfig(latency='fixed:0')
+    monkeypatch.setenv('OPENAI_BASE_URL', mock_server.base_url)
+    monkeypatch.setenv('OPENAI_API_KEY', 'mock')
+    monkeypatch.setattr(llm_client, '_client', None)
+    _fresh_scheduler(monkeypatch, tmp_path)
+    return mock_server
@@ -0,0 +1,30 @@
+"""
+Gunicorn settings (loaded automatically from the working directory)
+
+Enables prometheus_client multiprocess mode so /metrics aggregates all
+workers; see utils/metrics.py. Each worker starts the app's opt-in
+background runners once it has loaded the app.
+"""
+import os
+import shutil
+import tempfile
+
+# Must be set before workers import prometheus_client
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'therapist-copilot-metrics'))
+
+
+def on_starting(server):
+    # Samples from a previous run would otherwise be merged into the new one
+    directory = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+
+
+def post_worker_init(worker):
+    from app import start_background_runners
+    start_background_runners()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,220 @@
+"""Compare the sync (gunicorn) and async (uvicorn) serving modes under a slow LLM.
+
+Starts the mock OpenAI server (scripts/mock_openai_server.py) in-process with
+a fixed delay, points the server at it through OPENAI_BASE_URL, and
+generates a temporary data directory with one week per synthetic patient (so
+no two requests share a single-flight key). For each mode it fires
+`--concurrency` simultaneous /api/analyze-week requests while probing
+/api/patients, and reports analysis throughput and probe latency.
+
+Usage example:
+
+    python backend/scripts/bench_asgi.py --concurrency 100 --llm-delay 2 --workers 2
+    python backend/scripts/bench_asgi.py --modes asgi --concurrency 500 --output bench.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Dict, List
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+from scripts.mock_openai_server import start_mock_server
+
+WEEK_START = date(2025, 3, 2)
+SERVER_COMMANDS = {
+    'wsgi': ['-m', 'gunicorn', 'app:app', '--bind', '127.0.0.1:{port}', '--workers', '{workers}',
+             '--timeout', '600', '--backlog', '2048'],
+    'asgi': ['-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', '{port}', '--workers', '{workers}',
+             '--backlog', '2048', '--log-level', 'warning'],
+}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark sync vs async serving under a slow mocked LLM")
+    parser.add_argument('--modes', default='wsgi,asgi', help='Comma-separated modes to run (wsgi, asgi)')
+    parser.add_argument('--concurrency', type=int, default=50, help='Simultaneous analyze-week requests')
+    parser.add_argument('--llm-delay', type=float, default=1.0, help='Seconds the mock LLM takes per call')
+    parser.add_argument('--workers', type=int, default=2, help='Server worker processes')
+    parser.add_argument('--probe-interval', type=float, default=0.1, help='Seconds between /api/patients probes')
+    parser.add_argument('--output', help='Optional JSON file for results')
+    return parser.parse_args()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def build_data_dir(root: Path, patients: int) -> None:
+    """One patient per request, each with a seven-entry weekly file"""
+    week_end = WEEK_START + timedelta(days=6)
+    registry = []
+    for index in range(patients):
+        patient_id = f"bench-{index:04d}"
+        registry.append({"id": patient_id, "name": f"Bench Patient {index}", "timezone": "UTC"})
+        entries = [
+            {
+                "date": (WEEK_START + timedelta(days=day)).isoformat(),
+                "time": "21:00",
+                "text": "Work deadlines again today. Slept badly and felt anxious before the team meeting."
+            }
+            for day in range(7)
+        ]
+        patient_dir = root / patient_id
+        patient_dir.mkdir(parents=True)
+        (patient_dir / f"week_{WEEK_START}_to_{week_end}.json").write_text(json.dumps({
+            "patient_id": patient_id,
+            "week_start": WEEK_START.isoformat(),
+            "week_end": week_end.isoformat(),
+            "entries": entries
+        }))
+    (root / 'patients.json').write_text(json.dumps({"patients": registry}))
+
+
+def request_json(url: str, payload: Dict[str, Any] | None = None, timeout: float = 900) -> int:
+    data = json.dumps(payload).encode('utf-8') if payload is not None else None
+    req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as error:
+        return error.code
+
+
+def wait_for_health(base_url: str, process: subprocess.Popen, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            if request_json(f"{base_url}/health", timeout=1) == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("Server did not become healthy")
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run_mode(mode: str, args: argparse.Namespace, llm_url: str) -> Dict[str, Any]:
+    data_dir = Path(tempfile.mkdtemp(prefix=f'serving-bench-{mode}-'))
+    build_data_dir(data_dir, args.concurrency)
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = dict(
+        os.environ,
+        BASE_DATA_DIR=str(data_dir),
+        OPENAI_BASE_URL=llm_url,
+        OPENAI_API_KEY='bench',
+        WEEKLY_SCHEDULER_ENABLED='false',
+        AUTO_ANALYSIS_ENABLED='false',
+        LLM_REQUESTS_PER_MINUTE='1000000',
+        LLM_TOKENS_PER_MINUTE='1000000000'
+    )
+    command = [sys.executable] + [part.format(port=port, workers=args.workers) for part in SERVER_COMMANDS[mode]]
+    process = subprocess.Popen(command, cwd=BASE_DIR, env=env)
+
+    try:
+        wait_for_health(base_url, process)
+        week_end = WEEK_START + timedelta(days=6)
+        analysis_latencies: List[float] = []
+        probe_latencies: List[float] = []
+        statuses: Dict[int, int] = {}
+        lock = threading.Lock()
+        done = threading.Event()
+
+        def analyze(index: int) -> None:
+            started = time.perf_counter()
+            status = request_json(f"{base_url}/api/analyze-week", {
+                "patient_id": f"bench-{index:04d}",
+                "week_start": WEEK_START.isoformat(),
+                "week_end": week_end.isoformat(),
+                "mode": "full"
+            })
+            with lock:
+                analysis_latencies.append(time.perf_counter() - started)
+                statuses[status] = statuses.get(status, 0) + 1
+
+        def probe() -> None:
+            while not done.is_set():
+                started = time.perf_counter()
+                request_json(f"{base_url}/api/patients")
+                probe_latencies.append(time.perf_counter() - started)
+                done.wait(args.probe_interval)
+
+        prober = threading.Thread(target=probe, daemon=True)
+        started = time.perf_counter()
+        prober.start()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(analyze, range(args.concurrency)))
+        wall = time.perf_counter() - started
+        done.set()
+        prober.join()
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    return {
+        "mode": mode,
+        "wall_seconds": round(wall, 2),
+        "analyses_per_second": round(args.concurrency / wall, 2),
+        "statuses": statuses,
+        "analysis_p50_s": round(statistics.median(analysis_latencies), 3),
+        "analysis_p95_s": round(percentile(analysis_latencies, 95), 3),
+        "patients_probes": len(probe_latencies),
+        "patients_p50_ms": round(statistics.median(probe_latencies) * 1000, 1),
+        "patients_p95_ms": round(percentile(probe_latencies, 95) * 1000, 1),
+        "patients_max_ms": round(max(probe_latencies) * 1000, 1)
+    }
+
+
+def main() -> None:
+    args = parse_args()
+    llm_server = start_mock_server(latency=f"fixed:{args.llm_delay}")
+    llm_url = llm_server.base_url
+
+    results = []
+    try:
+        for mode in [mode.strip() for mode in args.modes.split(',') if mode.strip()]:
+            result = run_mode(mode, args, llm_url)
+            results.append(result)
+            print(json.dumps(result))
+    finally:
+        llm_server.shutdown()
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({
+            "concurrency": args.concurrency,
+            "llm_delay_s": args.llm_delay,
+            "workers": args.workers,
+            "results": results
+        }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
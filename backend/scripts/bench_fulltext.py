@@ -0,0 +1,189 @@
+"""Benchmark the full-text index on a synthetic corpus.
+
+Generates a deterministic corpus of journal-like entries spread over many
+patients, builds and persists one index per patient (the same code path the API
+uses), then measures query latency for single-patient and caseload queries and
+the cost of one incremental write: appending the entry to the delta segment
+(what index_documents does) versus re-serializing the whole index (what every
+write cost before the delta segment, and what a merge still costs).
+
+Usage example:
+
+    python backend/scripts/bench_fulltext.py --entries 1000000 --patients 1000
+    python backend/scripts/bench_fulltext.py --entries 20000 --patients 20 --output bench.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Dict, List
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+from utils import fulltext_index
+
+# Weighted vocabulary loosely shaped like real entries: common filler, then clinical words
+FILLER = ('i', 'the', 'and', 'to', 'my', 'a', 'it', 'was', 'today', 'felt', 'me', 'so', 'at', 'of', 'that')
+TOPICAL = (
+    'work', 'boss', 'meeting', 'presentation', 'mom', 'mother', 'dad', 'sister', 'friend', 'partner',
+    'sleep', 'tired', 'bed', 'anxious', 'anxiety', 'panic', 'attack', 'sad', 'cried', 'lonely',
+    'therapy', 'breathing', 'exercise', 'walk', 'gym', 'guilt', 'perfect', 'boundaries', 'grief', 'hope'
+)
+
+QUERIES = {
+    'term': 'anxious',
+    'and': 'work anxious',
+    'or': 'mother OR mom',
+    'not': 'sleep NOT tired',
+    'phrase': '"panic attack"',
+    'prefix': 'anx*',
+    'grouped': '(sleep OR bed) -work',
+}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark full-text index build and query latency")
+    parser.add_argument('--entries', type=int, default=1_000_000, help='Total synthetic entries (default 1,000,000)')
+    parser.add_argument('--patients', type=int, default=1000, help='Number of patients to spread entries over')
+    parser.add_argument('--words', type=int, default=60, help='Average words per entry')
+    parser.add_argument('--caseload', type=int, default=25, help='Patients per caseload query')
+    parser.add_argument('--repeat', type=int, default=50, help='Timed repetitions per query')
+    parser.add_argument('--writes', type=int, default=50, help='Timed incremental writes to one patient')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help='Optional JSON file for results')
+    parser.add_argument('--keep', action='store_true', help='Keep the generated index directory')
+    return parser.parse_args()
+
+
+def synthetic_entry(rng: random.Random, day: int, words: int) -> Dict[str, Any]:
+    length = max(5, int(rng.gauss(words, words / 4)))
+    tokens = [rng.choice(TOPICAL) if rng.random() < 0.25 else rng.choice(FILLER) for _ in range(length)]
+    return {'date': (date(2000, 1, 1) + timedelta(days=day)).isoformat(), 'text': ' '.join(tokens)}
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def bench_writes(rng: random.Random, patient_dir: str, first_day: int, args: argparse.Namespace) -> Dict[str, Any]:
+    """Per-write latency of a delta append versus a full index save for one patient"""
+    # Merges are timed separately as full saves, so keep every timed write an append
+    fulltext_index.MERGE_BYTES = float('inf')
+    append_samples = []
+    save_samples = []
+    for day in range(first_day, first_day + args.writes):
+        document = fulltext_index.entry_document(synthetic_entry(rng, day, args.words))
+
+        started = time.perf_counter()
+        fulltext_index.index_documents(patient_dir, [document])
+        append_samples.append((time.perf_counter() - started) * 1000)
+
+        index = fulltext_index.load_index(patient_dir)
+        started = time.perf_counter()
+        fulltext_index.save_index(patient_dir, index)
+        save_samples.append((time.perf_counter() - started) * 1000)
+
+    return {
+        'count': args.writes,
+        'docs_in_index': len(fulltext_index.load_index(patient_dir).docs),
+        'index_bytes': Path(fulltext_index._index_path(patient_dir)).stat().st_size,
+        'append_p50_ms': round(statistics.median(append_samples), 3),
+        'append_p95_ms': round(percentile(append_samples, 95), 3),
+        'full_save_p50_ms': round(statistics.median(save_samples), 3),
+        'full_save_p95_ms': round(percentile(save_samples, 95), 3),
+    }
+
+
+def main() -> None:
+    args = parse_args()
+    rng = random.Random(args.seed)
+    root = Path(tempfile.mkdtemp(prefix='fulltext-bench-'))
+    per_patient = max(1, args.entries // args.patients)
+
+    build_seconds = 0.0
+    save_seconds = 0.0
+    patient_dirs: Dict[str, str] = {}
+    total_docs = 0
+
+    for patient_number in range(args.patients):
+        patient_id = f'patient-{patient_number:05d}'
+        patient_dir = root / patient_id
+        patient_dir.mkdir()
+        patient_dirs[patient_id] = str(patient_dir)
+
+        documents = [
+            fulltext_index.entry_document(synthetic_entry(rng, day, args.words))
+            for day in range(per_patient)
+        ]
+
+        started = time.perf_counter()
+        index = fulltext_index.InvertedIndex()
+        for document in documents:
+            index.add_document(document)
+        build_seconds += time.perf_counter() - started
+
+        started = time.perf_counter()
+        fulltext_index.save_index(str(patient_dir), index)
+        save_seconds += time.perf_counter() - started
+        total_docs += len(index.docs)
+
+    # Drop the in-process cache so the first query per patient measures a cold load
+    fulltext_index._index_cache.clear()
+    single_patient = {next(iter(patient_dirs)): next(iter(patient_dirs.values()))}
+    caseload = dict(list(patient_dirs.items())[:args.caseload])
+
+    started = time.perf_counter()
+    fulltext_index.search_caseload(single_patient, 'anxious')
+    cold_load_ms = (time.perf_counter() - started) * 1000
+
+    results: Dict[str, Any] = {
+        'entries': total_docs,
+        'patients': args.patients,
+        'entries_per_patient': per_patient,
+        'build_seconds': round(build_seconds, 2),
+        'save_seconds': round(save_seconds, 2),
+        'build_docs_per_second': round(total_docs / build_seconds) if build_seconds else None,
+        'cold_load_ms': round(cold_load_ms, 2),
+        'queries': {},
+    }
+
+    for scope, dirs in (('patient', single_patient), ('caseload', caseload)):
+        fulltext_index.search_caseload(dirs, 'anxious')  # warm the cache
+        for name, query in QUERIES.items():
+            samples = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                fulltext_index.search_caseload(dirs, query)
+                samples.append((time.perf_counter() - started) * 1000)
+            results['queries'][f'{scope}:{name}'] = {
+                'p50_ms': round(statistics.median(samples), 3),
+                'p95_ms': round(percentile(samples, 95), 3),
+                'max_ms': round(max(samples), 3),
+            }
+
+    results['writes'] = bench_writes(rng, next(iter(patient_dirs.values())), per_patient, args)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+    if args.keep:
+        print(f'Index directory kept at {root}')
+    else:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
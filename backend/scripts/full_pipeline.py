@@ -31,7 +31,12 @@ BASE_DIR = Path(__file__).resolve().parents[1]
 if str(BASE_DIR) not in sys.path:
     sys.path.append(str(BASE_DIR))
 
-from utils.analyzer import analyze_weekly_entries
+from utils.llm_scheduler import get_scheduler
+from utils.sentiment import annotate_entries
+from utils.indexing import on_entries_written
+from utils.storage import patient_lock, write_json, write_text
+from utils.usage import usage_context
+from utils.weekly_pipeline import ANALYSIS_MODES, analyze_and_save_week, build_weekly_data, week_filename
  
 DATA_DIR = BASE_DIR / 'data'
 
@@ -55,6 +60,7 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument('--week-end', required=True, help='Week end date (YYYY-MM-DD)')
     parser.add_argument('--entries-file', help='Optional JSON file containing daily entries to ingest before running')
     parser.add_argument('--overwrite', action='store_true', help='Overwrite existing daily JSON files when ingesting entries')
+    parser.add_argument('--mode', choices=ANALYSIS_MODES, default='auto', help='auto: send only new or edited entries when a summary already exists')
     parser.add_argument('--report-format', choices=['markdown', 'text'], default='markdown', help='Format of the saved therapist report')
     return parser.parse_args()
 
@@ -95,61 +101,41 @@ def load_entries_from_file(path: Path) -> List[Dict[str, Any]]:
 
 
 def ingest_entries(entries: List[Dict[str, Any]], patient_dir: Path, overwrite: bool = False) -> None:
-    for entry in entries:
-        entry_date = entry['date']
-        target_path = patient_dir / f'{entry_date}.json'
-        if target_path.exists() and not overwrite:
-            continue
+    annotate_entries(entries)
+    written: List[Dict[str, Any]] = []
+    with patient_lock(patient_dir):
+        for entry in entries:
+            entry_date = entry['date']
+            target_path = patient_dir / f'{entry_date}.json'
+            if target_path.exists() and not overwrite:
+                continue
 
-        with target_path.open('w') as f:
-            json.dump(entry, f, indent=2)
+            write_json(target_path, entry)
+            written.append(entry)
+
+        on_entries_written(patient_dir, written)
 
 
 def aggregate_week(patient_id: str, patient_dir: Path, week_start: str, week_end: str) -> Dict[str, Any]:
-    start_dt = datetime.strptime(week_start, '%Y-%m-%d')
-    end_dt = datetime.strptime(week_end, '%Y-%m-%d')
-
-    entries: List[Dict[str, Any]] = []
-    current = start_dt
-    missing_days: List[str] = []
-
-    while current <= end_dt:
-        date_str = current.strftime('%Y-%m-%d')
-        path = patient_dir / f'{date_str}.json'
-        if path.exists():
-            with path.open('r') as f:
-                entries.append(json.load(f))
-        else:
-            missing_days.append(date_str)
-        current += timedelta(days=1)
-
-    if not entries:
-        raise FileNotFoundError('No daily JSON files found for the requested week')
-
-    weekly_data = {
-        'patient_id': patient_id,
-        'week_start': week_start,
-        'week_end': week_end,
-        'entries': entries,
-        'missing_days': missing_days,
-    }
-
-    weekly_filename = f'week_{week_start}_to_{week_end}.json'
-    weekly_path = patient_dir / weekly_filename
-    with weekly_path.open('w') as f:
-        json.dump(weekly_data, f, indent=2)
+    # Same locked read-and-write as the API, plus the days without a journal for the report
+    with patient_lock(patient_dir):
+        weekly_data = build_weekly_data(str(patient_dir), patient_id, week_start, week_end)
+        if not weekly_data['entries']:
+            raise FileNotFoundError('No daily JSON files found for the requested week')
+
+        present = {entry['date'] for entry in weekly_data['entries']}
+        missing_days: List[str] = []
+        current = datetime.strptime(week_start, '%Y-%m-%d')
+        while current <= datetime.strptime(week_end, '%Y-%m-%d'):
+            if current.strftime('%Y-%m-%d') not in present:
+                missing_days.append(current.strftime('%Y-%m-%d'))
+            current += timedelta(days=1)
+        weekly_data['missing_days'] = missing_days
+        write_json(patient_dir / week_filename(week_start, week_end), weekly_data)
 
     return weekly_data
 
 
-def save_summary(patient_dir: Path, week_start: str, week_end: str, analysis: Dict[str, Any]) -> Path:
-    summary_filename = f'summary_{week_start}_to_{week_end}.json'
-    summary_path = patient_dir / summary_filename
-    with summary_path.open('w') as f:
-        json.dump(analysis, f, indent=2)
-    return summary_path
-
-
 def build_report_text(weekly_data: Dict[str, Any], analysis: Dict[str, Any]) -> str:
     patterns = analysis.get('patterns', [])
     mood = analysis.get('mood_trends', {})
@@ -206,8 +192,8 @@ def build_report_text(weekly_data: Dict[str, Any], analysis: Dict[str, Any]) ->
 def save_report(patient_dir: Path, week_start: str, week_end: str, report_text: str, fmt: str) -> Path:
     extension = 'md' if fmt == 'markdown' else 'txt'
     report_path = patient_dir / f'report_{week_start}_to_{week_end}.{extension}'
-    with report_path.open('w') as f:
-        f.write(report_text)
+    with patient_lock(patient_dir):
+        write_text(report_path, report_text)
     return report_path
 
 
@@ -219,18 +205,21 @@ def run_pipeline(args: argparse.Namespace) -> PipelineResult:
         ingest_entries(entries, patient_dir, overwrite=args.overwrite)
 
     weekly_data = aggregate_week(args.patient_id, patient_dir, args.week_start, args.week_end)
-    analysis = analyze_weekly_entries(weekly_data)
-
-    # Include a synthesized summary for the report if not present
-    if 'summary_text' not in analysis:
-        summary_text = (
-            f"Week of {args.week_start} to {args.week_end}. "
-            f"Analyzed {len(weekly_data['entries'])} entries; overall mood {analysis.get('mood_trends', {}).get('overall_sentiment', 'neutral')}."
-        )
-        analysis['summary_text'] = summary_text
-
-    summary_file = save_summary(patient_dir, args.week_start, args.week_end, analysis)
-    report_text = build_report_text(weekly_data, analysis)
+    # Same analyze -> save step as the API: incremental update in auto mode, and
+    # the summary and derived indexes are only written for a changed analysis
+    with usage_context(endpoint='scripts/full_pipeline'):
+        analysis, summary_filename, _ = analyze_and_save_week(str(patient_dir), weekly_data, args.mode,
+                                                              base_data_dir=str(DATA_DIR))
+    if 'error' in analysis:
+        raise RuntimeError(f"{analysis['error']}: {analysis.get('exception', 'unknown error')}")
+
+    # Include a synthesized summary in the report if the analysis has none
+    report_analysis = dict(analysis)
+    report_analysis.setdefault('summary_text', (
+        f"Week of {args.week_start} to {args.week_end}. "
+        f"Analyzed {len(weekly_data['entries'])} entries; overall mood {analysis.get('mood_trends', {}).get('overall_sentiment', 'neutral')}."
+    ))
+    report_text = build_report_text(weekly_data, report_analysis)
     report_file = save_report(patient_dir, args.week_start, args.week_end, report_text, args.report_format)
 
     return PipelineResult(
@@ -238,8 +227,8 @@ def run_pipeline(args: argparse.Namespace) -> PipelineResult:
         week_start=args.week_start,
         week_end=args.week_end,
         entry_count=len(weekly_data['entries']),
-        weekly_file=patient_dir / f'week_{args.week_start}_to_{args.week_end}.json',
-        summary_file=summary_file,
+        weekly_file=patient_dir / week_filename(args.week_start, args.week_end),
+        summary_file=patient_dir / summary_filename,
         report_file=report_file,
         analysis=analysis,
     )
@@ -257,10 +246,16 @@ def main() -> None:
     print(f"Patient: {result.patient_id}")
     print(f"Week: {result.week_start} → {result.week_end}")
     print(f"Entries analyzed: {result.entry_count}")
+    print(f"Analysis mode: {result.analysis.get('analysis_mode', 'full')}")
     print(f"Weekly packet saved to: {result.weekly_file}")
     print(f"Summary JSON saved to: {result.summary_file}")
     print(f"Therapist report saved to: {result.report_file}\n")
 
+    scheduler_metrics = get_scheduler().metrics()
+    print(f"LLM requests: {scheduler_metrics['requests_total']} "
+          f"(retries {scheduler_metrics['retries_total']}, "
+          f"waited {scheduler_metrics['wait_seconds_total']}s for rate budget)\n")
+
     print('Top clinical prompts:')
     for prompt in (result.analysis.get('clinical_prompts') or [])[:3]:
         print(f" - {prompt}")
@@ -0,0 +1,401 @@
+"""Generate a large, deterministic synthetic patient dataset.
+
+Unlike `demo_data_generator.py` and `generate_multi_patient_demo.py`, which
+hand-write a few weeks for three patients, this procedurally produces N
+patients x M years of daily journal entries, one weekly summary per week with
+entries, and a matching `patients.json`, for capacity planning and benchmarks:
+
+    python backend/scripts/generate_synthetic_data.py \
+        --patients 3000 --years 1 --out /tmp/synthetic --workers 8
+
+(~1M entries; about 2.5 minutes on one core, proportionally less with more
+workers). Output is laid out exactly like
+`data/`, so point the app at it with `BASE_DATA_DIR=/tmp/synthetic`.
+
+Each patient gets a trajectory (improving, declining, stable or relapsing):
+the weekly score mean-reverts toward a drifting target with noise and the
+occasional low episode, daily entries are written from sentence pools that
+match the day's score, and the weekly summary reports the mean of those days.
+Everything derives from `--seed` and the patient index, so the same arguments
+give byte-identical files whatever the number of workers. Patients are
+generated in worker processes and every file is written as soon as it is
+built, so memory stays flat however large the dataset.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+THERAPISTS = ('Dr. Evelyn Carter', 'Dr. Sarah Chen', 'Dr. Michael Torres', 'Dr. Priya Nair',
+              'Dr. Daniel Okafor', 'Dr. Hannah Weiss')
+TIMEZONES = ('America/Los_Angeles', 'America/Denver', 'America/Chicago', 'America/New_York', 'Europe/London', 'UTC')
+FIRST_NAMES = ('Maya', 'James', 'Alex', 'Sofia', 'Liam', 'Aisha', 'Noah', 'Elena', 'Marcus', 'Priya',
+               'Owen', 'Grace', 'Mateo', 'Hana', 'Caleb', 'Zoe', 'Ravi', 'Leah', 'Tomas', 'Nia')
+LAST_NAMES = ('Thompson', 'Rivera', 'Kim', 'Nguyen', 'Patel', 'Okafor', 'Schmidt', 'Garcia', 'Cohen', 'Silva',
+              'Murphy', 'Tanaka', 'Haddad', 'Kowalski', 'Brooks', 'Larsen', 'Mensah', 'Rossi', 'Ali', 'Novak')
+
+TRAJECTORIES = {
+    # name: (weekly drift of the target score, description)
+    'improving': (0.012, 'showing improvement'),
+    'declining': (-0.010, 'gradual decline'),
+    'stable': (0.0, 'stable with ups and downs'),
+    'relapsing': (0.006, 'improving with relapses'),
+}
+
+# topic: (pattern title, negative, neutral, positive sentences)
+THEMES = {
+    'work': ('Work stress and boundaries', (
+        "Work was overwhelming again and I couldn't say no to another project.",
+        "My manager criticized the report in front of everyone and I wanted to disappear.",
+        "Stayed late at the office again. I feel like I'm always behind.",
+    ), (
+        "Normal day at work, a few meetings, nothing stood out.",
+        "Cleared some of my inbox today. Still a lot left but it's manageable.",
+    ), (
+        "I told my manager I couldn't take on the extra project and it went fine.",
+        "Presented at the team meeting and people actually liked my ideas.",
+    )),
+    'sleep': ('Sleep disruption', (
+        "Slept badly, woke up at 4am with my mind racing.",
+        "Couldn't fall asleep until 2am. Exhausted all day.",
+    ), (
+        "Slept around six hours. Not great, not terrible.",
+    ), (
+        "Slept through the night for the first time in weeks.",
+        "Kept my phone out of the bedroom and fell asleep easily.",
+    )),
+    'family': ('Family tension', (
+        "Another argument with mom on the phone. I hung up and cried.",
+        "Family dinner was tense. Nobody talks about what actually happened.",
+    ), (
+        "Called my sister to plan the holidays.",
+    ), (
+        "Called mom today. It went better than expected, we laughed a bit.",
+        "My brother visited and we talked honestly for the first time in years.",
+    )),
+    'social': ('Social withdrawal and connection', (
+        "Cancelled plans with friends again. Easier to just stay home.",
+        "Everyone seems to have their life together except me.",
+    ), (
+        "Texted a friend back after a few days.",
+    ), (
+        "Sarah invited me out and I actually went. Nice to feel connected.",
+        "Joined the running group. People were kind.",
+    )),
+    'anxiety': ('Anxiety and panic', (
+        "Had a panic attack on the train. My chest was so tight I thought I was dying.",
+        "Worried all day about things that probably won't happen.",
+    ), (
+        "Some anxiety this morning but it passed by lunch.",
+    ), (
+        "Felt the anxiety rise and used the breathing exercise. It worked.",
+        "Noticed the worry spiral early and stepped outside for a walk.",
+    )),
+    'grief': ('Grief and loss', (
+        "Found his old coffee mug and sat on the kitchen floor for an hour.",
+        "The house is too quiet. Missing him is a physical ache today.",
+    ), (
+        "Sorted through some old photos.",
+    ), (
+        "Told a funny story about him at dinner and smiled instead of crying.",
+        "Visited the grave and felt more peace than pain.",
+    )),
+    'self_care': ('Self-care routines', (
+        "Skipped the gym, stayed in bed, felt guilty about it all evening.",
+        "Ate junk food all day. I don't have energy to cook.",
+    ), (
+        "Did the grocery run and cooked something simple.",
+    ), (
+        "Went for a long walk after therapy and felt lighter.",
+        "Cooked a real meal and ate it slowly. Small win.",
+    )),
+    'therapy': ('Engagement with therapy', (
+        "Didn't want to go to therapy today. What's the point.",
+    ), (
+        "Therapy session today. We talked about the week.",
+    ), (
+        "Therapy helped me see the pattern with saying yes to everything.",
+        "Practiced the reframing exercise from session and it helped.",
+    )),
+}
+PATTERN_TYPES = ('recurring_theme', 'emotional_cycle', 'behavioral_pattern', 'relationship_dynamic')
+STRENGTHS = (
+    "Uses breathing exercises when anxiety rises",
+    "Shows insight into their own patterns",
+    "Keeps journaling consistently",
+    "Reaches out for support more often",
+    "Sets small, achievable goals",
+)
+CONCERNS = (
+    "Persistent low mood across most of the week",
+    "Increasing social withdrawal",
+    "Sleep disruption is affecting daily functioning",
+    "Expressions of hopelessness warrant follow-up",
+)
+
+
+def patient_rng(seed: int, index: int) -> random.Random:
+    # String seeds hash deterministically, so a patient's data doesn't depend on which worker builds it
+    return random.Random(f"{seed}:{index}")
+
+
+def patient_id_for(index: int, patients: int) -> str:
+    return f"patient-{index:0{max(5, len(str(patients - 1)))}d}"
+
+
+def patient_profile(seed: int, index: int, patients: int) -> Dict[str, Any]:
+    """Registry record and generation parameters for one patient"""
+    rng = patient_rng(seed, index)
+    trajectory = rng.choice(tuple(TRAJECTORIES))
+    topics = rng.sample(tuple(THEMES), 3)
+    return {
+        "id": patient_id_for(index, patients),
+        "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+        "therapist": THERAPISTS[index % len(THERAPISTS)],
+        "timezone": rng.choice(TIMEZONES),
+        "scenario": f"{THEMES[topics[0]][0]} - {TRAJECTORIES[trajectory][1]}",
+        "trajectory": trajectory,
+        "topics": topics,
+        "baseline": rng.uniform(-0.6, 0.1),
+        "adherence": rng.uniform(0.55, 0.95),
+        "rng": rng,
+    }
+
+
+def registry_record(profile: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: profile[key] for key in ('id', 'name', 'therapist', 'timezone', 'scenario')}
+
+
+def band(score: float) -> int:
+    """Index into a theme's sentence pools: 1 negative, 2 neutral, 3 positive"""
+    return 1 if score < -0.25 else 3 if score > 0.25 else 2
+
+
+def entry_text(rng: random.Random, topics: List[str], score: float) -> Tuple[str, List[str]]:
+    chosen = rng.sample(topics, rng.randint(1, 2))
+    sentences = []
+    for topic in chosen:
+        theme = THEMES[topic]
+        sentences.append(rng.choice(theme[band(score + rng.gauss(0, 0.15))]))
+    if rng.random() < 0.3:
+        sentences.append(rng.choice(THEMES['therapy'][band(score)]))
+    return ' '.join(sentences), chosen
+
+
+def sentiment_name(score: float) -> str:
+    return 'positive' if score > 0.2 else 'negative' if score < -0.2 else 'mixed'
+
+
+def severity_for(score: float) -> str:
+    return 'high' if score < -0.45 else 'moderate' if score < 0.05 else 'low'
+
+
+def build_summary(rng: random.Random, week_start: date, days: List[Tuple[str, float, List[str]]]) -> Dict[str, Any]:
+    """Weekly summary in the analysis schema, consistent with the week's entries"""
+    week_end = week_start + timedelta(days=6)
+    score = sum(day_score for _, day_score, _ in days) / len(days)
+    topic_days: Dict[str, List[Tuple[str, float]]] = {}
+    for entry_date, day_score, topics in days:
+        for topic in topics:
+            topic_days.setdefault(topic, []).append((entry_date, day_score))
+    ranked = sorted(topic_days.items(), key=lambda item: -len(item[1]))
+
+    patterns = []
+    for topic, occurrences in ranked[:3]:
+        topic_score = sum(day_score for _, day_score in occurrences) / len(occurrences)
+        patterns.append({
+            "type": rng.choice(PATTERN_TYPES),
+            "title": THEMES[topic][0],
+            "description": f"{THEMES[topic][0]} came up on {len(occurrences)} day(s) this week.",
+            "frequency": len(occurrences),
+            "related_entries": [entry_date for entry_date, _ in occurrences],
+            "severity": severity_for(topic_score)
+        })
+
+    first_half = [day_score for _, day_score, _ in days[:len(days) // 2]] or [score]
+    second_half = [day_score for _, day_score, _ in days[len(days) // 2:]]
+    shift = sum(second_half) / len(second_half) - sum(first_half) / len(first_half)
+
+    return {
+        "analysis_date": (week_end + timedelta(days=1)).isoformat(),
+        "week_period": f"{week_start} to {week_end}",
+        "patterns": patterns,
+        "mood_trends": {
+            "overall_sentiment": sentiment_name(score),
+            "sentiment_score": round(score, 2),
+            "mood_shift": ("Mood lifted toward the end of the week." if shift > 0.1 else
+                           "Mood dipped toward the end of the week." if shift < -0.1 else
+                           "Mood was fairly steady through the week."),
+            "notable_times": rng.choice(("Mornings are harder.", "Evenings are the most reflective.",
+                                         "Weekends bring more low moments."))
+        },
+        "key_topics": [
+            {
+                "topic": topic.replace('_', ' '),
+                "count": len(occurrences),
+                "sentiment": sentiment_name(sum(day_score for _, day_score in occurrences) / len(occurrences))
+            }
+            for topic, occurrences in ranked
+        ],
+        "clinical_prompts": [f"Explore what has changed around {ranked[0][0].replace('_', ' ')} this week."],
+        "strengths_observed": rng.sample(STRENGTHS, 1 if score < 0 else 2),
+        "concerns": rng.sample(CONCERNS, 1 if score < -0.45 else 0),
+        "model_used": "synthetic",
+        "entry_count": len(days)
+    }
+
+
+def write_patient(task: Tuple[Path, int, int, int, int, str, float | None, bool]) -> Tuple[int, int]:
+    """Write one patient's entries and summaries; returns (entries, summaries)"""
+    out_dir, seed, index, patients, weeks, first_week, adherence, local_sentiment = task
+    profile = patient_profile(seed, index, patients)
+    adherence = profile['adherence'] if adherence is None else adherence
+    rng = profile['rng']
+    drift = TRAJECTORIES[profile['trajectory']][0]
+    patient_dir = out_dir / profile['id']
+    patient_dir.mkdir(parents=True, exist_ok=True)
+
+    if local_sentiment:
+        from utils.sentiment import annotate_entries
+
+    week_start = date.fromisoformat(first_week)
+    target = score = profile['baseline']
+    low_weeks = 0
+    entries_written = summaries_written = 0
+
+    for _ in range(weeks):
+        # Mean-reverting weekly score around a drifting target, plus occasional low episodes
+        target = max(-0.8, min(0.7, target + drift))
+        if low_weeks == 0 and rng.random() < (0.03 if profile['trajectory'] == 'relapsing' else 0.01):
+            low_weeks = rng.randint(2, 6)
+        pull = target - (0.5 if low_weeks else 0.0)
+        low_weeks = max(0, low_weeks - 1)
+        score = max(-1.0, min(1.0, score + 0.35 * (pull - score) + rng.gauss(0, 0.08)))
+
+        days = []
+        entries = []
+        for offset in range(7):
+            if rng.random() > adherence:
+                continue
+            entry_date = (week_start + timedelta(days=offset)).isoformat()
+            day_score = max(-1.0, min(1.0, score + rng.gauss(0, 0.2)))
+            text, topics = entry_text(rng, profile['topics'], day_score)
+            entries.append({"date": entry_date, "time": f"{rng.randint(6, 23):02d}:{rng.randint(0, 59):02d}",
+                            "text": text})
+            days.append((entry_date, day_score, topics))
+
+        if entries:
+            if local_sentiment:
+                annotate_entries(entries)
+            for entry in entries:
+                (patient_dir / f"{entry['date']}.json").write_text(json.dumps(entry, indent=2))
+            week_end = week_start + timedelta(days=6)
+            summary = build_summary(rng, week_start, days)
+            (patient_dir / f"summary_{week_start}_to_{week_end}.json").write_text(json.dumps(summary, indent=2))
+            entries_written += len(entries)
+            summaries_written += 1
+
+        week_start += timedelta(weeks=1)
+
+    return entries_written, summaries_written
+
+
+def generate(out_dir: Path, patients: int, years: int, seed: int = 7, workers: int | None = None,
+             first_week: str = '2020-01-05', adherence: float | None = None, local_sentiment: bool = False,
+             progress: bool = False) -> Dict[str, int]:
+    """
+    Generate the dataset under out_dir and return counts
+
+    Args:
+        out_dir: Output directory (laid out like data/)
+        patients: Number of patients
+        years: Years of history per patient (52 weeks each)
+        seed: Seed; the same arguments give identical files
+        workers: Worker processes (default: CPU count)
+        first_week: First week start (YYYY-MM-DD)
+        adherence: Fraction of days with an entry (default: drawn per patient, 0.55-0.95)
+        local_sentiment: Attach `local_sentiment` records as the API does on ingest (slower)
+        progress: Print progress to stderr
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    registry = []
+    for index in range(patients):
+        profile = patient_profile(seed, index, patients)
+        registry.append(registry_record(profile))
+    (out_dir / 'patients.json').write_text(json.dumps({"patients": registry}, indent=2))
+
+    tasks = [(out_dir, seed, index, patients, 52 * years, first_week, adherence, local_sentiment)
+             for index in range(patients)]
+    totals = {"patients": patients, "entries": 0, "summaries": 0}
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+
+    if workers == 1:
+        pool = None
+        results = map(write_patient, tasks)
+    else:
+        pool = multiprocessing.Pool(workers)
+        results = pool.imap_unordered(write_patient, tasks, chunksize=max(1, min(32, patients // (workers * 8))))
+    try:
+        for done, (entries, summaries) in enumerate(results, 1):
+            totals['entries'] += entries
+            totals['summaries'] += summaries
+            if progress and (done % 100 == 0 or done == patients):
+                elapsed = time.perf_counter() - started
+                print(f"{done}/{patients} patients, {totals['entries']} entries, "
+                      f"{totals['entries'] / max(elapsed, 1e-9):,.0f} entries/s", file=sys.stderr)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    return totals
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Generate a deterministic synthetic patient dataset")
+    parser.add_argument('--patients', type=int, required=True, help='Number of patients')
+    parser.add_argument('--years', type=int, default=1, help='Years of daily entries per patient (default: 1)')
+    parser.add_argument('--out', required=True, help='Output directory (use as BASE_DATA_DIR)')
+    parser.add_argument('--seed', type=int, default=7, help='Random seed (default: 7)')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--first-week', default='2020-01-05', help='First week start, YYYY-MM-DD (default: 2020-01-05)')
+    parser.add_argument('--adherence', type=float, default=None,
+                        help='Fraction of days with an entry (default: drawn per patient between 0.55 and 0.95)')
+    parser.add_argument('--local-sentiment', action='store_true',
+                        help='Attach local_sentiment records to entries, as the API does on ingest')
+    parser.add_argument('--force', action='store_true', help='Write into a non-empty output directory')
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    out_dir = Path(args.out)
+    if out_dir.exists() and any(out_dir.iterdir()) and not args.force:
+        print(f"{out_dir} is not empty; pass --force to write into it anyway", file=sys.stderr)
+        sys.exit(1)
+
+    started = time.perf_counter()
+    totals = generate(out_dir, args.patients, args.years, seed=args.seed, workers=args.workers,
+                      first_week=args.first_week, adherence=args.adherence,
+                      local_sentiment=args.local_sentiment, progress=True)
+    elapsed = time.perf_counter() - started
+    print(f"Wrote {totals['patients']} patients, {totals['entries']} entries and {totals['summaries']} summaries "
+          f"to {out_dir} in {elapsed:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
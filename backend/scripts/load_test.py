@@ -0,0 +1,387 @@
+"""End-to-end load test for the HTTP API.
+
+Drives a weighted mix of requests against the app and reports throughput,
+p50/p95/p99 latency and error rate per endpoint:
+
+    patients    GET  /api/patients
+    analyses    GET  /api/patients/<id>/analyses
+    convert     POST /api/convert-google-doc      (plain-text entry in the patient's latest week)
+    aggregate   POST /api/aggregate-week          (the patient's latest week)
+    analyze     POST /api/analyze-week            (the patient's latest week, mode "full")
+
+By default the harness builds everything it needs: a synthetic dataset
+(scripts/generate_synthetic_data.py), the mock OpenAI server
+(scripts/mock_openai_server.py) and the app itself under gunicorn or uvicorn,
+once per `--workers` value, so worker settings and code changes can be
+compared on identical data and LLM behaviour:
+
+    python backend/scripts/load_test.py --patients 200 --workers 1,2,4 --concurrency 32 --duration 60
+    python backend/scripts/load_test.py --server uvicorn --rate 50 --llm-latency lognormal:1.5,0.4
+    python backend/scripts/load_test.py --target http://127.0.0.1:5000 --mix patients=1,analyses=3
+
+`--concurrency` alone runs a closed loop (each client sends its next request
+as soon as the previous one returns). With `--rate`, requests arrive as a
+Poisson process at that many per second and `--concurrency` caps how many
+are outstanding; latency is then measured from the scheduled arrival, so a
+saturated server shows up as queueing time instead of a lower request rate.
+Requests in the first `--warmup` seconds are not counted. Everything random
+is seeded with `--seed`.
+
+With `--target`, the app (and whatever LLM it is configured with) is already
+running; patients and weeks are discovered through /api/patients.
+"""
+
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+from urllib.parse import urlsplit
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+from scripts.bench_asgi import SERVER_COMMANDS, free_port, percentile, wait_for_health
+from scripts.generate_synthetic_data import generate
+from scripts.mock_openai_server import start_mock_server
+
+DEFAULT_MIX = 'patients=15,analyses=40,convert=20,aggregate=15,analyze=10'
+SERVERS = {'gunicorn': 'wsgi', 'uvicorn': 'asgi'}
+ENTRY_TEXTS = (
+    "Work was a lot today but I left on time and went for a walk.",
+    "Slept badly again. Anxious about the meeting tomorrow.",
+    "Had dinner with my sister. It felt good to talk.",
+    "Skipped the gym, felt low most of the afternoon.",
+)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Load test the API with a mixed workload")
+    parser.add_argument('--target', help='Base URL of a running server (default: start one per --workers value)')
+    parser.add_argument('--server', choices=tuple(SERVERS), default='gunicorn',
+                        help='Server to start (default: gunicorn)')
+    parser.add_argument('--workers', default='2', help='Comma-separated worker counts to compare (default: 2)')
+    parser.add_argument('--threads', type=int, default=1, help='gunicorn --threads per worker (default: 1)')
+    parser.add_argument('--patients', type=int, default=100, help='Synthetic patients to generate (default: 100)')
+    parser.add_argument('--years', type=int, default=1, help='Years of history per patient (default: 1)')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Operation weights (default: {DEFAULT_MIX})')
+    parser.add_argument('--concurrency', type=int, default=16, help='Concurrent clients / max outstanding requests')
+    parser.add_argument('--rate', type=float, default=None, help='Open-loop arrival rate in requests per second')
+    parser.add_argument('--duration', type=float, default=30.0, help='Measured seconds per run (default: 30)')
+    parser.add_argument('--warmup', type=float, default=5.0, help='Seconds before measuring starts (default: 5)')
+    parser.add_argument('--timeout', type=float, default=120.0, help='Per-request timeout in seconds')
+    parser.add_argument('--llm-latency', default='lognormal:1.0,0.3',
+                        help='Mock LLM latency spec (see mock_openai_server)')
+    parser.add_argument('--llm-rate-429', type=float, default=0.0, help='Mock LLM fraction of 429 responses')
+    parser.add_argument('--llm-rate-500', type=float, default=0.0, help='Mock LLM fraction of 500 responses')
+    parser.add_argument('--seed', type=int, default=7, help='Seed for data, request mix and arrivals (default: 7)')
+    parser.add_argument('--output', help='Optional JSON file for results')
+    return parser.parse_args()
+
+
+def parse_mix(spec: str) -> List[Tuple[str, float]]:
+    mix = []
+    for part in spec.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in OPERATIONS:
+            raise SystemExit(f"Unknown operation {name.strip()!r}; choose from {', '.join(OPERATIONS)}")
+        mix.append((name.strip(), float(weight or 1)))
+    return mix
+
+
+@dataclass
+class Target:
+    patient_id: str
+    week_start: str
+    week_end: str
+
+
+def op_patients(rng: random.Random, target: Target) -> Tuple[str, str, Dict[str, Any] | None]:
+    return 'GET', '/api/patients', None
+
+
+def op_analyses(rng: random.Random, target: Target) -> Tuple[str, str, Dict[str, Any] | None]:
+    return 'GET', f'/api/patients/{target.patient_id}/analyses', None
+
+
+def op_convert(rng: random.Random, target: Target) -> Tuple[str, str, Dict[str, Any] | None]:
+    entry_date = date.fromisoformat(target.week_start) + timedelta(days=rng.randint(0, 6))
+    return 'POST', '/api/convert-google-doc', {
+        "patient_id": target.patient_id,
+        "doc_url": rng.choice(ENTRY_TEXTS),
+        "date": entry_date.isoformat()
+    }
+
+
+def op_aggregate(rng: random.Random, target: Target) -> Tuple[str, str, Dict[str, Any] | None]:
+    return 'POST', '/api/aggregate-week', {
+        "patient_id": target.patient_id, "week_start": target.week_start, "week_end": target.week_end
+    }
+
+
+def op_analyze(rng: random.Random, target: Target) -> Tuple[str, str, Dict[str, Any] | None]:
+    return 'POST', '/api/analyze-week', {
+        "patient_id": target.patient_id, "week_start": target.week_start, "week_end": target.week_end,
+        "mode": "full"
+    }
+
+
+OPERATIONS: Dict[str, Callable[[random.Random, Target], Tuple[str, str, Dict[str, Any] | None]]] = {
+    'patients': op_patients,
+    'analyses': op_analyses,
+    'convert': op_convert,
+    'aggregate': op_aggregate,
+    'analyze': op_analyze,
+}
+
+
+class Client:
+    """One keep-alive HTTP connection per load-generating thread"""
+
+    def __init__(self, base_url: str, timeout: float) -> None:
+        parts = urlsplit(base_url)
+        self.host, self.port, self.timeout = parts.hostname, parts.port or 80, timeout
+        self.connection: http.client.HTTPConnection | None = None
+
+    def request(self, method: str, path: str, payload: Dict[str, Any] | None = None) -> Tuple[int, bytes]:
+        body = json.dumps(payload).encode('utf-8') if payload is not None else None
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self.connection.request(method, path, body=body, headers=headers)
+                response = self.connection.getresponse()
+                data = response.read()
+                if response.getheader('Connection', '').lower() == 'close':
+                    self.close()
+                return response.status, data
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                # The server closed an idle keep-alive connection; one retry on a fresh one
+                self.close()
+                if attempt:
+                    raise
+        raise RuntimeError('unreachable')
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def discover_targets(base_url: str, timeout: float) -> List[Target]:
+    """Each patient's latest summarized week, with its weekly file written so analyze-week can run"""
+    client = Client(base_url, timeout)
+    status, body = client.request('GET', '/api/patients')
+    if status != 200:
+        raise RuntimeError(f"/api/patients returned {status}")
+    targets = [
+        Target(patient['patient_id'], patient['latest_week']['start'], patient['latest_week']['end'])
+        for patient in json.loads(body)['patients'] if patient.get('latest_week')
+    ]
+    if not targets:
+        raise RuntimeError("No patient has a summarized week to target")
+    for target in targets:
+        method, path, payload = op_aggregate(random.Random(0), target)
+        client.request(method, path, payload)
+    client.close()
+    return targets
+
+
+class Recorder:
+    def __init__(self, measure_from: float) -> None:
+        self.measure_from = measure_from
+        self.lock = threading.Lock()
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, Dict[str, int]] = {}
+
+    def record(self, operation: str, started: float, latency: float, status: int | str) -> None:
+        if started < self.measure_from:
+            return
+        with self.lock:
+            self.samples.setdefault(operation, []).append(latency)
+            errors = self.errors.setdefault(operation, {})
+            if not (isinstance(status, int) and 200 <= status < 300):
+                errors[str(status)] = errors.get(str(status), 0) + 1
+
+
+def run_load(base_url: str, targets: List[Target], args: argparse.Namespace) -> Dict[str, Any]:
+    mix = parse_mix(args.mix)
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    started = time.perf_counter()
+    measure_from = started + args.warmup
+    deadline = measure_from + args.duration
+    recorder = Recorder(measure_from)
+    local = threading.local()
+
+    def send(rng: random.Random, scheduled: float) -> None:
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = Client(base_url, args.timeout)
+        operation = rng.choices(names, weights)[0]
+        method, path, payload = OPERATIONS[operation](rng, rng.choice(targets))
+        try:
+            status: int | str = client.request(method, path, payload)[0]
+        except Exception as e:
+            client.close()
+            status = type(e).__name__
+        recorder.record(operation, scheduled, time.perf_counter() - scheduled, status)
+
+    if args.rate:
+        # Open loop: Poisson arrivals; a request waiting for a free slot is already accruing latency
+        rng = random.Random(args.seed)
+        slots = threading.BoundedSemaphore(args.concurrency)
+        next_arrival = started
+
+        def send_and_release(request_rng: random.Random, scheduled: float) -> None:
+            try:
+                send(request_rng, scheduled)
+            finally:
+                slots.release()
+
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            while next_arrival < deadline:
+                delay = next_arrival - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                slots.acquire()
+                pool.submit(send_and_release, random.Random(rng.random()), next_arrival)
+                next_arrival += rng.expovariate(args.rate)
+    else:
+        def client_loop(index: int) -> None:
+            rng = random.Random(f"{args.seed}:{index}")
+            while time.perf_counter() < deadline:
+                send(rng, time.perf_counter())
+
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(client_loop, range(args.concurrency)))
+
+    # Requests sent before the deadline still count when they finish after it
+    return summarize(recorder, args.duration)
+
+
+def summarize(recorder: Recorder, measured: float) -> Dict[str, Any]:
+    def row(samples: List[float], errors: Dict[str, int]) -> Dict[str, Any]:
+        error_count = sum(errors.values())
+        return {
+            "requests": len(samples),
+            "throughput_rps": round(len(samples) / measured, 2),
+            "error_rate": round(error_count / len(samples), 4) if samples else 0.0,
+            "errors": errors,
+            "p50_ms": round(percentile(samples, 50) * 1000, 1),
+            "p95_ms": round(percentile(samples, 95) * 1000, 1),
+            "p99_ms": round(percentile(samples, 99) * 1000, 1),
+            "max_ms": round(max(samples) * 1000, 1)
+        }
+
+    endpoints = {name: row(samples, recorder.errors.get(name, {}))
+                 for name, samples in sorted(recorder.samples.items())}
+    all_samples = [latency for samples in recorder.samples.values() for latency in samples]
+    all_errors: Dict[str, int] = {}
+    for errors in recorder.errors.values():
+        for status, count in errors.items():
+            all_errors[status] = all_errors.get(status, 0) + count
+    return {
+        "measured_seconds": round(measured, 2),
+        "total": row(all_samples, all_errors) if all_samples else {"requests": 0},
+        "endpoints": endpoints
+    }
+
+
+def print_report(label: str, result: Dict[str, Any]) -> None:
+    print(f"\n{label} ({result['measured_seconds']}s measured)")
+    print(f"{'endpoint':<12}{'requests':>10}{'rps':>9}{'errors':>9}"
+          f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, row in list(result['endpoints'].items()) + [('total', result['total'])]:
+        if not row.get('requests'):
+            continue
+        print(f"{name:<12}{row['requests']:>10}{row['throughput_rps']:>9.1f}{row['error_rate']:>9.1%}"
+              f"{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}{row['max_ms']:>10.1f}")
+
+
+def run_managed(args: argparse.Namespace, workers: int, dataset: Path, llm_url: str) -> Dict[str, Any]:
+    """Start the app on a fresh copy of the dataset, run the load, stop the app"""
+    data_dir = Path(tempfile.mkdtemp(prefix='load-test-data-'))
+    shutil.copytree(dataset, data_dir, dirs_exist_ok=True)
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = dict(
+        os.environ,
+        BASE_DATA_DIR=str(data_dir),
+        OPENAI_BASE_URL=llm_url,
+        OPENAI_API_KEY='load-test',
+        WEEKLY_SCHEDULER_ENABLED='false',
+        AUTO_ANALYSIS_ENABLED='false',
+        USAGE_LEDGER_DIR=str(data_dir / '.usage'),
+        PROMETHEUS_MULTIPROC_DIR=tempfile.mkdtemp(prefix='load-test-metrics-')
+    )
+    command = [sys.executable] + [part.format(port=port, workers=workers)
+                                  for part in SERVER_COMMANDS[SERVERS[args.server]]]
+    if args.server == 'gunicorn':
+        command += ['--threads', str(args.threads)]
+    process = subprocess.Popen(command, cwd=BASE_DIR, env=env, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_health(base_url, process, timeout=60)
+        return run_load(base_url, discover_targets(base_url, args.timeout), args)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+        shutil.rmtree(data_dir, ignore_errors=True)
+        shutil.rmtree(env['PROMETHEUS_MULTIPROC_DIR'], ignore_errors=True)
+
+
+def main() -> None:
+    args = parse_args()
+    parse_mix(args.mix)
+    load = f"rate {args.rate}/s, max {args.concurrency} outstanding" if args.rate else f"{args.concurrency} clients"
+    report: Dict[str, Any] = {"mix": args.mix, "load": load, "duration_s": args.duration, "runs": []}
+
+    if args.target:
+        result = run_load(args.target.rstrip('/'), discover_targets(args.target.rstrip('/'), args.timeout), args)
+        print_report(f"{args.target}, {load}", result)
+        report['runs'].append({"target": args.target, **result})
+    else:
+        dataset = Path(tempfile.mkdtemp(prefix='load-test-dataset-'))
+        print(f"Generating {args.patients} patients x {args.years} year(s)...", file=sys.stderr)
+        generate(dataset, args.patients, args.years, seed=args.seed)
+        llm_server = start_mock_server(latency=args.llm_latency, rate_429=args.llm_rate_429,
+                                       rate_500=args.llm_rate_500, seed=args.seed)
+        report['llm'] = {"latency": args.llm_latency, "rate_429": args.llm_rate_429, "rate_500": args.llm_rate_500}
+        try:
+            for workers in [int(value) for value in args.workers.split(',') if value.strip()]:
+                llm_server.config.reset_stats()
+                result = run_managed(args, workers, dataset, llm_server.base_url)
+                label = f"{args.server} --workers {workers}"
+                if args.server == 'gunicorn':
+                    label += f" --threads {args.threads}"
+                print_report(f"{label}, {load}", result)
+                with llm_server.config.lock:
+                    llm_stats = json.loads(json.dumps(llm_server.config.stats))
+                print(f"LLM calls: {llm_stats['requests']} {llm_stats['statuses']}")
+                report['runs'].append({"server": args.server, "workers": workers, "threads": args.threads,
+                                       **result, "llm_calls": llm_stats})
+        finally:
+            llm_server.shutdown()
+            shutil.rmtree(dataset, ignore_errors=True)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
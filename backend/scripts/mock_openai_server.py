@@ -0,0 +1,390 @@
+"""Local stand-in for the OpenAI chat completions API, for load and soak tests.
+
+Answers `POST /v1/chat/completions` (plain and `stream: true`) with analysis
+JSON that passes utils/analysis_schema for both prompt types the app sends:
+weekly analyses (including delta updates and section follow-ups) and
+long-term trend analyses. Latency, error injection and token usage are
+configurable, so the whole stack can be benchmarked without network or cost:
+
+    python backend/scripts/mock_openai_server.py --port 8090 \
+        --latency lognormal:1.2,0.4 --rate-429 0.02 --rate-500 0.005
+
+    OPENAI_BASE_URL=http://127.0.0.1:8090/v1 OPENAI_API_KEY=mock gunicorn app:app
+
+Latency specs (seconds): `fixed:S`, `uniform:LOW,HIGH`, `normal:MEAN,STDDEV`
+and `lognormal:MEDIAN,SIGMA`. Injected 429s carry a Retry-After header and an
+OpenAI-style error body; `--rate-truncated` returns JSON cut off mid-object
+with `finish_reason: "length"`, which exercises the schema repair path.
+Token usage is estimated at four characters per token and reported on every
+response (and in the final chunk of streams that ask for it).
+
+`GET /stats` returns request, status and token counters since start (and
+`POST /stats/reset` clears them), so a load test can check what the app
+actually sent. Other scripts start the server in-process with
+`start_mock_server()`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Tuple
+
+DATE_PATTERN = re.compile(r'\b\d{4}-\d{2}-\d{2}\b')
+WEEKS_PATTERN = re.compile(r'You have access to (\d+) weeks')
+LATENCY_DISTRIBUTIONS = ('fixed', 'uniform', 'normal', 'lognormal')
+STREAM_CHUNK_CHARS = 64
+
+TOPICS = ('work', 'sleep', 'family', 'social connection', 'anxiety', 'self-care', 'grief', 'therapy')
+PATTERN_TITLES = ('Work stress and boundaries', 'Sleep disruption', 'Family tension', 'Social withdrawal',
+                  'Anxiety before commitments', 'Inconsistent self-care')
+
+
+@dataclass
+class MockConfig:
+    latency: str = 'fixed:0.5'
+    rate_429: float = 0.0
+    rate_500: float = 0.0
+    rate_truncated: float = 0.0
+    retry_after: float = 1.0
+    seed: int = 7
+    stats: Dict[str, Any] = field(default_factory=dict, init=False)
+
+    def __post_init__(self) -> None:
+        self.distribution, self.params = parse_latency(self.latency)
+        self.rng = random.Random(self.seed)
+        self.lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        with self.lock:
+            self.stats = {"requests": 0, "streamed": 0, "statuses": {}, "kinds": {},
+                          "prompt_tokens": 0, "completion_tokens": 0}
+
+    def draw(self) -> Tuple[float, float]:
+        """(latency seconds, uniform draw for failure injection) from the shared seeded generator"""
+        with self.lock:
+            rng = self.rng
+            if self.distribution == 'fixed':
+                latency = self.params[0]
+            elif self.distribution == 'uniform':
+                latency = rng.uniform(*self.params)
+            elif self.distribution == 'normal':
+                latency = rng.gauss(*self.params)
+            else:
+                latency = rng.lognormvariate(0, self.params[1]) * self.params[0]
+            return max(0.0, latency), rng.random()
+
+    def count(self, status: int, kind: str, streamed: bool, usage: Dict[str, int] | None) -> None:
+        with self.lock:
+            self.stats['requests'] += 1
+            self.stats['streamed'] += streamed
+            self.stats['statuses'][str(status)] = self.stats['statuses'].get(str(status), 0) + 1
+            self.stats['kinds'][kind] = self.stats['kinds'].get(kind, 0) + 1
+            if usage:
+                self.stats['prompt_tokens'] += usage['prompt_tokens']
+                self.stats['completion_tokens'] += usage['completion_tokens']
+
+
+def parse_latency(spec: str) -> Tuple[str, List[float]]:
+    """Parse a latency spec such as "lognormal:1.2,0.4" into (distribution, params)"""
+    name, _, raw = spec.partition(':')
+    expected = {'fixed': 1, 'uniform': 2, 'normal': 2, 'lognormal': 2}
+    if name not in expected:
+        raise ValueError(f"latency distribution must be one of {', '.join(LATENCY_DISTRIBUTIONS)}")
+    params = [float(part) for part in raw.split(',') if part.strip()]
+    if len(params) != expected[name]:
+        raise ValueError(f"{name} latency takes {expected[name]} parameter(s), e.g. {name}:"
+                         + ','.join(['1.0', '0.3'][:expected[name]]))
+    return name, params
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def prompt_kind(messages: List[Dict[str, Any]]) -> str:
+    text = ' '.join(str(message.get('content', '')) for message in messages)
+    if '"meta_patterns"' in text:
+        return 'long_term'
+    if 'is missing these sections' in text:
+        return 'sections'
+    if 'You previously analyzed the week' in text:
+        return 'delta'
+    return 'weekly'
+
+
+def weekly_analysis(rng: random.Random, prompt: str) -> Dict[str, Any]:
+    dates = sorted(set(DATE_PATTERN.findall(prompt)))
+    related = dates[-7:] or ['2025-01-01']
+    score = round(rng.uniform(-0.7, 0.5), 2)
+    severity = 'high' if score < -0.4 else 'moderate' if score < 0.1 else 'low'
+    topics = rng.sample(TOPICS, 3)
+    return {
+        "analysis_date": related[-1],
+        "week_period": f"{related[0]} to {related[-1]}",
+        "patterns": [
+            {
+                "type": rng.choice(('recurring_theme', 'emotional_cycle', 'behavioral_pattern')),
+                "title": title,
+                "description": f"{title} appears in several entries this week.",
+                "frequency": rng.randint(1, len(related)),
+                "related_entries": rng.sample(related, min(2, len(related))),
+                "severity": severity
+            }
+            for title in rng.sample(PATTERN_TITLES, 2)
+        ],
+        "mood_trends": {
+            "overall_sentiment": 'positive' if score > 0.2 else 'negative' if score < -0.2 else 'mixed',
+            "sentiment_score": score,
+            "mood_shift": "Mood was lower early in the week and steadier toward the end.",
+            "notable_times": "Evenings are the most difficult."
+        },
+        "key_topics": [
+            {"topic": topic, "count": rng.randint(1, 5), "sentiment": rng.choice(('positive', 'negative', 'neutral'))}
+            for topic in topics
+        ],
+        "clinical_prompts": [f"Explore how {topics[0]} has affected the week."],
+        "strengths_observed": ["Continues to journal regularly"],
+        "concerns": ["Low mood on several days"] if score < -0.4 else []
+    }
+
+
+def long_term_analysis(rng: random.Random, prompt: str) -> Dict[str, Any]:
+    dates = sorted(set(DATE_PATTERN.findall(prompt)))
+    weeks_match = WEEKS_PATTERN.search(prompt)
+    weeks = int(weeks_match.group(1)) if weeks_match else 4
+    first, last = (dates[0], dates[-1]) if dates else ('2025-01-01', '2025-03-31')
+    progression = [round(rng.uniform(-0.6, 0.4), 2) for _ in range(min(weeks, 12))]
+    direction = 'improving' if progression[-1] > progression[0] + 0.1 else \
+        'declining' if progression[-1] < progression[0] - 0.1 else 'stable'
+    return {
+        "analysis_period": f"{first} to {last}",
+        "weeks_analyzed": weeks,
+        "meta_patterns": [
+            {
+                "theme": title,
+                "description": f"{title} recurs across the period.",
+                "weeks_present": dates[:3],
+                "severity_trend": rng.choice(('increasing', 'decreasing', 'stable')),
+                "first_observed": first,
+                "last_observed": last
+            }
+            for title in rng.sample(PATTERN_TITLES, 2)
+        ],
+        "trajectory": {
+            "overall_direction": direction,
+            "sentiment_progression": progression,
+            "narrative": f"Overall the period looks {direction}."
+        },
+        "cyclical_patterns": [{"pattern": "Lower mood at the start of each week", "frequency": "weekly",
+                               "trigger": "Return to work"}],
+        "persistent_concerns": [{"concern": "Sleep disruption", "severity": "moderate",
+                                 "weeks_present": max(1, weeks // 2), "evolution": "Slowly improving"}],
+        "progress_indicators": ["Uses coping strategies from sessions more often"],
+        "treatment_recommendations": [{"approach": "Behavioral activation",
+                                       "rationale": "Withdrawal and low mood recur together",
+                                       "priority": "medium"}]
+    }
+
+
+def completion_content(kind: str, messages: List[Dict[str, Any]]) -> str:
+    prompt = str(messages[-1].get('content', '')) if messages else ''
+    # Seeded by the prompt, so the same request always gets the same analysis
+    rng = random.Random(hashlib.sha256(prompt.encode('utf-8')).hexdigest())
+    analysis = long_term_analysis(rng, prompt) if kind == 'long_term' else weekly_analysis(rng, prompt)
+    return json.dumps(analysis)
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, as the SDK's connection pool expects
+    server: 'MockOpenAIServer'
+
+    def do_GET(self) -> None:
+        if self.path.rstrip('/') == '/stats':
+            with self.server.config.lock:
+                self.send_json(200, self.server.config.stats)
+        elif self.path.rstrip('/') in ('/health', '/v1/models'):
+            self.send_json(200, {"object": "list", "data": [{"id": "mock", "object": "model"}]})
+        else:
+            self.send_json(404, error_body("Not found", 'invalid_request_error'))
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        path = self.path.rstrip('/')
+        if path == '/stats/reset':
+            self.server.config.reset_stats()
+            self.send_json(200, {"reset": True})
+            return
+        if path not in ('/v1/chat/completions', '/chat/completions'):
+            self.send_json(404, error_body("Not found", 'invalid_request_error'))
+            return
+
+        try:
+            request = json.loads(body or b'{}')
+            messages = request['messages']
+        except (ValueError, KeyError):
+            self.send_json(400, error_body("Request body must be JSON with messages", 'invalid_request_error'))
+            return
+
+        config = self.server.config
+        kind = prompt_kind(messages)
+        streamed = bool(request.get('stream'))
+        latency, draw = config.draw()
+
+        if draw < config.rate_429:
+            time.sleep(min(latency, 0.05))
+            config.count(429, kind, streamed, None)
+            self.send_json(429, error_body("Rate limit reached (injected by mock server)", 'rate_limit_exceeded'),
+                           headers={'Retry-After': f"{config.retry_after:g}"})
+            return
+        if draw < config.rate_429 + config.rate_500:
+            time.sleep(latency)
+            config.count(500, kind, streamed, None)
+            self.send_json(500, error_body("Internal server error (injected by mock server)", 'server_error'))
+            return
+
+        content = completion_content(kind, messages)
+        finish_reason = 'stop'
+        if draw < config.rate_429 + config.rate_500 + config.rate_truncated:
+            content, finish_reason = content[:len(content) // 2], 'length'
+        prompt_tokens = sum(estimate_tokens(str(message.get('content', ''))) for message in messages)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": estimate_tokens(content),
+                 "total_tokens": prompt_tokens + estimate_tokens(content),
+                 "prompt_tokens_details": {"cached_tokens": 0}}
+        model = request.get('model', 'mock')
+        config.count(200, kind, streamed, usage)
+
+        if streamed:
+            include_usage = bool((request.get('stream_options') or {}).get('include_usage'))
+            self.stream_completion(model, content, finish_reason, usage if include_usage else None, latency)
+            return
+
+        time.sleep(latency)
+        self.send_json(200, {
+            "id": f"chatcmpl-mock-{int(time.time() * 1000)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "finish_reason": finish_reason,
+                "message": {"role": "assistant", "content": content}
+            }],
+            "usage": usage
+        })
+
+    def stream_completion(self, model: str, content: str, finish_reason: str,
+                          usage: Dict[str, Any] | None, latency: float) -> None:
+        """Server-sent events: a third of the latency before the first token, the rest spread over the chunks"""
+        pieces = [content[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(content), STREAM_CHUNK_CHARS)]
+        base = {"id": f"chatcmpl-mock-{int(time.time() * 1000)}", "object": "chat.completion.chunk",
+                "created": int(time.time()), "model": model}
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')  # No Content-Length, so the end of the body is the connection close
+        self.end_headers()
+        self.close_connection = True
+
+        def event(payload: Any) -> None:
+            data = payload if isinstance(payload, str) else json.dumps(payload)
+            self.wfile.write(f"data: {data}\n\n".encode('utf-8'))
+            self.wfile.flush()
+
+        time.sleep(latency / 3)
+        event({**base, "choices": [{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}]})
+        for piece in pieces:
+            time.sleep(latency * 2 / 3 / len(pieces))
+            event({**base, "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]})
+        event({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}]})
+        if usage is not None:
+            event({**base, "choices": [], "usage": usage})
+        event('[DONE]')
+
+    def send_json(self, status: int, payload: Any, headers: Dict[str, str] | None = None) -> None:
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+def error_body(message: str, code: str) -> Dict[str, Any]:
+    error_type = 'requests' if code == 'rate_limit_exceeded' else code
+    return {"error": {"message": message, "type": error_type, "param": None, "code": code}}
+
+
+class MockOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 2048
+
+    def __init__(self, address: Tuple[str, int], config: MockConfig) -> None:
+        super().__init__(address, MockOpenAIHandler)
+        self.config = config
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+
+def start_mock_server(host: str = '127.0.0.1', port: int = 0, **config: Any) -> MockOpenAIServer:
+    """Start the mock in a background thread; use server.base_url as OPENAI_BASE_URL and server.shutdown() to stop"""
+    server = MockOpenAIServer((host, port), MockConfig(**config))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Mock OpenAI chat completions server for load tests")
+    parser.add_argument('--host', default='127.0.0.1', help='Bind address (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8090, help='Port (default: 8090)')
+    parser.add_argument('--latency', default='fixed:0.5',
+                        help='Latency distribution in seconds: fixed:S, uniform:LOW,HIGH, normal:MEAN,STDDEV '
+                             'or lognormal:MEDIAN,SIGMA (default: fixed:0.5)')
+    parser.add_argument('--rate-429', type=float, default=0.0, help='Fraction of requests answered 429')
+    parser.add_argument('--rate-500', type=float, default=0.0, help='Fraction of requests answered 500')
+    parser.add_argument('--rate-truncated', type=float, default=0.0,
+                        help='Fraction of responses cut off mid-JSON (finish_reason "length")')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='Retry-After seconds on injected 429s')
+    parser.add_argument('--seed', type=int, default=7, help='Seed for latency and failure draws (default: 7)')
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    try:
+        config = MockConfig(latency=args.latency, rate_429=args.rate_429, rate_500=args.rate_500,
+                            rate_truncated=args.rate_truncated, retry_after=args.retry_after, seed=args.seed)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        sys.exit(2)
+    server = MockOpenAIServer((args.host, args.port), config)
+    print(f"Mock OpenAI server on {server.base_url} (latency {args.latency}, 429 {args.rate_429:.1%}, "
+          f"500 {args.rate_500:.1%}, truncated {args.rate_truncated:.1%})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""Recompute local sentiment scores for every stored journal entry.
+
+Run this after changing the lexicon in `utils/sentiment.py` (or to backfill
+entries written before ingestion-time scoring existed). Patients are processed
+one at a time under their patient lock: each patient's entries are scored in one
+vectorized batch, only files whose score changed are rewritten, and the
+patient's sentiment series is updated with the new scores.
+
+Usage example:
+
+    python backend/scripts/rescore_sentiment.py
+    python backend/scripts/rescore_sentiment.py --data-dir /tmp/synthetic --force
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+from utils.sentiment import rescore_archive
+
+DATA_DIR = BASE_DIR / 'data'
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Recompute local sentiment for all journal entries")
+    parser.add_argument('--data-dir', default=str(DATA_DIR), help='Base data directory (default: backend/data)')
+    parser.add_argument('--force', action='store_true', help='Rewrite every entry even if its score is unchanged')
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    started = time.perf_counter()
+    result = rescore_archive(args.data_dir, force=args.force)
+    elapsed = time.perf_counter() - started
+
+    print('\n✅ Sentiment rescore complete')
+    print(f"Entries scanned: {result['entries_scanned']}")
+    print(f"Files rewritten: {result['files_rewritten']}")
+    print(f"Elapsed: {elapsed:.2f}s\n")
+
+
+if __name__ == '__main__':
+    main()
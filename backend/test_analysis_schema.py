@@ -0,0 +1,107 @@
+"""
+Tests for utils/analysis_schema.py and the analyzer's repair path
+
+    python -m pytest test_analysis_schema.py
+"""
+import json
+
+from scripts.mock_openai_server import MockConfig
+from utils.analysis_schema import close_truncated_json, parse_analysis_text, repair_analysis
+from utils.analyzer import analyze_weekly_entries
+
+COMPLETE = {
+    "patterns": [{"type": "recurring_theme", "title": "Work stress", "severity": "high"}],
+    "mood_trends": {"overall_sentiment": "negative", "sentiment_score": -0.4},
+    "key_topics": [{"topic": "work", "count": 3, "sentiment": "negative"}],
+    "clinical_prompts": ["Explore work boundaries"]
+}
+
+
+def test_close_truncated_json_mid_string():
+    text = json.dumps(COMPLETE)
+    parsed, repaired = close_truncated_json(text[:text.index('Explore') + 4])
+    assert repaired
+    assert parsed['patterns'] == COMPLETE['patterns']
+    assert parsed['clinical_prompts'] == ['Expl']
+
+
+def test_close_truncated_json_mid_list_drops_partial_item():
+    text = '{"key_topics": [{"topic": "work", "count": 3}, {"topic": "sle'
+    parsed, repaired = close_truncated_json(text)
+    assert repaired
+    assert parsed['key_topics'][0] == {"topic": "work", "count": 3}
+
+
+def test_close_truncated_json_ignores_fences_and_trailing_text():
+    parsed, repaired = close_truncated_json('```json\n{"a": {"b": [1, 2]}}\n```\nHope this helps!')
+    assert parsed == {"a": {"b": [1, 2]}}
+    assert repaired
+
+
+def test_close_truncated_json_without_object():
+    assert close_truncated_json('no json here') == (None, False)
+    assert close_truncated_json('') == (None, False)
+
+
+def test_parse_analysis_text_notes():
+    assert parse_analysis_text(json.dumps(COMPLETE)) == (COMPLETE, [])
+    parsed, notes = parse_analysis_text(json.dumps(COMPLETE)[:-30])
+    assert parsed is not None and notes == ['truncated_json_closed']
+
+
+def test_repair_analysis_coerces_enums_and_types():
+    analysis = {
+        "patterns": [{"type": "Behavioral", "title": "Skipping meals", "severity": "medium",
+                      "frequency": "2", "related_entries": "2025-01-06"},
+                     "Sleep disruption", 42],
+        "mood_trends": {"overall_sentiment": "very low", "sentiment_score": "-1.7"},
+        "key_topics": [{"topic": "work", "count": "x", "sentiment": "mixed"}, "sleep"],
+        "clinical_prompts": "Ask about meals",
+        "concerns": None
+    }
+    repaired, repairs, missing = repair_analysis(analysis)
+
+    assert missing == []
+    assert repairs
+    assert repaired['patterns'][0]['type'] == 'behavioral_pattern'
+    assert repaired['patterns'][0]['severity'] == 'moderate'
+    assert repaired['patterns'][0]['frequency'] == 2
+    assert repaired['patterns'][0]['related_entries'] == ['2025-01-06']
+    assert repaired['patterns'][1]['title'] == 'Sleep disruption'
+    assert len(repaired['patterns']) == 2
+    assert repaired['mood_trends']['sentiment_score'] == -1.0
+    assert repaired['mood_trends']['overall_sentiment'] == 'negative'
+    assert repaired['key_topics'] == [{"topic": "work", "count": 1, "sentiment": "neutral"},
+                                      {"topic": "sleep", "count": 1, "sentiment": "neutral"}]
+    assert repaired['clinical_prompts'] == ['Ask about meals']
+    assert repaired['concerns'] == [] and repaired['strengths_observed'] == []
+
+
+def test_repair_analysis_reports_missing_sections():
+    _, _, missing = repair_analysis({"patterns": [], "mood_trends": {"sentiment_score": "n/a"}})
+    assert missing == ['mood_trends', 'key_topics', 'clinical_prompts']
+
+
+def weekly_data():
+    return {
+        "patient_id": "patient-1",
+        "week_start": "2025-01-05",
+        "week_end": "2025-01-11",
+        "entries": [{"date": f"2025-01-{day:02d}", "text": "Anxious about work, slept badly."} for day in range(5, 10)]
+    }
+
+
+def test_truncated_response_is_repaired_with_a_section_follow_up(mock_llm):
+    # Seed 1 truncates the first response only (its first draw is below 0.5, the second is not)
+    mock_llm.config = MockConfig(latency='fixed:0', rate_truncated=0.5, seed=1)
+    analysis = analyze_weekly_entries(weekly_data())
+
+    assert 'error' not in analysis
+    assert mock_llm.config.stats['kinds'] == {'weekly': 1, 'sections': 1}
+    assert analysis['patterns'] and analysis['clinical_prompts']
+
+
+def test_unrepairable_response_is_an_error(mock_llm):
+    mock_llm.config = MockConfig(latency='fixed:0', rate_truncated=1.0)
+    analysis = analyze_weekly_entries(weekly_data())
+    assert 'error' in analysis
@@ -0,0 +1,160 @@
+"""
+Tests for the debounced re-analysis in utils/auto_analysis.py
+
+    python -m pytest test_auto_analysis.py
+"""
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+import app as app_module
+from utils.auto_analysis import DIRTY_DIRNAME, ReanalysisDebouncer, week_bounds
+
+DEBOUNCE = 0.3
+
+
+class Runner:
+    """Records runs; optionally fails the first `failures` of them"""
+
+    def __init__(self, failures=0):
+        self.runs = []
+        self.failures = failures
+        self.done = threading.Event()
+
+    def __call__(self, patient_id, patient_dir, week_start, week_end):
+        self.runs.append((patient_id, week_start, week_end))
+        self.done.set()
+        if len(self.runs) <= self.failures:
+            raise RuntimeError("LLM unavailable")
+
+
+def dirty_files(patient_dir):
+    directory = os.path.join(patient_dir, '.derived', DIRTY_DIRNAME)
+    return sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+
+
+def wait_for_idle(debouncer, timeout=5):
+    deadline = time.time() + timeout
+    while debouncer.pending() and time.time() < deadline:
+        time.sleep(0.05)
+    time.sleep(0.1)
+
+
+def test_week_bounds_prefers_existing_week_files(tmp_path, monkeypatch):
+    monkeypatch.delenv('WEEK_START_DAY', raising=False)
+    assert week_bounds(str(tmp_path), '2025-01-08') == ('2025-01-05', '2025-01-11')
+    (tmp_path / 'week_2025-01-06_to_2025-01-12.json').write_text('{}')
+    assert week_bounds(str(tmp_path), '2025-01-08') == ('2025-01-06', '2025-01-12')
+
+
+def test_burst_of_writes_is_one_run(tmp_path):
+    runner = Runner()
+    debouncer = ReanalysisDebouncer(debounce_seconds=DEBOUNCE, runner=runner)
+    patient_dir = str(tmp_path)
+
+    for day in ('2025-01-06', '2025-01-07', '2025-01-08'):
+        debouncer.mark_dirty('patient-1', patient_dir, [day])
+        time.sleep(DEBOUNCE / 3)
+    wait_for_idle(debouncer)
+
+    assert runner.runs == [('patient-1', '2025-01-05', '2025-01-11')]
+    assert debouncer.coalesced_total == 2
+    assert dirty_files(patient_dir) == []
+
+
+def test_write_during_quiet_period_delays_the_run(tmp_path):
+    runner = Runner()
+    debouncer = ReanalysisDebouncer(debounce_seconds=DEBOUNCE, runner=runner)
+    patient_dir = str(tmp_path)
+
+    started = time.time()
+    debouncer.mark_dirty('patient-1', patient_dir, ['2025-01-06'])
+    time.sleep(DEBOUNCE * 0.7)
+    debouncer.mark_dirty('patient-1', patient_dir, ['2025-01-07'])
+    assert runner.done.wait(5)
+
+    assert time.time() - started >= DEBOUNCE * 1.6
+    wait_for_idle(debouncer)
+    assert len(runner.runs) == 1
+
+
+def test_each_week_runs_once(tmp_path):
+    runner = Runner()
+    debouncer = ReanalysisDebouncer(debounce_seconds=DEBOUNCE, runner=runner)
+
+    debouncer.mark_dirty('patient-1', str(tmp_path), ['2025-01-06', '2025-01-08', '2025-01-14'])
+    wait_for_idle(debouncer)
+
+    assert sorted(runner.runs) == [('patient-1', '2025-01-05', '2025-01-11'),
+                                   ('patient-1', '2025-01-12', '2025-01-18')]
+
+
+def test_failed_run_keeps_the_week_dirty(tmp_path):
+    runner = Runner(failures=1)
+    debouncer = ReanalysisDebouncer(debounce_seconds=DEBOUNCE, runner=runner)
+
+    debouncer.mark_dirty('patient-1', str(tmp_path), ['2025-01-06'])
+    wait_for_idle(debouncer)
+
+    assert debouncer.failures_total == 1
+    assert dirty_files(str(tmp_path)) == ['2025-01-05_to_2025-01-11.json']
+
+
+def test_resume_recovers_claims_of_dead_workers(tmp_path):
+    base_dir = tmp_path
+    dirty_dir = base_dir / 'patient-1' / '.derived' / DIRTY_DIRNAME
+    dirty_dir.mkdir(parents=True)
+    (dirty_dir / '2025-01-05_to_2025-01-11.json.running-999999999-1').write_text('{}')
+    (dirty_dir / f'2025-01-12_to_2025-01-18.json.running-{os.getpid()}-1').write_text('{}')
+
+    runner = Runner()
+    debouncer = ReanalysisDebouncer(debounce_seconds=0, runner=runner)
+    assert debouncer.resume(str(base_dir)) == 1
+    wait_for_idle(debouncer)
+
+    # The dead worker's week ran again; the live worker's claim was left alone
+    assert runner.runs == [('patient-1', '2025-01-05', '2025-01-11')]
+    assert os.listdir(dirty_dir) == [f'2025-01-12_to_2025-01-18.json.running-{os.getpid()}-1']
+
+
+def test_resume_recovers_old_claims(tmp_path):
+    dirty_dir = tmp_path / 'patient-1' / '.derived' / DIRTY_DIRNAME
+    dirty_dir.mkdir(parents=True)
+    claim = dirty_dir / f'2025-01-05_to_2025-01-11.json.running-{os.getpid()}-1'
+    claim.write_text('{}')
+    old = time.time() - 7200
+    os.utime(claim, (old, old))
+
+    debouncer = ReanalysisDebouncer(debounce_seconds=60, runner=Runner(), stale_claim_seconds=3600)
+    assert debouncer.resume(str(tmp_path)) == 1
+    assert os.listdir(dirty_dir) == ['2025-01-05_to_2025-01-11.json']
+    for timer in debouncer.timers.values():
+        timer.cancel()
+
+
+def test_resume_ignores_stray_files_in_the_dirty_dir(tmp_path):
+    dirty_dir = tmp_path / 'patient-1' / '.derived' / DIRTY_DIRNAME
+    dirty_dir.mkdir(parents=True)
+    (dirty_dir / '2025-01-05_to_2025-01-11.json').write_text('{}')
+    (dirty_dir / 'notes.json').write_text('{}')
+
+    debouncer = ReanalysisDebouncer(debounce_seconds=60, runner=Runner())
+    assert debouncer.resume(str(tmp_path)) == 1
+    assert [key[2:] for key in debouncer.timers] == [('2025-01-05', '2025-01-11')]
+    for timer in debouncer.timers.values():
+        timer.cancel()
+
+
+def test_background_runners_start_once_per_process(tmp_path, monkeypatch):
+    resumed = []
+    monkeypatch.setattr(app_module, '_runners_started', False)
+    monkeypatch.setattr(app_module, 'BASE_DATA_DIR', str(tmp_path))
+    monkeypatch.setattr(app_module, 'auto_analysis_enabled', lambda: True)
+    monkeypatch.setattr(app_module, 'weekly_scheduler_enabled', lambda: False)
+    monkeypatch.setattr(app_module, 'get_debouncer', lambda: SimpleNamespace(resume=resumed.append))
+
+    # e.g. gunicorn post_worker_init and then the ASGI lifespan in the same worker
+    app_module.start_background_runners()
+    app_module.start_background_runners()
+    assert resumed == [str(tmp_path)]
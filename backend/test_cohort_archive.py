@@ -0,0 +1,183 @@
+"""
+Tests for utils/cohort_archive.py
+
+    python -m pytest test_cohort_archive.py
+"""
+import json
+
+import pytest
+
+import app as app_module
+from utils.cohort_archive import (
+    _empty_columns,
+    _merge,
+    compact,
+    latest_weeks,
+    load_archive,
+    record_summary,
+    summary_row,
+    weekly_cohort_stats,
+)
+from utils.storage import from_day
+from utils.weekly_pipeline import save_weekly_summary
+
+
+def summary(score, severities=(), topics=(), concerns=()):
+    return {
+        "entry_count": 5,
+        "mood_trends": {"sentiment_score": score},
+        "patterns": [{"title": f"Pattern {i}", "severity": severity} for i, severity in enumerate(severities)],
+        "key_topics": [{"topic": topic, "count": 2} for topic in topics],
+        "concerns": list(concerns)
+    }
+
+
+def row(patient_id, week_start, week_end, score, **kwargs):
+    return summary_row(patient_id, f"summary_{week_start}_to_{week_end}.json", summary(score, **kwargs))
+
+
+def write_summary(base_dir, patient_id, week_start, week_end, score, **kwargs):
+    patient_dir = base_dir / patient_id
+    patient_dir.mkdir(exist_ok=True)
+    filename = f"summary_{week_start}_to_{week_end}.json"
+    (patient_dir / filename).write_text(json.dumps(summary(score, **kwargs)))
+    return str(patient_dir), filename
+
+
+def test_summary_row_skips_files_without_a_week_range():
+    assert summary_row('patient-1', 'summary_latest.json', summary(0.1)) is None
+    assert summary_row('patient-1', 'summary_2025-01-05_to_2025-01-11_draft.json', summary(0.1)) is None
+    parsed = row('patient-1', '2025-01-05', '2025-01-11', '-0.25', severities=('high', 'Moderate', 'odd'))
+    assert parsed['score'] == -0.25
+    assert parsed['severities'] == [0, 1, 1]
+
+
+def test_merge_last_row_wins_and_groups_rows_by_patient_then_week():
+    columns = _merge(_empty_columns(), [
+        row('b', '2025-01-12', '2025-01-18', 0.1, topics=('sleep',), concerns=('b old',)),
+        row('a', '2025-01-12', '2025-01-18', 0.2, topics=('work',)),
+        row('a', '2025-01-05', '2025-01-11', 0.3),
+    ])
+    columns = _merge(columns, [row('b', '2025-01-12', '2025-01-18', -0.5, topics=('family',), concerns=('b new',))])
+
+    patients = [str(columns['patient_ids'][i]) for i in columns['patient']]
+    weeks = [from_day(day) for day in columns['week_start']]
+    # Patients keep the order they were first seen in; weeks ascend within a patient
+    assert list(zip(patients, weeks)) == [('b', '2025-01-12'), ('a', '2025-01-05'), ('a', '2025-01-12')]
+    assert columns['score'].tolist()[0] == -0.5
+
+    # Sparse columns follow the surviving rows; the replaced row's topics and concerns are gone
+    topics = {(int(r), str(columns['topics'][t])) for r, t in zip(columns['topic_row'], columns['topic_id'])}
+    assert topics == {(0, 'family'), (2, 'work')}
+    assert columns['concern_row'].tolist() == [0]
+    assert columns['concern_text'].tolist() == ['b new']
+
+
+def test_merge_in_steps_matches_one_merge():
+    rows = [row(patient, f'2025-01-{day:02d}', f'2025-01-{day + 6:02d}', day / 100, topics=(patient,))
+            for day in (5, 12, 19) for patient in ('p1', 'p2')]
+    rows.append(row('p1', '2025-01-12', '2025-01-18', -0.9, topics=('grief',)))
+
+    at_once = _merge(_empty_columns(), rows)
+    stepwise = _empty_columns()
+    for item in rows:
+        stepwise = _merge(stepwise, [item])
+
+    for name in ('patient', 'week_start', 'score', 'topic_row', 'topic_count'):
+        assert at_once[name].tolist() == stepwise[name].tolist(), name
+
+
+def test_pending_rows_replace_archived_week(tmp_path):
+    patient_dir, filename = write_summary(tmp_path, 'patient-1', '2025-01-05', '2025-01-11', 0.1)
+    assert len(load_archive(str(tmp_path))['patient']) == 1
+
+    record_summary(str(tmp_path), 'patient-1', filename, summary(-0.4))
+    columns = load_archive(str(tmp_path))
+    assert columns['score'].tolist() == pytest.approx([-0.4])
+
+    assert compact(str(tmp_path), blocking=True)
+    assert load_archive(str(tmp_path))['score'].tolist() == pytest.approx([-0.4])
+
+
+def test_latest_weeks_previous_row_belongs_to_the_same_patient(tmp_path):
+    write_summary(tmp_path, 'alice', '2025-01-05', '2025-01-11', 0.1)
+    write_summary(tmp_path, 'alice', '2025-01-12', '2025-01-18', -0.2, severities=('high',), concerns=('Sleep',))
+    write_summary(tmp_path, 'alice', '2025-01-19', '2025-01-25', 0.3)
+    # bob's only row directly follows alice's last row in the archive
+    write_summary(tmp_path, 'bob', '2025-01-19', '2025-01-25', -0.5, concerns=('Isolation', 'Appetite'))
+
+    latest = latest_weeks(str(tmp_path), ['alice', 'bob', 'carol'])
+
+    assert set(latest) == {'alice', 'bob'}
+    assert latest['alice']['week_start'] == '2025-01-19'
+    assert latest['alice']['previous_week_start'] == '2025-01-12'
+    assert latest['alice']['previous_score'] == -0.2
+    assert latest['alice']['concerns'] == []
+    assert latest['bob']['previous_week_start'] is None
+    assert latest['bob']['previous_score'] is None
+    assert latest['bob']['concerns'] == ['Isolation', 'Appetite']
+
+    # Restricting the cohort does not change which row counts as previous
+    assert latest_weeks(str(tmp_path), ['bob'])['bob']['previous_score'] is None
+    assert latest_weeks(str(tmp_path), ['alice'])['alice']['previous_score'] == -0.2
+
+
+def test_weekly_cohort_stats_interpolates_quantiles(tmp_path):
+    for patient, score in (('p1', -0.4), ('p2', 0.0), ('p3', 0.2), ('p4', 0.6)):
+        write_summary(tmp_path, patient, '2025-01-05', '2025-01-11', score)
+    write_summary(tmp_path, 'p5', '2025-01-05', '2025-01-11', None, severities=('high',))
+
+    stats = weekly_cohort_stats(str(tmp_path))
+    assert stats['week_start'] == ['2025-01-05']
+    assert stats['patients'] == [5]
+    assert stats['median_score'] == [0.1]
+    assert stats['mean_score'] == [0.1]
+    assert stats['high_severity_patients'] == [1]
+
+
+def test_summary_written_in_the_data_dir_itself_is_archived_there(tmp_path):
+    # The legacy 'default' patient keeps its files directly in the data directory
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    analysis = summary(0.3)
+
+    save_weekly_summary(str(data_dir), 'default', 'summary_2025-01-05_to_2025-01-11.json', analysis,
+                        base_data_dir=str(data_dir))
+
+    assert (data_dir / '.archive' / 'pending.jsonl').exists()
+    assert not (tmp_path / '.archive').exists()
+    pending = json.loads((data_dir / '.archive' / 'pending.jsonl').read_text())
+    assert (pending['patient_id'], pending['score']) == ('default', 0.3)
+
+
+def test_dashboard_lists_patients_needing_attention_first(tmp_path, monkeypatch):
+    weeks = (('2025-01-05', '2025-01-11'), ('2025-01-12', '2025-01-18'))
+    history = {
+        'steady-high': ((0.1, ()), (0.2, ('high', 'low'))),
+        'dropping-moderate': ((0.5, ()), (-0.3, ('moderate',))),
+        'dropping': ((0.4, ()), (-0.1, ())),
+        'improving': ((-0.2, ()), (0.3, ())),
+        'new-low': (None, (-0.6, ())),
+        'new-high-score': (None, (0.7, ())),
+    }
+    for patient_id, scores in history.items():
+        for (week_start, week_end), week in zip(weeks, scores):
+            if week:
+                write_summary(tmp_path, patient_id, week_start, week_end, week[0], severities=week[1])
+    registry = [{"id": patient_id, "therapist": "Dr. Lee"} for patient_id in [*history, 'never-analyzed']]
+    registry.append({"id": "other-caseload", "therapist": "Dr. Kim"})
+    (tmp_path / 'patients.json').write_text(json.dumps({"patients": registry}))
+    monkeypatch.setattr(app_module, 'BASE_DATA_DIR', str(tmp_path))
+    monkeypatch.setattr(app_module, 'PATIENTS_REGISTRY_PATH', str(tmp_path / 'patients.json'))
+
+    response = app_module.app.test_client().get('/api/therapists/dr.%20lee/dashboard')
+    assert response.status_code == 200
+    body = response.get_json()
+
+    # Severity first, then the largest drop, then the lowest score; never-analyzed patients last
+    assert [row['patient_id'] for row in body['patients']] == [
+        'steady-high', 'dropping-moderate', 'dropping', 'improving', 'new-low', 'new-high-score', 'never-analyzed'
+    ]
+    assert body['patients'][1]['week_over_week_change'] == -0.8
+    assert body['summary'] == {"patients": 7, "analyzed": 6, "high_severity": 1, "declining": 2,
+                               "with_open_concerns": 0}
@@ -0,0 +1,152 @@
+"""
+Tests for utils/fulltext_index.py
+
+    python -m pytest test_fulltext_index.py
+"""
+import json
+
+import pytest
+
+from utils import fulltext_index
+from utils.fulltext_index import entry_document, index_documents, load_index, search_caseload
+
+ENTRIES = {
+    '2025-01-06': "Had a panic attack at work before the presentation.",
+    '2025-01-07': "Called my mother. Slept badly, anxious all night.",
+}
+
+
+def write_entry(patient_dir, day, text):
+    entry = {"date": day, "time": "21:00", "text": text}
+    (patient_dir / f'{day}.json').write_text(json.dumps(entry))
+    return entry
+
+
+@pytest.fixture
+def patient_dir(tmp_path):
+    directory = tmp_path / 'patient-1'
+    directory.mkdir()
+    for day, text in ENTRIES.items():
+        write_entry(directory, day, text)
+    return directory
+
+
+def doc_ids(patient_dir, query):
+    return [result['doc_id'] for result in search_caseload({'patient-1': str(patient_dir)}, query)['results']]
+
+
+def test_lazy_build_waits_for_a_writer_holding_the_patient_lock(patient_dir, locked_writer, monkeypatch):
+    builds = []
+    real_build = fulltext_index.build_index
+    monkeypatch.setattr(fulltext_index, 'build_index', lambda path: builds.append(path) or real_build(path))
+
+    def write():
+        entry = write_entry(patient_dir, '2025-01-08', "Anxious again before the meeting.")
+        index_documents(str(patient_dir), [entry_document(entry)])
+
+    writer = locked_writer(str(patient_dir), write)
+    found = doc_ids(patient_dir, 'anxious')
+    writer.join()
+
+    assert len(builds) == 1
+    assert found == ['entry:2025-01-08', 'entry:2025-01-07']
+    assert set(load_index(str(patient_dir)).docs) == {'entry:2025-01-06', 'entry:2025-01-07', 'entry:2025-01-08'}
+
+
+@pytest.mark.parametrize('query, tree', [
+    ('anxious', ('term', 'anxious')),
+    ('Anxious work', ('and', ('term', 'anxious'), ('term', 'work'))),
+    ('"Panic attack"', ('phrase', ['panic', 'attack'])),
+    ('anx*', ('term', 'anx*')),
+    ("mom's", ('term', "mom's")),
+    ('self-harm', ('phrase', ['self', 'harm'])),
+    ('work-l*', ('phrase', ['work', 'l*'])),
+    ('mother OR mom', ('or', ('term', 'mother'), ('term', 'mom'))),
+    ('work -boss', ('and', ('term', 'work'), ('not', ('term', 'boss')))),
+    ('work AND NOT boss', ('and', ('term', 'work'), ('not', ('term', 'boss')))),
+    ('(sleep OR bed) work', ('and', ('or', ('term', 'sleep'), ('term', 'bed')), ('term', 'work'))),
+])
+def test_parse_query(query, tree):
+    assert fulltext_index.parse_query(query) == tree
+
+
+@pytest.mark.parametrize('query', ['', '   ', '(work', 'work)', 'OR work', 'work AND', '"', '!!!'])
+def test_parse_query_rejects_malformed_queries(query):
+    with pytest.raises(fulltext_index.QuerySyntaxError):
+        fulltext_index.parse_query(query)
+
+
+def test_phrases_and_prefixes_against_the_index(patient_dir):
+    assert doc_ids(patient_dir, '"panic attack"') == ['entry:2025-01-06']
+    assert doc_ids(patient_dir, '"attack panic"') == []
+    assert doc_ids(patient_dir, 'anx*') == ['entry:2025-01-07']
+    assert doc_ids(patient_dir, 'pre* -panic') == []
+    # Quoted phrases are exact; an unquoted hyphenated term can end in a prefix
+    assert doc_ids(patient_dir, '"slept bad*"') == []
+    assert doc_ids(patient_dir, 'slept-bad*') == ['entry:2025-01-07']
+
+
+def test_phrases_do_not_span_summary_fields(patient_dir):
+    summary = {"patterns": [{"title": "Work stress"}], "clinical_prompts": ["Panic planning"], "concerns": []}
+    index_documents(str(patient_dir), [fulltext_index.summary_document('summary_2025-01-05_to_2025-01-11.json', summary)])
+
+    assert doc_ids(patient_dir, '"work stress"') == ['summary:2025-01-05_to_2025-01-11']
+    assert doc_ids(patient_dir, '"stress panic"') == []
+
+
+def test_summaries_without_a_dated_filename_are_not_indexed(patient_dir):
+    summary = {"patterns": [{"title": "Work stress"}], "clinical_prompts": [], "concerns": []}
+    (patient_dir / 'summary_2025-01-05_to_2025-01-11_draft.json').write_text(json.dumps(summary))
+    assert fulltext_index.summary_document('summary_latest.json', summary) is None
+
+    index_documents(str(patient_dir), [fulltext_index.summary_document('summary_latest.json', summary)])
+    assert doc_ids(patient_dir, 'stress') == []
+
+
+def test_writes_append_to_the_delta_until_it_is_merged(patient_dir, monkeypatch):
+    index_dir = patient_dir / '.derived' / 'fulltext'
+    load_index(str(patient_dir))
+    base = (index_dir / 'index.json').read_text()
+
+    entry = write_entry(patient_dir, '2025-01-08', "Anxious again before the meeting.")
+    index_documents(str(patient_dir), [entry_document(entry)])
+    assert (index_dir / 'index.json').read_text() == base
+    assert len((index_dir / 'delta.jsonl').read_text().splitlines()) == 1
+
+    # Another worker process replays the delta over index.json
+    fulltext_index._index_cache.clear()
+    fulltext_index._base_cache.clear()
+    assert doc_ids(patient_dir, 'anxious') == ['entry:2025-01-08', 'entry:2025-01-07']
+
+    monkeypatch.setattr(fulltext_index, 'MERGE_BYTES', 1)
+    entry = write_entry(patient_dir, '2025-01-09', "Slept well, less anxious.")
+    index_documents(str(patient_dir), [entry_document(entry)])
+    assert (index_dir / 'delta.jsonl').read_text() == ''
+    assert set(json.loads((index_dir / 'index.json').read_text())['docs']) == {
+        'entry:2025-01-06', 'entry:2025-01-07', 'entry:2025-01-08', 'entry:2025-01-09'
+    }
+    fulltext_index._index_cache.clear()
+    fulltext_index._base_cache.clear()
+    assert doc_ids(patient_dir, 'anxious') == ['entry:2025-01-09', 'entry:2025-01-08', 'entry:2025-01-07']
+
+
+def test_read_retries_when_a_merge_lands_between_base_and_delta(patient_dir, monkeypatch):
+    load_index(str(patient_dir))
+    entry = write_entry(patient_dir, '2025-01-08', "Anxious again before the meeting.")
+    index_documents(str(patient_dir), [entry_document(entry)])
+    merged = load_index(str(patient_dir))
+    fulltext_index._index_cache.clear()
+    fulltext_index._base_cache.clear()
+
+    real_read_delta = fulltext_index._read_delta
+    merges = []
+
+    def read_delta_after_merge(path):
+        if not merges:
+            merges.append(path)
+            fulltext_index.save_index(str(patient_dir), merged)
+        return real_read_delta(path)
+
+    monkeypatch.setattr(fulltext_index, '_read_delta', read_delta_after_merge)
+    assert 'entry:2025-01-08' in fulltext_index._read_index(str(patient_dir)).docs
+    assert len(merges) == 1
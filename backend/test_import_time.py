@@ -0,0 +1,70 @@
+"""
+Import-time budget for the Flask app
+
+Runs `python -X importtime -c "import app"` in a fresh interpreter and checks
+that the heavy SDKs (openai, the Google client libraries) are not imported at
+module load and that the app imports within IMPORT_TIME_BUDGET_MS (default
+700ms; about 330ms on a laptop, 1250ms before the SDKs were made lazy). Also
+checks that the import starts no background threads, even with the opt-in
+runners enabled (they start from the server's startup hook).
+
+    python -m pytest test_import_time.py
+    python test_import_time.py          # prints the slowest imports
+"""
+import os
+import re
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+BUDGET_MS = float(os.getenv('IMPORT_TIME_BUDGET_MS', '700'))
+LAZY_PACKAGES = ('openai', 'googleapiclient', 'google_auth_oauthlib', 'google.auth', 'google.oauth2', 'httpx')
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)')
+
+
+def measure_imports(module='app'):
+    """Return {module: cumulative microseconds} for a fresh `import <module>`"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    )
+    imports = {}
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            imports[match.group(4)] = int(match.group(2))
+    return imports
+
+
+def test_heavy_sdks_are_not_imported():
+    imports = measure_imports()
+    eager = sorted(name for name in imports if name.split('.')[0] in LAZY_PACKAGES or name.startswith(LAZY_PACKAGES))
+    assert not eager, f"Imported at app load (should be lazy): {', '.join(eager[:10])}"
+
+
+def test_app_import_within_budget():
+    # Best of three, so one slow run on a busy machine does not fail the check
+    app_ms = min(measure_imports()['app'] for _ in range(3)) / 1000
+    assert app_ms <= BUDGET_MS, f"import app took {app_ms:.0f}ms (budget {BUDGET_MS:.0f}ms)"
+
+
+def test_import_starts_no_background_threads():
+    env = dict(os.environ, AUTO_ANALYSIS_ENABLED='true', WEEKLY_SCHEDULER_ENABLED='true')
+    result = subprocess.run(
+        [sys.executable, '-c', 'import threading, app; print(len(threading.enumerate()))'],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    assert result.stdout.split()[-1] == '1', "import app started background threads"
+
+
+def main():
+    imports = measure_imports()
+    print(f"import app: {imports['app'] / 1000:.0f}ms (budget {BUDGET_MS:.0f}ms)\n")
+    print("Slowest top-level imports:")
+    top_level = sorted(((us, name) for name, us in imports.items() if '.' not in name and name != 'app'), reverse=True)
+    for us, name in top_level[:15]:
+        print(f"  {us / 1000:8.1f}ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
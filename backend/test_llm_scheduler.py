@@ -0,0 +1,138 @@
+"""
+Tests for utils/llm_scheduler.py
+
+    python -m pytest test_llm_scheduler.py
+"""
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from types import SimpleNamespace
+
+import pytest
+
+from utils.llm_scheduler import LLMScheduler, TokenBucket, get_retry_after, is_retryable
+
+
+class Clock:
+    """Stands in for time.monotonic so refills are exact"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = Clock()
+    monkeypatch.setattr(time, 'monotonic', fake)
+    return fake
+
+
+class APIError(Exception):
+    def __init__(self, status_code=None, headers=None, code=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.code = code
+        self.response = SimpleNamespace(headers=headers or {})
+
+
+def test_bucket_queues_reservations_in_arrival_order(clock):
+    bucket = TokenBucket(60)  # one token per second
+
+    assert bucket.reserve(60) == 0.0
+    assert bucket.reserve(1) == pytest.approx(1.0)
+    assert bucket.reserve(2) == pytest.approx(3.0)
+
+    clock.now += 3
+    assert bucket.available() == pytest.approx(0.0)
+    assert bucket.reserve(1) == pytest.approx(1.0)
+
+
+def test_bucket_caps_reservations_and_refills_to_capacity(clock):
+    bucket = TokenBucket(60)
+
+    # A request larger than the whole budget waits for a full bucket, not forever
+    assert bucket.reserve(1000) == 0.0
+    assert bucket.reserve(60) == pytest.approx(60.0)
+
+    clock.now += 600
+    assert bucket.available() == pytest.approx(60.0)
+
+
+def test_bucket_adjust_returns_and_charges_tokens(clock):
+    bucket = TokenBucket(600)
+    bucket.reserve(500)
+
+    bucket.adjust(300)
+    assert bucket.available() == pytest.approx(400.0)
+    bucket.adjust(-500)
+    assert bucket.reserve(1) == pytest.approx(10.1)
+    bucket.adjust(10_000)
+    assert bucket.available() == pytest.approx(600.0)
+
+
+@pytest.mark.parametrize('headers, expected', [
+    ({'retry-after-ms': '1500'}, 1.5),
+    ({'retry-after-ms': 'soon', 'retry-after': '3'}, 3.0),
+    ({'retry-after': '0.25'}, 0.25),
+    ({'retry-after': 'Wed, 21 Oct 2015 07:28:00 GMT'}, 0.0),
+    ({'retry-after': 'later'}, None),
+    ({}, None),
+])
+def test_retry_after_header_forms(headers, expected):
+    assert get_retry_after(APIError(429, headers)) == expected
+
+
+def test_retry_after_http_date_in_the_future():
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=30)
+    delay = get_retry_after(APIError(429, {'retry-after': format_datetime(retry_at, usegmt=True)}))
+    assert 28 <= delay <= 30
+
+
+def test_retry_after_without_response():
+    assert get_retry_after(ValueError("no response")) is None
+
+
+def test_retryable_errors():
+    assert is_retryable(APIError(429))
+    assert is_retryable(APIError(503))
+    assert not is_retryable(APIError(400))
+    assert not is_retryable(APIError(429, code='insufficient_quota'))
+
+
+def test_execute_retries_transient_errors_no_sooner_than_retry_after():
+    sleeps = []
+    scheduler = LLMScheduler(requests_per_minute=1000, tokens_per_minute=10**6, base_delay=0.01, sleep=sleeps.append)
+    failures = [APIError(429, {'retry-after': '2'}), APIError(503)]
+
+    def call():
+        if failures:
+            raise failures.pop(0)
+        return SimpleNamespace(usage=SimpleNamespace(total_tokens=10))
+
+    scheduler.execute(call, estimated_tokens=100)
+
+    # The backoff honors Retry-After, and the next send waits for the shared pause too
+    # (the fake sleep never advances the clock, so every later attempt waits again)
+    assert sleeps[0] >= 2.0
+    assert sleeps[1] == pytest.approx(2.0, abs=0.1)
+    assert scheduler.blocked_until > time.monotonic()
+    metrics = scheduler.metrics()
+    assert metrics['requests_total'] == 3
+    assert metrics['retries_total'] == 2
+    assert metrics['failures_total'] == 0
+
+
+def test_execute_gives_up_on_permanent_errors():
+    sleeps = []
+    scheduler = LLMScheduler(sleep=sleeps.append)
+
+    def call():
+        raise APIError(400)
+
+    with pytest.raises(APIError):
+        scheduler.execute(call)
+    assert sleeps == []
+    assert scheduler.metrics()['failures_total'] == 1
@@ -0,0 +1,86 @@
+"""
+Tests for the model tier routing in utils/analyzer.py
+
+    python -m pytest test_model_routing.py
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from utils.analyzer import (
+    MODEL_TIERS,
+    SMALL_TIER_MAX_ENTRIES,
+    analyze_weekly_entries,
+    route_weekly_analysis,
+    screen_entries_for_risk,
+)
+
+
+def week(*texts):
+    return {
+        "patient_id": "patient-1",
+        "week_start": "2025-01-05",
+        "week_end": "2025-01-11",
+        "entries": [{"date": f"2025-01-{5 + i:02d}", "time": "21:00", "text": text} for i, text in enumerate(texts)]
+    }
+
+
+@pytest.mark.parametrize('text, flags', [
+    ("Some days I think about suicide.", ['suicide']),
+    ("I want to die. I feel Hopeless.", ['hopeless', 'want to die']),
+    ("What's the point of any of it", ["what's the point"]),
+    ("I dont want to be here anymore", ["dont want to be here"]),
+    ("Had a panic attack on the train", ['panic attack']),
+    ("Self-harm urges again", ['self-harm']),
+])
+def test_risk_screen_matches(text, flags):
+    assert screen_entries_for_risk(week(text)) == flags
+
+
+@pytest.mark.parametrize('text', [
+    "Cut the onions for dinner, then a long walk.",
+    "Pointless meeting, but the day was fine.",
+    "My boss is so demanding, this job is killing me.",
+    "Overdue library books, cutlery to wash.",
+])
+def test_risk_screen_ignores_everyday_language(text):
+    assert screen_entries_for_risk(week(text)) == []
+
+
+def test_small_quiet_week_uses_small_tier():
+    routing = route_weekly_analysis(week("Good walk today.", "Slept well."))
+    assert routing['tier'] == 'small'
+    assert routing['model'] == MODEL_TIERS['small']
+    assert routing['reason'] == 'small_low_risk_week'
+    assert routing['risk_flags'] == []
+
+
+def test_busy_long_and_risky_weeks_use_large_tier():
+    busy = week(*["Fine day."] * (SMALL_TIER_MAX_ENTRIES + 1))
+    long = week("word " * 6000)
+    risky = week("Feeling worthless.")
+
+    assert route_weekly_analysis(busy)['reason'] == 'entry_count'
+    assert route_weekly_analysis(long)['reason'] == 'token_size'
+    routing = route_weekly_analysis(risky)
+    assert (routing['tier'], routing['reason'], routing['risk_flags']) == ('large', 'risk_screen', ['worthless'])
+
+
+def test_unparseable_small_tier_response_escalates(fake_llm, monkeypatch):
+    models = []
+    answer = fake_llm.create
+
+    def create(**kwargs):
+        models.append(kwargs['model'])
+        if kwargs['model'] == MODEL_TIERS['small']:
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="Sorry, I can't."))],
+                                   usage=None)
+        return answer(**kwargs)
+
+    monkeypatch.setattr(fake_llm, 'create', create)
+    analysis = analyze_weekly_entries(week("Good walk today."))
+
+    assert 'error' not in analysis
+    assert models == [MODEL_TIERS['small'], MODEL_TIERS['large']]
+    assert analysis['model_tier'] == 'large'
+    assert analysis['routing_reason'] == 'escalated_after_small_tier_failure'
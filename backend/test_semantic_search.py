@@ -0,0 +1,76 @@
+"""
+Tests for utils/semantic_search.py and the /search route
+
+    python -m pytest test_semantic_search.py
+"""
+import json
+
+import pytest
+
+import app as app_module
+from utils import semantic_search
+from utils.semantic_search import search_entries
+
+ENTRIES = {
+    '2025-01-06': "Called my mother. Mom and I talked about mother things.",
+    '2025-01-08': "Long day at work, the deadline moved again and the train was late. Mom texted.",
+    '2025-01-10': "Went to the gym and slept early.",
+}
+
+
+@pytest.fixture
+def patient_dir(tmp_path):
+    directory = tmp_path / 'patient-1'
+    directory.mkdir()
+    for day, text in ENTRIES.items():
+        (directory / f'{day}.json').write_text(json.dumps({"date": day, "time": "21:00", "text": text}))
+    return directory
+
+
+def test_relevance_puts_the_best_match_first(patient_dir):
+    results = search_entries(str(patient_dir), 'mother')['results']
+    assert [result['date'] for result in results] == ['2025-01-06', '2025-01-08']
+
+
+def test_recent_returns_the_newest_match_even_when_it_scores_lower(patient_dir):
+    results = search_entries(str(patient_dir), 'mother', limit=1, sort='recent')['results']
+    assert [result['date'] for result in results] == ['2025-01-08']
+
+
+def test_deleted_entries_are_skipped_and_pruned(patient_dir):
+    search_entries(str(patient_dir), 'mother')
+    (patient_dir / '2025-01-06.json').unlink()
+
+    found = search_entries(str(patient_dir), 'mother', limit=1)
+    assert [result['date'] for result in found['results']] == ['2025-01-08']
+    assert found['index_size'] == 2
+
+
+def test_unknown_sort_is_rejected(patient_dir, tmp_path, monkeypatch):
+    with pytest.raises(ValueError):
+        search_entries(str(patient_dir), 'mother', sort='oldest')
+
+    monkeypatch.setattr(app_module, 'BASE_DATA_DIR', str(tmp_path))
+    client = app_module.app.test_client()
+    response = client.get('/api/patients/patient-1/search?q=mother&sort=oldest')
+    assert response.status_code == 400
+    assert client.get('/api/patients/patient-1/search?q=mother&sort=recent').status_code == 200
+
+
+def test_lazy_build_waits_for_a_writer_holding_the_patient_lock(patient_dir, locked_writer, monkeypatch):
+    builds = []
+    real_build = semantic_search.build_index
+    monkeypatch.setattr(semantic_search, 'build_index', lambda path: builds.append(path) or real_build(path))
+    entry = {"date": "2025-01-12", "time": "21:00", "text": "Dinner with my mother."}
+
+    def write_entry():
+        (patient_dir / '2025-01-12.json').write_text(json.dumps(entry))
+        semantic_search.update_index(str(patient_dir), [entry])
+
+    writer = locked_writer(str(patient_dir), write_entry)
+    results = search_entries(str(patient_dir), 'mother', sort='recent')['results']
+    writer.join()
+
+    # The read saw the writer's index instead of saving its own build from an older listing
+    assert len(builds) == 1
+    assert results[0]['date'] == '2025-01-12'
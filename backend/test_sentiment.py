@@ -0,0 +1,45 @@
+"""
+Tests for utils/sentiment.py
+
+    python -m pytest test_sentiment.py
+"""
+import json
+
+from utils.sentiment import annotate_entry, rescore_archive
+from utils.sentiment_series import get_sentiment_series
+
+
+def write_entry(patient_dir, day, text, local_sentiment=None):
+    entry = {"date": day, "time": "21:00", "text": text}
+    if local_sentiment is not None:
+        entry['local_sentiment'] = local_sentiment
+    (patient_dir / f'{day}.json').write_text(json.dumps(entry))
+
+
+def test_annotate_entry_scores_polarity():
+    happy = annotate_entry({"text": "Great day, felt happy and grateful."})['local_sentiment']
+    sad = annotate_entry({"text": "I cried all night, lonely and exhausted."})['local_sentiment']
+    assert happy['score'] > 0 > sad['score']
+    assert happy['emotions']['joy'] > 0
+    assert sad['emotions']['sadness'] > 0
+
+
+def test_rescore_rewrites_changed_entries_and_updates_the_series(tmp_path):
+    patient_dir = tmp_path / 'patient-1'
+    patient_dir.mkdir()
+    stale = {"score": 0.9, "label": "positive", "emotions": {}, "lexicon_version": 0}
+    write_entry(patient_dir, '2025-01-06', "I cried all night, lonely and exhausted.", stale)
+    write_entry(patient_dir, '2025-01-07', "Great day, felt happy and grateful.")
+    current = annotate_entry({"text": "Great day, felt happy and grateful."})['local_sentiment']
+    write_entry(patient_dir, '2025-01-08', "Great day, felt happy and grateful.", current)
+
+    # The series store is built from the stale stored score
+    assert get_sentiment_series(str(patient_dir))['scores'][0] == 0.9
+
+    assert rescore_archive(str(tmp_path)) == {"entries_scanned": 3, "files_rewritten": 2}
+
+    series = get_sentiment_series(str(patient_dir))
+    stored = json.loads((patient_dir / '2025-01-06.json').read_text())['local_sentiment']
+    assert stored['score'] < 0
+    assert series['scores'][0] == stored['score']
+    assert rescore_archive(str(tmp_path))['files_rewritten'] == 0
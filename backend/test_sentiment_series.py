@@ -0,0 +1,99 @@
+"""
+Tests for utils/sentiment_series.py
+
+    python -m pytest test_sentiment_series.py
+"""
+import json
+
+import numpy as np
+import pytest
+
+from utils import sentiment_series
+from utils.sentiment_series import downsample, get_sentiment_series, record_entries
+
+
+def make_entry(day, score):
+    return {"date": day, "text": "", "local_sentiment": {"score": score}}
+
+
+def write_entry(patient_dir, entry):
+    (patient_dir / f"{entry['date']}.json").write_text(json.dumps(entry))
+
+
+def test_downsample_equal_width_buckets():
+    days = np.arange(10, dtype=np.int32)
+    bucket_days, means, minimums, maximums, counts = downsample(days, days.astype(np.float32), 5)
+
+    assert bucket_days.tolist() == [0, 2, 4, 6, 8]
+    assert means.tolist() == [0.5, 2.5, 4.5, 6.5, 8.5]
+    assert counts.tolist() == [2, 2, 2, 2, 2]
+
+
+def test_downsample_start_days_stay_inside_their_bucket():
+    # Edges fall between days (10 / 3): each reported start is the first day the bucket can hold
+    days = np.arange(10, dtype=np.int32)
+    bucket_days, _, minimums, maximums, counts = downsample(days, days.astype(np.float32), 3)
+
+    assert bucket_days.tolist() == [0, 4, 7]
+    assert minimums.tolist() == [0, 4, 7]
+    assert maximums.tolist() == [3, 6, 9]
+    assert counts.tolist() == [4, 3, 3]
+
+
+@pytest.mark.parametrize('max_points', [1, 2, 7, 50, 199])
+def test_downsample_sparse_series_keeps_every_point_once(max_points):
+    rng = np.random.default_rng(3)
+    days = np.sort(rng.choice(np.arange(-400, 3000), size=200, replace=False)).astype(np.int32)
+    scores = rng.uniform(-1, 1, size=200).astype(np.float32)
+
+    bucket_days, means, minimums, maximums, counts = downsample(days, scores, max_points)
+
+    assert len(bucket_days) <= max_points
+    assert counts.sum() == len(days)
+    assert bucket_days[0] == days[0]
+    assert np.all(np.diff(bucket_days) > 0)
+    # Every point falls between its bucket's start and the next bucket's start
+    bucket_of_day = np.searchsorted(bucket_days, days, side='right') - 1
+    assert np.array_equal(np.bincount(bucket_of_day, minlength=len(counts)), counts)
+    assert np.all(minimums <= means + 1e-6) and np.all(means <= maximums + 1e-6)
+
+
+def test_series_is_downsampled_past_max_points(tmp_path):
+    for day in range(1, 29):
+        write_entry(tmp_path, make_entry(f'2025-02-{day:02d}', day / 100))
+
+    series = get_sentiment_series(str(tmp_path), max_points=4, start='2025-02-01', end='2025-02-28')
+    assert series['downsampled'] and series['total_points'] == 28
+    assert series['dates'] == ['2025-02-01', '2025-02-08', '2025-02-15', '2025-02-22']
+    assert series['counts'] == [7, 7, 7, 7]
+    assert get_sentiment_series(str(tmp_path), start='2025-02-27')['dates'] == ['2025-02-27', '2025-02-28']
+
+
+def test_lazy_build_waits_for_a_writer_holding_the_patient_lock(tmp_path, locked_writer, monkeypatch):
+    write_entry(tmp_path, make_entry('2025-01-06', -0.5))
+    builds = []
+    real_build = sentiment_series.build_store
+    monkeypatch.setattr(sentiment_series, 'build_store', lambda path: builds.append(path) or real_build(path))
+
+    def write():
+        entry = make_entry('2025-01-07', 0.5)
+        write_entry(tmp_path, entry)
+        record_entries(str(tmp_path), [entry])
+
+    writer = locked_writer(str(tmp_path), write)
+    series = get_sentiment_series(str(tmp_path))
+    writer.join()
+
+    assert len(builds) == 1
+    assert series['dates'] == ['2025-01-06', '2025-01-07']
+    assert series['scores'] == [-0.5, 0.5]
+
+
+def test_week_series_skips_summaries_without_a_dated_filename(tmp_path):
+    summary = {"mood_trends": {"sentiment_score": 0.25}, "entry_count": 3}
+    (tmp_path / 'summary_2025-01-05_to_2025-01-11.json').write_text(json.dumps(summary))
+    (tmp_path / 'summary_2025-01-12_to_2025-01-18_draft.json').write_text(json.dumps(summary))
+
+    series = get_sentiment_series(str(tmp_path), granularity='week')
+    assert series['dates'] == ['2025-01-05']
+    assert series['scores'] == [0.25]
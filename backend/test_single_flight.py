@@ -0,0 +1,134 @@
+"""
+Tests for utils/single_flight.py
+
+    python -m pytest test_single_flight.py
+"""
+import asyncio
+import os
+import threading
+import time
+
+from utils import single_flight
+from utils.single_flight import INFLIGHT_DIRNAME, run_single_flight, run_single_flight_async
+from utils.storage import derived_dir
+
+
+def age(path, seconds):
+    old = time.time() - seconds
+    os.utime(path, (old, old))
+
+
+def run_concurrently(patient_dir, key, call, count):
+    """Start `count` callers of the same key; return their (result, shared) tuples"""
+    results = [None] * count
+
+    def worker(i):
+        results[i] = run_single_flight(patient_dir, key, call)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    return results
+
+
+def test_followers_share_the_leaders_result(tmp_path):
+    calls = []
+    release = threading.Event()
+
+    def call():
+        calls.append(1)
+        release.wait(5)
+        return {"value": len(calls)}
+
+    timer = threading.Timer(0.3, release.set)
+    timer.start()
+    results = run_concurrently(str(tmp_path), 'key', call, 4)
+
+    assert len(calls) == 1
+    assert all(result == {"value": 1} for result, _ in results)
+    assert sorted(shared for _, shared in results) == [False, True, True, True]
+
+
+def test_late_duplicate_reuses_result_within_ttl(tmp_path):
+    calls = []
+
+    def call():
+        calls.append(1)
+        return {"value": len(calls)}
+
+    assert run_single_flight(str(tmp_path), 'key', call) == ({"value": 1}, False)
+    assert run_single_flight(str(tmp_path), 'key', call) == ({"value": 1}, True)
+    assert run_single_flight(str(tmp_path), 'key', call, ttl=0) == ({"value": 2}, False)
+    assert len(calls) == 2
+
+
+def test_errors_are_not_shared(tmp_path):
+    calls = []
+
+    def call():
+        calls.append(1)
+        time.sleep(0.1)
+        return {"error": "Analysis failed"}
+
+    results = run_concurrently(str(tmp_path), 'key', call, 3)
+    assert len(calls) == 3
+    assert not any(shared for _, shared in results)
+
+
+def test_async_followers_share_with_sync_leader(tmp_path):
+    started = threading.Event()
+
+    def call():
+        started.set()
+        time.sleep(0.3)
+        return {"value": "sync"}
+
+    leader = threading.Thread(target=run_single_flight, args=(str(tmp_path), 'key', call))
+    leader.start()
+    started.wait(5)
+
+    async def follower():
+        return await run_single_flight_async(str(tmp_path), 'key', lambda: None)
+
+    assert asyncio.run(follower()) == ({"value": "sync"}, True)
+    leader.join(5)
+
+
+def test_sweep_does_not_split_leaders(tmp_path, monkeypatch):
+    directory = derived_dir(str(tmp_path), INFLIGHT_DIRNAME)
+    lock_path = os.path.join(directory, 'key.lock')
+    open(lock_path, 'a').close()
+    age(lock_path, 3600)
+
+    # A caller opens the lock file, then a sweep unlinks it before the caller locks it
+    real_try_lock = single_flight._try_lock
+    swept = []
+
+    def try_lock_after_sweep(lock_file, key, deadline):
+        if not swept:
+            swept.append(True)
+            single_flight._sweep_expired(directory, ttl=1)
+        return real_try_lock(lock_file, key, deadline)
+
+    monkeypatch.setattr(single_flight, '_try_lock', try_lock_after_sweep)
+    with single_flight._acquire(lock_path, 'key', time.monotonic() + 5) as lock_file:
+        # The caller ended up holding the file that is at the path, not the orphan
+        assert swept
+        assert os.fstat(lock_file.fileno()).st_ino == os.stat(lock_path).st_ino
+
+
+def test_sweep_skips_lock_files_in_use(tmp_path):
+    calls = []
+
+    def call():
+        lock_path = os.path.join(tmp_path, '.derived', INFLIGHT_DIRNAME, 'key.lock')
+        age(lock_path, 3600)
+        single_flight._sweep_expired(os.path.dirname(lock_path), ttl=1)
+        calls.append(os.path.exists(lock_path))
+        return {"ok": True}
+
+    result, shared = run_single_flight(str(tmp_path), 'key', call)
+    assert result == {"ok": True} and not shared
+    assert calls == [True]
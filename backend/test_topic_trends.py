@@ -0,0 +1,89 @@
+"""
+Tests for utils/topic_trends.py
+
+    python -m pytest test_topic_trends.py
+"""
+import json
+
+import pytest
+
+from utils import topic_trends
+from utils.topic_trends import canonicalize_topic, get_topic_series, record_summary_topics
+
+
+def write_summary(patient_dir, week_start, week_end, topics):
+    filename = f'summary_{week_start}_to_{week_end}.json'
+    summary = {"key_topics": [{"topic": topic, "count": count} for topic, count in topics.items()]}
+    (patient_dir / filename).write_text(json.dumps(summary))
+    return filename, summary
+
+
+@pytest.mark.parametrize('raw, canonical', [
+    ('Work', 'work'),
+    ('  CAREER ', 'work'),
+    ('Work Stress', 'work'),
+    ('family_relationships', 'family'),
+    ('Self-Esteem', 'self-worth'),
+    ('self/care', 'coping'),
+    ('Sleep!', 'sleep'),
+    ('Panic attacks', 'anxiety'),
+    ('Friendships', 'friendship'),
+])
+def test_canonicalize_known_spellings(raw, canonical):
+    assert canonicalize_topic(raw) == canonical
+
+
+def test_canonicalize_phrases_prefer_a_canonical_word():
+    assert canonicalize_topic('stress at work') == 'work'
+    assert canonicalize_topic('Job stress') == 'work'
+    # The first canonical word wins, even over an alias that comes earlier ("friends")
+    assert canonicalize_topic('Work & Family') == 'work'
+    assert canonicalize_topic('friends & family') == 'family'
+
+
+def test_canonicalize_unknown_and_empty_topics():
+    assert canonicalize_topic('Hobbies') == 'hobbies'
+    assert canonicalize_topic('Music & Art') == 'music and art'
+    assert canonicalize_topic('  ') == ''
+    assert canonicalize_topic('!!') == ''
+    assert canonicalize_topic(None) == ''
+
+
+def test_rewritten_summary_replaces_its_week(tmp_path):
+    write_summary(tmp_path, '2025-01-05', '2025-01-11', {"Work": 2, "Mom": 1})
+    record_summary_topics(str(tmp_path), *write_summary(tmp_path, '2025-01-12', '2025-01-18', {"job": 3}))
+    record_summary_topics(str(tmp_path), *write_summary(tmp_path, '2025-01-05', '2025-01-11', {"Sleep": 4}))
+
+    series = get_topic_series(str(tmp_path))
+    rows = {row['topic']: row['counts'] for row in series['topics']}
+    assert rows == {"sleep": [4, 0], "work": [0, 3]}
+    assert [row['topic'] for row in get_topic_series(str(tmp_path), top=1)['topics']] == ['sleep']
+    assert [row['topic'] for row in get_topic_series(str(tmp_path), topics=['Career'])['topics']] == ['work']
+
+
+def test_lazy_build_waits_for_a_writer_holding_the_patient_lock(tmp_path, locked_writer, monkeypatch):
+    write_summary(tmp_path, '2025-01-05', '2025-01-11', {"Work": 2})
+    builds = []
+    real_build = topic_trends.build_topic_store
+    monkeypatch.setattr(topic_trends, 'build_topic_store', lambda path: builds.append(path) or real_build(path))
+
+    def write():
+        record_summary_topics(str(tmp_path), *write_summary(tmp_path, '2025-01-12', '2025-01-18', {"job": 3}))
+
+    writer = locked_writer(str(tmp_path), write)
+    series = get_topic_series(str(tmp_path))
+    writer.join()
+
+    assert len(builds) == 1
+    assert [week['week_start'] for week in series['weeks']] == ['2025-01-05', '2025-01-12']
+    assert series['topics'][0]['counts'] == [2, 3]
+
+
+def test_only_dated_summary_filenames_become_weeks(tmp_path):
+    write_summary(tmp_path, '2025-01-05', '2025-01-11', {"Work": 2})
+    (tmp_path / 'summary_latest.json').write_text(json.dumps({"key_topics": [{"topic": "Sleep"}]}))
+    (tmp_path / 'summary_2025-01-12_to_2025-01-18_draft.json').write_text('{}')
+
+    series = get_topic_series(str(tmp_path))
+    assert [week['week_start'] for week in series['weeks']] == ['2025-01-05']
+    assert [row['topic'] for row in series['topics']] == ['work']
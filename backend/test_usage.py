@@ -0,0 +1,56 @@
+"""
+Tests for the LLM usage ledger in utils/usage.py
+
+    python -m pytest test_usage.py
+"""
+import pytest
+
+from utils.usage import summarize_usage
+
+
+def record(patient_id, day, cost, outcome='ok', model='gpt-4o-mini', latency_ms=100.0, **tokens):
+    return {"patient_id": patient_id, "day": day, "model": model, "endpoint": "/api/analyze-week",
+            "outcome": outcome, "cost_usd": cost, "latency_ms": latency_ms,
+            "prompt_tokens": tokens.get('prompt', 0), "completion_tokens": tokens.get('completion', 0),
+            "cached_tokens": tokens.get('cached', 0)}
+
+
+RECORDS = [
+    record('alice', '2025-01-02', 0.00012, prompt=1000, completion=200, cached=500),
+    record('bob', '2025-01-01', 0.01, prompt=4000, completion=800, latency_ms=300.0),
+    record('alice', '2025-01-01', 0.00021, outcome='error', latency_ms=50.0),
+    record('carol', '2025-01-03', 0.002, model='gpt-4o', prompt=None, completion=None),
+]
+
+
+def test_totals_and_patient_groups_most_expensive_first():
+    summary = summarize_usage(RECORDS)
+
+    assert summary['totals'] == {"calls": 4, "errors": 1, "prompt_tokens": 5000, "completion_tokens": 1000,
+                                 "cached_tokens": 500, "cost_usd": 0.0123, "latency_ms_avg": 137.5}
+    assert [row['key'] for row in summary['groups']] == ['bob', 'carol', 'alice']
+    alice = summary['groups'][2]
+    assert (alice['calls'], alice['errors'], alice['cost_usd'], alice['latency_ms_avg']) == (2, 1, 0.0003, 75.0)
+
+
+def test_day_groups_are_in_date_order():
+    summary = summarize_usage(RECORDS, group_by='day')
+    assert [(row['key'], row['calls']) for row in summary['groups']] == [
+        ('2025-01-01', 2), ('2025-01-02', 1), ('2025-01-03', 1)
+    ]
+
+
+def test_therapist_groups_put_unassigned_patients_under_none():
+    summary = summarize_usage(RECORDS, group_by='therapist', therapist_of={"alice": "dr-lee", "bob": "dr-lee"})
+    assert [(row['key'], row['calls']) for row in summary['groups']] == [('dr-lee', 3), (None, 1)]
+
+
+def test_empty_ledger_and_unknown_group():
+    assert summarize_usage([], group_by='model') == {
+        "group_by": "model",
+        "totals": {"calls": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0,
+                   "cost_usd": 0.0, "latency_ms_avg": 0.0},
+        "groups": []
+    }
+    with pytest.raises(ValueError):
+        summarize_usage(RECORDS, group_by='week')
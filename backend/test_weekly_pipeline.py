@@ -0,0 +1,149 @@
+"""
+Tests for utils/weekly_pipeline.py (offline; no LLM calls)
+
+    python -m pytest test_weekly_pipeline.py
+"""
+import asyncio
+import json
+import os
+
+import pytest
+
+from utils import weekly_pipeline
+from utils.weekly_pipeline import (
+    analyze_and_save_week,
+    analyze_and_save_week_async,
+    build_weekly_data,
+    persist_week,
+)
+
+WEEK_START, WEEK_END = '2025-01-05', '2025-01-11'
+
+
+def make_entries(*dates):
+    return [{"date": day, "content": f"Entry for {day}", "word_count": 3} for day in dates]
+
+
+def summary_path(patient_dir):
+    return os.path.join(patient_dir, f'summary_{WEEK_START}_to_{WEEK_END}.json')
+
+
+def analyzer_that_raises(*args, **kwargs):
+    raise RuntimeError("OPENAI_API_KEY not found in environment variables")
+
+
+async def async_analyzer_that_raises(*args, **kwargs):
+    analyzer_that_raises()
+
+
+def test_entries_saved_when_analysis_raises(tmp_path, monkeypatch):
+    monkeypatch.setattr(weekly_pipeline, 'analyze_weekly_entries', analyzer_that_raises)
+    patient_dir = str(tmp_path / 'patient-1')
+    os.makedirs(patient_dir)
+    new_entries = make_entries('2025-01-06', '2025-01-07')
+    weekly_data = build_weekly_data(patient_dir, 'patient-1', WEEK_START, WEEK_END, new_entries)
+
+    with pytest.raises(RuntimeError):
+        analyze_and_save_week(patient_dir, weekly_data, 'auto', new_entries=new_entries)
+
+    assert os.path.exists(os.path.join(patient_dir, '2025-01-06.json'))
+    assert os.path.exists(os.path.join(patient_dir, '2025-01-07.json'))
+    assert os.path.exists(os.path.join(patient_dir, f'week_{WEEK_START}_to_{WEEK_END}.json'))
+    assert not os.path.exists(summary_path(patient_dir))
+
+
+def test_entries_saved_when_async_analysis_raises(tmp_path, monkeypatch):
+    monkeypatch.setattr(weekly_pipeline, 'analyze_weekly_entries_async', async_analyzer_that_raises)
+    patient_dir = str(tmp_path / 'patient-1')
+    os.makedirs(patient_dir)
+    new_entries = make_entries('2025-01-06')
+    weekly_data = build_weekly_data(patient_dir, 'patient-1', WEEK_START, WEEK_END, new_entries)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(analyze_and_save_week_async(patient_dir, weekly_data, 'auto', new_entries=new_entries))
+
+    assert os.path.exists(os.path.join(patient_dir, '2025-01-06.json'))
+    assert os.path.exists(os.path.join(patient_dir, f'week_{WEEK_START}_to_{WEEK_END}.json'))
+
+
+@pytest.mark.parametrize('analysis', [
+    None,
+    {"error": "Analysis failed", "exception": "timeout"},
+    {"analysis_mode": "unchanged", "patterns": []},
+])
+def test_persist_week_writes_entries_without_a_usable_analysis(tmp_path, analysis):
+    patient_dir = str(tmp_path)
+    new_entries = make_entries('2025-01-06')
+    weekly_data = build_weekly_data(patient_dir, 'patient-1', WEEK_START, WEEK_END, new_entries)
+
+    persist_week(patient_dir, weekly_data, new_entries, analysis)
+
+    assert os.path.exists(os.path.join(patient_dir, '2025-01-06.json'))
+    assert os.path.exists(os.path.join(patient_dir, f'week_{WEEK_START}_to_{WEEK_END}.json'))
+    assert not os.path.exists(summary_path(patient_dir))
+
+
+def test_build_weekly_data_prefers_unsaved_entries(tmp_path):
+    patient_dir = str(tmp_path)
+    persist_week(patient_dir, build_weekly_data(patient_dir, 'patient-1', WEEK_START, WEEK_END),
+                 make_entries('2025-01-06', '2025-01-12'))
+    edited = [{"date": "2025-01-06", "content": "Edited", "word_count": 1}]
+
+    weekly_data = build_weekly_data(patient_dir, 'patient-1', WEEK_START, WEEK_END, edited + make_entries('2025-01-05'))
+
+    assert [entry['date'] for entry in weekly_data['entries']] == ['2025-01-05', '2025-01-06']
+    assert weekly_data['entries'][1]['content'] == 'Edited'
+
+
+def test_analyze_and_save_week_writes_summary_and_shares_duplicates(tmp_path, fake_llm):
+    patient_dir = str(tmp_path / 'patient-1')
+    os.makedirs(patient_dir)
+    new_entries = make_entries('2025-01-06', '2025-01-07')
+    weekly_data = build_weekly_data(patient_dir, 'patient-1', WEEK_START, WEEK_END, new_entries)
+
+    analysis, _, shared = analyze_and_save_week(patient_dir, weekly_data, 'full', new_entries=new_entries)
+    assert 'error' not in analysis and not shared
+    with open(summary_path(patient_dir)) as f:
+        assert json.load(f)['patterns'] == analysis['patterns']
+
+    # An identical request within the TTL reuses the result instead of calling the LLM again
+    _, _, shared = analyze_and_save_week(patient_dir, weekly_data, 'full', new_entries=new_entries)
+    assert shared and fake_llm.calls == 1
+
+
+def test_unchanged_week_keeps_the_stored_summary(tmp_path, fake_llm):
+    patient_dir = str(tmp_path / 'patient-1')
+    os.makedirs(patient_dir)
+    new_entries = make_entries('2025-01-06')
+    weekly_data = build_weekly_data(patient_dir, 'patient-1', WEEK_START, WEEK_END, new_entries)
+    analyze_and_save_week(patient_dir, weekly_data, 'full', new_entries=new_entries)
+    stored = os.stat(summary_path(patient_dir)).st_mtime_ns
+
+    analysis, _, _ = analyze_and_save_week(patient_dir, build_weekly_data(patient_dir, 'patient-1', WEEK_START, WEEK_END))
+    assert analysis['analysis_mode'] == 'unchanged'
+    assert fake_llm.calls == 1
+    assert os.stat(summary_path(patient_dir)).st_mtime_ns == stored
+
+
+def test_full_pipeline_script_saves_through_the_weekly_pipeline(tmp_path, fake_llm, monkeypatch):
+    from argparse import Namespace
+    from scripts import full_pipeline
+
+    monkeypatch.setattr(full_pipeline, 'DATA_DIR', tmp_path)
+    entries_file = tmp_path / 'entries.json'
+    entries_file.write_text(json.dumps([{"date": "2025-01-06", "text": "Work was hard."},
+                                        {"date": "2025-01-07", "text": "Slept badly."}]))
+    args = Namespace(patient_id='patient-1', week_start=WEEK_START, week_end=WEEK_END, entries_file=str(entries_file),
+                     overwrite=False, mode='auto', report_format='markdown')
+
+    result = full_pipeline.run_pipeline(args)
+    assert result.summary_file == tmp_path / 'patient-1' / f'summary_{WEEK_START}_to_{WEEK_END}.json'
+    assert 'summary_text' not in json.loads(result.summary_file.read_text())
+    assert 'Narrative Summary' in result.report_file.read_text()
+    assert len(json.loads(result.weekly_file.read_text())['missing_days']) == 5
+    pending = json.loads((tmp_path / '.archive' / 'pending.jsonl').read_text())
+    assert pending['patient_id'] == 'patient-1'
+
+    # A rerun shares the first analysis like any identical request
+    assert full_pipeline.run_pipeline(args).analysis['patterns'] == result.analysis['patterns']
+    assert fake_llm.calls == 1
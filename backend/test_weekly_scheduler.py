@@ -0,0 +1,58 @@
+"""
+Tests for the scheduled weekly analysis in utils/weekly_scheduler.py
+
+    python -m pytest test_weekly_scheduler.py
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from utils.weekly_scheduler import due_week, spread_offset
+
+NEW_YORK = {"id": "patient-1", "timezone": "America/New_York"}
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize('now, week, run_at', [
+    # Spring forward (2025-03-09 02:00): the Sunday midnight before the change is still EST
+    (utc(2025, 3, 9, 4, 59), ('2025-02-23', '2025-03-01'), utc(2025, 3, 2, 5, 0)),
+    (utc(2025, 3, 9, 5, 0), ('2025-03-02', '2025-03-08'), utc(2025, 3, 9, 5, 0)),
+    # The first week closing on EDT runs an hour earlier in UTC
+    (utc(2025, 3, 16, 4, 0), ('2025-03-09', '2025-03-15'), utc(2025, 3, 16, 4, 0)),
+    # Fall back (2025-11-02 02:00): a week earlier is local midnight on EDT, not UTC minus 7 days
+    (utc(2025, 11, 9, 4, 30), ('2025-10-26', '2025-11-01'), utc(2025, 11, 2, 4, 0)),
+    (utc(2025, 11, 9, 5, 0), ('2025-11-02', '2025-11-08'), utc(2025, 11, 9, 5, 0)),
+])
+def test_due_week_closes_at_local_midnight_across_dst(now, week, run_at):
+    assert due_week(NEW_YORK, now, 0, 'sunday') == (*week, run_at)
+
+
+def test_due_week_in_a_zone_ahead_of_utc():
+    patient = {"id": "patient-2", "timezone": "Pacific/Auckland"}
+    # 00:30 on Sunday 2025-01-05 in Auckland (NZDT, UTC+13)
+    assert due_week(patient, utc(2025, 1, 4, 11, 30), 0, 'sunday') == (
+        '2024-12-29', '2025-01-04', utc(2025, 1, 4, 11, 0)
+    )
+
+
+def test_unknown_timezone_falls_back_to_utc():
+    patient = {"id": "patient-3", "timezone": "Mars/Olympus_Mons"}
+    assert due_week(patient, utc(2025, 1, 5, 0, 0), 0, 'sunday')[2] == utc(2025, 1, 5, 0, 0)
+
+
+def test_spread_delays_each_patient_by_a_stable_offset():
+    spread = 6 * 3600
+    offsets = {patient_id: spread_offset(patient_id, spread) for patient_id in (f'patient-{i}' for i in range(200))}
+    assert all(timedelta(0) <= offset < timedelta(seconds=spread) for offset in offsets.values())
+    assert offsets['patient-7'] == spread_offset('patient-7', spread)
+    # Spread out rather than bunched at midnight: every hour of the window gets some patients
+    assert {int(offset.total_seconds() // 3600) for offset in offsets.values()} == set(range(6))
+
+    patient = {"id": "patient-7", "timezone": "America/New_York"}
+    midnight = utc(2025, 3, 16, 4, 0)  # Sunday 00:00 EDT
+    run_at = midnight + offsets['patient-7']
+    assert due_week(patient, run_at - timedelta(seconds=1), spread, 'sunday')[:2] == ('2025-03-02', '2025-03-08')
+    assert due_week(patient, run_at, spread, 'sunday') == ('2025-03-09', '2025-03-15', run_at)
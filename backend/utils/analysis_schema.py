@@ -0,0 +1,354 @@
+"""
+Weekly Analysis Schema
+
+Fast validation and local repair of the JSON the model returns for
+prompts/analysis_prompt.txt, so common defects do not cost another full
+analysis call:
+
+    - truncated JSON (cut off mid-string or mid-list) is closed at the last
+      complete value
+    - enum values outside the schema ("medium", "Behavioral", "mixed" for a
+      topic) are mapped to the nearest allowed value
+    - wrong scalar types (numeric strings, a string where a list belongs) are
+      coerced, optional fields get defaults
+
+Required sections that are missing or unusable after repair are reported so
+the caller can request just those sections (see SECTION_FORMATS).
+"""
+import json
+
+PATTERN_TYPES = ('recurring_theme', 'emotional_cycle', 'behavioral_pattern')
+SEVERITIES = ('low', 'moderate', 'high')
+OVERALL_SENTIMENTS = ('positive', 'negative', 'neutral', 'mixed')
+TOPIC_SENTIMENTS = ('positive', 'negative', 'neutral')
+
+ENUM_SYNONYMS = {
+    'theme': 'recurring_theme',
+    'recurring': 'recurring_theme',
+    'cycle': 'emotional_cycle',
+    'emotional': 'emotional_cycle',
+    'behavior': 'behavioral_pattern',
+    'behaviour': 'behavioral_pattern',
+    'behavioural_pattern': 'behavioral_pattern',
+    'mild': 'low',
+    'minor': 'low',
+    'medium': 'moderate',
+    'mid': 'moderate',
+    'elevated': 'high',
+    'severe': 'high',
+    'critical': 'high',
+    'pos': 'positive',
+    'neg': 'negative',
+    'mixed': 'neutral',
+    'ambivalent': 'neutral',
+}
+
+REQUIRED_SECTIONS = ('patterns', 'mood_trends', 'key_topics', 'clinical_prompts')
+OPTIONAL_LIST_SECTIONS = ('strengths_observed', 'concerns')
+
+# Format snippets (from prompts/analysis_prompt.txt) for targeted follow-up requests
+SECTION_FORMATS = {
+    'patterns': '''"patterns": [
+    {
+      "type": "recurring_theme" | "emotional_cycle" | "behavioral_pattern",
+      "title": "Brief title of the pattern",
+      "description": "Detailed description with evidence from entries",
+      "frequency": number of occurrences,
+      "related_entries": ["date1", "date2"],
+      "severity": "low" | "moderate" | "high"
+    }
+  ]''',
+    'mood_trends': '''"mood_trends": {
+    "overall_sentiment": "positive" | "negative" | "neutral" | "mixed",
+    "sentiment_score": -1.0 to 1.0,
+    "mood_shift": "Description of changes over the week",
+    "notable_times": "Any time-based patterns"
+  }''',
+    'key_topics': '''"key_topics": [
+    {"topic": "topic_name", "count": number, "sentiment": "positive|negative|neutral"}
+  ]''',
+    'clinical_prompts': '''"clinical_prompts": [
+    "Specific suggestion for therapeutic exploration"
+  ]''',
+}
+
+
+def close_truncated_json(text, max_attempts=200):
+    """
+    Parse a JSON object, closing it at the last complete value if truncated
+
+    Args:
+        text: Raw model output (may include code fences or trailing text)
+        max_attempts: Cut points to try, starting from the end
+
+    Returns:
+        Tuple (parsed dict or None, whether the text had to be cut or closed)
+    """
+    start = (text or '').find('{')
+    if start < 0:
+        return None, False
+    text = text[start:]
+
+    stack = []
+    cuts = []
+    in_string = escape = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == '\\':
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+
+        if ch == '"':
+            in_string = True
+        elif ch in '{[':
+            stack.append('}' if ch == '{' else ']')
+            cuts.append((i + 1, tuple(stack)))
+        elif ch in '}]':
+            if stack:
+                stack.pop()
+            if not stack:
+                # Complete top-level object; ignore anything after it
+                try:
+                    parsed = json.loads(text[:i + 1])
+                    return (parsed, i + 1 < len(text.rstrip())) if isinstance(parsed, dict) else (None, False)
+                except json.JSONDecodeError:
+                    return None, False
+        elif ch == ',':
+            cuts.append((i, tuple(stack)))
+
+    candidates = [(len(text), tuple(stack), in_string)]
+    candidates += [(position, closers, False) for position, closers in reversed(cuts)]
+
+    for position, closers, close_string in candidates[:max_attempts]:
+        snippet = text[:position].rstrip().rstrip(',')
+        snippet += ('"' if close_string else '') + ''.join(reversed(closers))
+        try:
+            parsed = json.loads(snippet)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(parsed, dict):
+            return parsed, True
+    return None, False
+
+
+def parse_analysis_text(text):
+    """
+    Parse model output into a dictionary, repairing truncation locally
+
+    Returns:
+        Tuple (dict or None, list of repair notes)
+    """
+    try:
+        parsed = json.loads(text)
+        if isinstance(parsed, dict):
+            return parsed, []
+    except (TypeError, json.JSONDecodeError):
+        pass
+
+    parsed, repaired = close_truncated_json(text)
+    if parsed is None:
+        return None, []
+    return parsed, ['truncated_json_closed'] if repaired else ['extracted_json_object']
+
+
+def _coerce_enum(value, choices, default):
+    """Map a free-form value onto one of `choices`; returns (value, changed)"""
+    if value in choices:
+        return value, False
+    if not isinstance(value, str) or not value.strip():
+        return default, True
+
+    # The model sometimes echoes the union from the format ("low | moderate")
+    normalized = value.split('|')[0].strip().lower().replace('-', '_').replace(' ', '_')
+    if normalized in choices:
+        return normalized, True
+    if ENUM_SYNONYMS.get(normalized) in choices:
+        return ENUM_SYNONYMS[normalized], True
+    for choice in choices:
+        if choice.startswith(normalized) or normalized.startswith(choice):
+            return choice, True
+    for word in normalized.split('_'):
+        if ENUM_SYNONYMS.get(word) in choices:
+            return ENUM_SYNONYMS[word], True
+    return default, True
+
+
+def _coerce_int(value, default):
+    if isinstance(value, bool):
+        return default
+    if isinstance(value, int):
+        return value
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return default
+
+
+def _coerce_float(value):
+    if isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _coerce_string_list(value):
+    """List of strings from a list/str/dict value; None if unusable"""
+    if isinstance(value, str):
+        return [value] if value.strip() else []
+    if not isinstance(value, list):
+        return None
+    items = []
+    for item in value:
+        if isinstance(item, dict):
+            item = item.get('prompt') or item.get('text') or item.get('description') or next(
+                (v for v in item.values() if isinstance(v, str)), None)
+        if isinstance(item, (str, int, float)) and str(item).strip():
+            items.append(str(item))
+    return items
+
+
+def _repair_pattern(pattern, path, repairs):
+    if isinstance(pattern, str):
+        pattern = {"title": pattern, "description": pattern}
+        repairs.append(f"{path}: string converted to pattern")
+    if not isinstance(pattern, dict):
+        return None
+
+    if not pattern.get('title'):
+        if not pattern.get('description'):
+            return None
+        pattern['title'] = ' '.join(str(pattern['description']).split()[:6])
+        repairs.append(f"{path}.title: derived from description")
+    pattern.setdefault('description', pattern['title'])
+
+    for field, choices, default in (('type', PATTERN_TYPES, 'recurring_theme'),
+                                    ('severity', SEVERITIES, 'moderate')):
+        value, changed = _coerce_enum(pattern.get(field), choices, default)
+        if changed:
+            repairs.append(f"{path}.{field}: {pattern.get(field)!r} -> {value!r}")
+            pattern[field] = value
+
+    related = _coerce_string_list(pattern.get('related_entries'))
+    if related is None:
+        related = []
+        repairs.append(f"{path}.related_entries: defaulted")
+    pattern['related_entries'] = related
+
+    frequency = _coerce_int(pattern.get('frequency'), None)
+    if frequency is None or frequency < 0:
+        frequency = max(1, len(related))
+        repairs.append(f"{path}.frequency: defaulted to {frequency}")
+    pattern['frequency'] = frequency
+    return pattern
+
+
+def _repair_topic(topic, path, repairs):
+    if isinstance(topic, str):
+        topic = {"topic": topic}
+        repairs.append(f"{path}: string converted to topic")
+    if not isinstance(topic, dict) or not topic.get('topic'):
+        return None
+
+    count = _coerce_int(topic.get('count'), None)
+    if count is None or count < 0:
+        count = 1
+        repairs.append(f"{path}.count: defaulted")
+    topic['count'] = count
+
+    value, changed = _coerce_enum(topic.get('sentiment'), TOPIC_SENTIMENTS, 'neutral')
+    if changed:
+        repairs.append(f"{path}.sentiment: {topic.get('sentiment')!r} -> {value!r}")
+        topic['sentiment'] = value
+    return topic
+
+
+def _repair_mood_trends(mood, repairs):
+    """Returns the repaired mood_trends dict, or None if the score is unusable"""
+    if not isinstance(mood, dict):
+        return None
+
+    score = _coerce_float(mood.get('sentiment_score'))
+    if score is None:
+        return None
+    if not -1.0 <= score <= 1.0:
+        repairs.append(f"mood_trends.sentiment_score: {score} clamped")
+        score = max(-1.0, min(1.0, score))
+    mood['sentiment_score'] = score
+
+    if mood.get('overall_sentiment') not in OVERALL_SENTIMENTS:
+        derived = 'positive' if score > 0.2 else 'negative' if score < -0.2 else 'neutral'
+        value, _ = _coerce_enum(mood.get('overall_sentiment'), OVERALL_SENTIMENTS, derived)
+        repairs.append(f"mood_trends.overall_sentiment: {mood.get('overall_sentiment')!r} -> {value!r}")
+        mood['overall_sentiment'] = value
+
+    for field in ('mood_shift', 'notable_times'):
+        if not isinstance(mood.get(field), str):
+            mood[field] = '' if mood.get(field) is None else str(mood[field])
+    return mood
+
+
+def repair_analysis(analysis):
+    """
+    Validate an analysis against the schema and repair what can be fixed locally
+
+    Args:
+        analysis: Parsed model output (modified in place)
+
+    Returns:
+        Tuple (analysis, repairs, missing_sections): human-readable repair notes
+        and required sections that are absent or unusable
+    """
+    repairs = []
+    missing = []
+
+    patterns = analysis.get('patterns')
+    if isinstance(patterns, dict):
+        patterns = [patterns]
+    if isinstance(patterns, list):
+        repaired = [_repair_pattern(p, f"patterns[{i}]", repairs) for i, p in enumerate(patterns)]
+        analysis['patterns'] = [p for p in repaired if p is not None]
+        if len(analysis['patterns']) < len(patterns):
+            repairs.append(f"patterns: dropped {len(patterns) - len(analysis['patterns'])} unusable items")
+    else:
+        missing.append('patterns')
+
+    mood = _repair_mood_trends(analysis.get('mood_trends'), repairs)
+    if mood is None:
+        missing.append('mood_trends')
+    else:
+        analysis['mood_trends'] = mood
+
+    topics = analysis.get('key_topics')
+    if isinstance(topics, list):
+        repaired = [_repair_topic(t, f"key_topics[{i}]", repairs) for i, t in enumerate(topics)]
+        analysis['key_topics'] = [t for t in repaired if t is not None]
+    else:
+        missing.append('key_topics')
+
+    prompts = _coerce_string_list(analysis.get('clinical_prompts'))
+    if not prompts:
+        missing.append('clinical_prompts')
+    else:
+        if prompts != analysis.get('clinical_prompts'):
+            repairs.append("clinical_prompts: coerced to a list of strings")
+        analysis['clinical_prompts'] = prompts
+
+    for section in OPTIONAL_LIST_SECTIONS:
+        items = _coerce_string_list(analysis.get(section))
+        if items is None:
+            items = []
+            repairs.append(f"{section}: defaulted to []")
+        analysis[section] = items
+
+    return analysis, repairs, missing
+
+
+def section_format(sections):
+    """JSON format snippet covering only `sections`"""
+    return '{\n  ' + ',\n  '.join(SECTION_FORMATS[section] for section in sections) + '\n}'
@@ -4,16 +4,60 @@ Weekly Journal Analyzer using OpenAI GPT-4
 Analyzes weekly journal entries for emotional patterns, trends, and clinical insights
 """
 import os
+import re
 import json
+import time
+import hashlib
 from datetime import datetime
-from openai import OpenAI
 
-def load_prompt_template():
-    """Load the analysis prompt template"""
+from utils.llm_client import get_async_client, get_client
+from utils.llm_scheduler import get_scheduler, estimate_tokens
+from utils.metrics import observe_llm_call
+from utils.timing import span
+from utils.usage import record_usage
+from utils.analysis_schema import parse_analysis_text, repair_analysis, section_format
+
+# Expected completion size for a weekly analysis, used for token budgeting
+COMPLETION_TOKEN_ESTIMATE = 1500
+# Follow-up requests only return the sections that failed validation
+SECTION_COMPLETION_TOKEN_ESTIMATE = 500
+
+# Model tiers for weekly analysis; small, low-risk weeks use the cheaper model
+MODEL_TIERS = {
+    'small': os.getenv('ANALYSIS_MODEL_SMALL', 'gpt-4o-mini'),
+    'large': os.getenv('ANALYSIS_MODEL_LARGE', 'gpt-4o')
+}
+
+# Weeks above either threshold always go to the large model
+SMALL_TIER_MAX_ENTRIES = int(os.getenv('SMALL_TIER_MAX_ENTRIES', 3))
+SMALL_TIER_MAX_TOKENS = int(os.getenv('SMALL_TIER_MAX_TOKENS', 1200))
+
+# Incremental re-analysis falls back to a full run above either threshold
+DELTA_MAX_FRACTION = float(os.getenv('DELTA_MAX_FRACTION', 0.5))
+DELTA_MAX_TOKENS = int(os.getenv('DELTA_MAX_TOKENS', 1500))
+
+# Bookkeeping fields added after the model responds; never sent back to the model
+ANALYSIS_METADATA_KEYS = (
+    'analysis_date', 'week_period', 'model_used', 'model_tier', 'routing_reason',
+    'llm_latency_ms', 'entry_count', 'analyzed_entries', 'analysis_mode', 'delta_entries', 'summary_text',
+    'schema_repairs'
+)
+
+# Language that should always get the large model's attention
+RISK_PATTERN = re.compile(
+    r"\b(suicid\w*|kill (?:my|him|her)self|end (?:it all|my life)|self[- ]harm\w*|"
+    r"hurt(?:ing)? myself|cutting|overdos\w*|want to die|better off dead|"
+    r"no reason to live|don'?t want to (?:live|be here)|hopeless\w*|worthless|"
+    r"what'?s the point|can'?t go on|abus\w*|panic attack\w*)\b",
+    re.IGNORECASE
+)
+
+def load_prompt_template(name='analysis_prompt.txt'):
+    """Load an analysis prompt template from the prompts directory"""
     prompt_path = os.path.join(
         os.path.dirname(os.path.dirname(__file__)),
         'prompts',
-        'analysis_prompt.txt'
+        name
     )
 
     with open(prompt_path, 'r') as f:
@@ -44,7 +88,264 @@ Time: {entry.get('time', 'Unknown')}
 
     return '\n'.join(entries_text)
 
-def analyze_weekly_entries(weekly_data, model="gpt-4o", temperature=0.3):
+def screen_entries_for_risk(weekly_data):
+    """
+    Local keyword screen for risk language in a week's entries
+
+    This is not a clinical assessment - it only decides whether a week is too
+    sensitive to hand to the small model tier.
+
+    Args:
+        weekly_data: Dictionary containing an "entries" list
+
+    Returns:
+        Sorted list of matched risk phrases (empty when nothing matched)
+    """
+    matches = set()
+    for entry in weekly_data.get('entries', []):
+        matches.update(match.lower() for match in RISK_PATTERN.findall(entry.get('text', '')))
+    return sorted(matches)
+
+def route_weekly_analysis(weekly_data):
+    """
+    Pick the model tier for a week based on size and a local risk screen
+
+    Small, quiet weeks go to the cheaper/faster model; anything long, busy or
+    flagged by the risk screen goes to the large model.
+
+    Args:
+        weekly_data: Dictionary containing an "entries" list
+
+    Returns:
+        Dictionary describing the routing decision (tier, model, reason and inputs)
+    """
+    entry_count = len(weekly_data.get('entries', []))
+    entry_tokens = estimate_tokens(format_entries_for_analysis(weekly_data))
+    risk_flags = screen_entries_for_risk(weekly_data)
+
+    if risk_flags:
+        tier, reason = 'large', 'risk_screen'
+    elif entry_count > SMALL_TIER_MAX_ENTRIES:
+        tier, reason = 'large', 'entry_count'
+    elif entry_tokens > SMALL_TIER_MAX_TOKENS:
+        tier, reason = 'large', 'token_size'
+    else:
+        tier, reason = 'small', 'small_low_risk_week'
+
+    return {
+        "tier": tier,
+        "model": MODEL_TIERS[tier],
+        "reason": reason,
+        "entry_count": entry_count,
+        "estimated_tokens": entry_tokens,
+        "risk_flags": risk_flags
+    }
+
+ANALYSIS_SYSTEM_MESSAGE = (
+    "You are a clinical psychology AI assistant helping therapists analyze patient journal entries "
+    "for patterns and insights."
+)
+
+def _completion_args(full_prompt, model, temperature):
+    return {
+        "model": model,
+        "messages": [
+            {
+                "role": "system",
+                "content": ANALYSIS_SYSTEM_MESSAGE
+            },
+            {
+                "role": "user",
+                "content": full_prompt
+            }
+        ],
+        "temperature": temperature,
+        "response_format": {"type": "json_object"}  # Ensures JSON response
+    }
+
+def _parse_completion(response, started):
+    """Turn a chat completion into (analysis or error dict, latency in ms)"""
+    # Parse the response, closing truncated JSON locally if needed
+    analysis_text = response.choices[0].message.content
+    analysis, repairs = parse_analysis_text(analysis_text)
+    if analysis is None:
+        return {
+            "error": "Failed to parse GPT response as JSON",
+            "raw_response": analysis_text,
+            "exception": "No recoverable JSON object in response"
+        }, _elapsed_ms(started)
+
+    if repairs:
+        analysis['schema_repairs'] = repairs
+    return analysis, _elapsed_ms(started)
+
+def _request_analysis(client, full_prompt, model, temperature, completion_tokens=COMPLETION_TOKEN_ESTIMATE):
+    """Send one analysis request; returns (analysis or error dict, latency in ms)"""
+    started = time.perf_counter()
+    try:
+        # Call OpenAI API through the shared rate-limited scheduler
+        with span('llm'):
+            response = get_scheduler().execute(
+                lambda: client.chat.completions.create(**_completion_args(full_prompt, model, temperature)),
+                estimated_tokens=estimate_tokens(full_prompt) + completion_tokens
+            )
+    except Exception as e:
+        observe_llm_call('weekly', model, started, outcome='error')
+        record_usage('weekly', model, started, outcome='error')
+        return {
+            "error": "Analysis failed",
+            "exception": str(e)
+        }, _elapsed_ms(started)
+
+    observe_llm_call('weekly', model, started, response)
+    record_usage('weekly', model, started, response)
+    return _parse_completion(response, started)
+
+async def _request_analysis_async(client, full_prompt, model, temperature, completion_tokens=COMPLETION_TOKEN_ESTIMATE):
+    """Async _request_analysis using an AsyncOpenAI client"""
+    started = time.perf_counter()
+    try:
+        with span('llm'):
+            response = await get_scheduler().execute_async(
+                lambda: client.chat.completions.create(**_completion_args(full_prompt, model, temperature)),
+                estimated_tokens=estimate_tokens(full_prompt) + completion_tokens
+            )
+    except Exception as e:
+        observe_llm_call('weekly', model, started, outcome='error')
+        record_usage('weekly', model, started, outcome='error')
+        return {
+            "error": "Analysis failed",
+            "exception": str(e)
+        }, _elapsed_ms(started)
+
+    observe_llm_call('weekly', model, started, response)
+    record_usage('weekly', model, started, response)
+    return _parse_completion(response, started)
+
+def _elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 1)
+
+# The analysis logic below is written once as generator "flows" that yield
+# request arguments (prompt, model, temperature, completion_tokens) and receive
+# (analysis, latency_ms) back. _run_flow drives them with the blocking client
+# (Flask) and _run_flow_async with the async client (ASGI).
+
+def _run_flow(flow):
+    """Drive an analysis flow with blocking OpenAI requests"""
+    client = None
+    try:
+        request = next(flow)
+        while True:
+            client = client or get_client()
+            request = flow.send(_request_analysis(client, *request))
+    except StopIteration as done:
+        return done.value
+
+async def _run_flow_async(flow):
+    """Drive an analysis flow with async OpenAI requests"""
+    client = None
+    try:
+        request = next(flow)
+        while True:
+            client = client or get_async_client()
+            request = flow.send(await _request_analysis_async(client, *request))
+    except StopIteration as done:
+        return done.value
+
+def entry_fingerprint(entry):
+    """Short content hash of an entry, used to detect new or edited entries"""
+    content = f"{entry.get('date', '')}|{entry.get('time', '')}|{entry.get('text', '')}"
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()[:16]
+
+def _complete_analysis(analysis, weekly_data, model, temperature):
+    """
+    Repair an analysis against the schema; request only missing sections if needed
+
+    Returns (flow):
+        Tuple (analysis or error dict, extra latency in ms)
+    """
+    if 'error' in analysis:
+        return analysis, 0.0
+
+    analysis, repairs, missing = repair_analysis(analysis)
+    repairs = analysis.pop('schema_repairs', []) + repairs
+    latency_ms = 0.0
+
+    if missing:
+        requested = list(missing)
+        # Targeted follow-up: same entries, but only the missing sections' format
+        prompt = (
+            load_prompt_template('section_followup_prompt.txt')
+            .replace('{sections}', ', '.join(missing))
+            .replace('{format}', section_format(missing))
+            .replace('{entries}', format_entries_for_analysis(weekly_data))
+        )
+        sections, latency_ms = yield (prompt, model, temperature, SECTION_COMPLETION_TOKEN_ESTIMATE)
+        if 'error' in sections:
+            return sections, latency_ms
+
+        sections.pop('schema_repairs', None)
+        analysis.update({key: sections[key] for key in missing if key in sections})
+        analysis, more_repairs, missing = repair_analysis(analysis)
+        repairs += more_repairs + [f"{section}: requested in follow-up call" for section in requested if section not in missing]
+        if missing:
+            return {
+                "error": "Analysis response is missing required sections",
+                "exception": f"Missing after follow-up: {', '.join(missing)}"
+            }, latency_ms
+
+    if repairs:
+        analysis['schema_repairs'] = repairs
+    return analysis, latency_ms
+
+def _run_routed_analysis(prompt, routing, temperature, weekly_data):
+    """Run a prompt on the routed model, escalating once if the small tier fails (flow)"""
+    analysis, latency_ms = yield (prompt, routing['model'], temperature, COMPLETION_TOKEN_ESTIMATE)
+    analysis, repair_latency_ms = yield from _complete_analysis(analysis, weekly_data, routing['model'], temperature)
+    latency_ms += repair_latency_ms
+
+    if 'error' in analysis and routing['tier'] == 'small':
+        routing = dict(routing, tier='large', model=MODEL_TIERS['large'],
+                       reason='escalated_after_small_tier_failure')
+        analysis, escalated_latency_ms = yield (prompt, routing['model'], temperature, COMPLETION_TOKEN_ESTIMATE)
+        analysis, repair_latency_ms = yield from _complete_analysis(analysis, weekly_data, routing['model'], temperature)
+        latency_ms += escalated_latency_ms + repair_latency_ms
+
+    return analysis, routing, latency_ms
+
+def _finalize_analysis(analysis, weekly_data, routing, latency_ms, mode):
+    """Attach bookkeeping metadata to a model response (or error dict)"""
+    analysis['week_period'] = f"{weekly_data['week_start']} to {weekly_data['week_end']}"
+    analysis['model_used'] = routing['model']
+    if 'error' in analysis:
+        return analysis
+
+    entries = weekly_data.get('entries', [])
+    analysis['analysis_date'] = datetime.now().strftime('%Y-%m-%d')
+    analysis['model_tier'] = routing['tier']
+    analysis['routing_reason'] = routing['reason']
+    analysis['llm_latency_ms'] = latency_ms
+    analysis['entry_count'] = len(entries)
+    analysis['analysis_mode'] = mode
+    analysis['analyzed_entries'] = {entry.get('date', ''): entry_fingerprint(entry) for entry in entries}
+    return analysis
+
+def _weekly_flow(weekly_data, model, temperature):
+    """Full weekly analysis (flow)"""
+    # Load and prepare prompt
+    prompt_template = load_prompt_template()
+    entries_formatted = format_entries_for_analysis(weekly_data)
+    full_prompt = prompt_template.replace('{entries}', entries_formatted)
+
+    if model:
+        routing = {"tier": "explicit", "model": model, "reason": "caller_override"}
+    else:
+        routing = route_weekly_analysis(weekly_data)
+
+    analysis, routing, latency_ms = yield from _run_routed_analysis(full_prompt, routing, temperature, weekly_data)
+    return _finalize_analysis(analysis, weekly_data, routing, latency_ms, mode='full')
+
+def analyze_weekly_entries(weekly_data, model=None, temperature=0.3):
     """
     Main function to analyze weekly journal entries using OpenAI
 
@@ -56,69 +357,110 @@ def analyze_weekly_entries(weekly_data, model="gpt-4o", temperature=0.3):
                 "week_end": "YYYY-MM-DD",
                 "entries": [...]
             }
-        model: OpenAI model to use (default: gpt-4)
+        model: OpenAI model to use (default: routed by route_weekly_analysis)
         temperature: Model temperature (lower = more focused/deterministic)
 
     Returns:
         Dictionary with analysis results
     """
-    # Initialize OpenAI client
-    api_key = os.getenv('OPENAI_API_KEY')
-    if not api_key:
-        raise Exception("OPENAI_API_KEY not found in environment variables")
+    return _run_flow(_weekly_flow(weekly_data, model, temperature))
 
-    client = OpenAI(api_key=api_key)
+async def analyze_weekly_entries_async(weekly_data, model=None, temperature=0.3):
+    """Async analyze_weekly_entries using the AsyncOpenAI client"""
+    return await _run_flow_async(_weekly_flow(weekly_data, model, temperature))
 
-    # Load and prepare prompt
-    prompt_template = load_prompt_template()
-    entries_formatted = format_entries_for_analysis(weekly_data)
-    full_prompt = prompt_template.replace('{entries}', entries_formatted)
+def find_changed_entries(weekly_data, previous_analysis):
+    """
+    Compare a week's entries with those recorded in a previous analysis
 
-    try:
-        # Call OpenAI API
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a clinical psychology AI assistant helping therapists analyze patient journal entries for patterns and insights."
-                },
-                {
-                    "role": "user",
-                    "content": full_prompt
-                }
-            ],
-            temperature=temperature,
-            response_format={"type": "json_object"}  # Ensures JSON response
-        )
+    Args:
+        weekly_data: Current weekly data with "entries"
+        previous_analysis: Stored summary (must contain "analyzed_entries")
 
-        # Parse the response
-        analysis_text = response.choices[0].message.content
-        analysis = json.loads(analysis_text)
+    Returns:
+        Tuple (changed, removed): entries that are new or edited, and dates
+        analyzed before that are no longer present. Returns (None, None) when
+        the previous analysis has no fingerprints to compare against.
+    """
+    analyzed = previous_analysis.get('analyzed_entries')
+    if not isinstance(analyzed, dict):
+        return None, None
 
-        # Add metadata
-        analysis['analysis_date'] = datetime.now().strftime('%Y-%m-%d')
-        analysis['week_period'] = f"{weekly_data['week_start']} to {weekly_data['week_end']}"
-        analysis['model_used'] = model
-        analysis['entry_count'] = len(weekly_data.get('entries', []))
+    entries = weekly_data.get('entries', [])
+    changed = [entry for entry in entries if analyzed.get(entry.get('date', '')) != entry_fingerprint(entry)]
+    current_dates = {entry.get('date', '') for entry in entries}
+    removed = sorted(date for date in analyzed if date not in current_dates)
+    return changed, removed
 
-        return analysis
+def _update_flow(weekly_data, previous_analysis, model, temperature):
+    """Incremental weekly analysis with full-analysis fallbacks (flow)"""
+    if not previous_analysis or 'error' in previous_analysis:
+        return (yield from _weekly_flow(weekly_data, model, temperature))
 
-    except json.JSONDecodeError as e:
-        # Fallback if JSON parsing fails
-        return {
-            "error": "Failed to parse GPT response as JSON",
-            "raw_response": analysis_text,
-            "exception": str(e)
-        }
+    changed, removed = find_changed_entries(weekly_data, previous_analysis)
+    if changed is None or removed:
+        return (yield from _weekly_flow(weekly_data, model, temperature))
 
-    except Exception as e:
-        # Handle other errors
-        return {
-            "error": "Analysis failed",
-            "exception": str(e),
-            "week_period": f"{weekly_data['week_start']} to {weekly_data['week_end']}"
-        }
+    if not changed:
+        # Nothing new since the stored analysis; reuse it without an LLM call
+        return dict(previous_analysis, analysis_mode='unchanged', delta_entries=0)
+
+    entries = weekly_data.get('entries', [])
+    delta_data = dict(weekly_data, entries=changed)
+    delta_text = format_entries_for_analysis(delta_data)
+    if len(changed) > len(entries) * DELTA_MAX_FRACTION or estimate_tokens(delta_text) > DELTA_MAX_TOKENS:
+        return (yield from _weekly_flow(weekly_data, model, temperature))
+
+    previous_core = {key: value for key, value in previous_analysis.items() if key not in ANALYSIS_METADATA_KEYS}
+    prompt = (
+        load_prompt_template('delta_analysis_prompt.txt')
+        .replace('{week_period}', f"{weekly_data['week_start']} to {weekly_data['week_end']}")
+        .replace('{previous_entry_count}', str(previous_analysis.get('entry_count', 0)))
+        .replace('{entry_count}', str(len(entries)))
+        .replace('{previous_analysis}', json.dumps(previous_core, indent=2))
+        .replace('{entries}', delta_text)
+    )
+
+    if model:
+        routing = {"tier": "explicit", "model": model, "reason": "caller_override"}
+    else:
+        routing = route_weekly_analysis(delta_data)
+        # Risk language anywhere in the week keeps the update on the large model
+        if routing['tier'] == 'small' and screen_entries_for_risk(weekly_data):
+            routing = dict(routing, tier='large', model=MODEL_TIERS['large'], reason='risk_screen')
+
+    analysis, routing, latency_ms = yield from _run_routed_analysis(prompt, routing, temperature, weekly_data)
+    if 'error' in analysis:
+        # A failed delta is not worth surfacing when a full run can still succeed
+        return (yield from _weekly_flow(weekly_data, model, temperature))
+
+    analysis = _finalize_analysis(analysis, weekly_data, routing, latency_ms, mode='incremental')
+    analysis['delta_entries'] = len(changed)
+    return analysis
+
+def analyze_weekly_update(weekly_data, previous_analysis, model=None, temperature=0.3):
+    """
+    Update an existing weekly analysis with only the new or edited entries
+
+    Sends the previous analysis plus the delta instead of the whole week. Falls
+    back to analyze_weekly_entries when there is nothing to compare against,
+    entries were removed, or the delta is too large a share of the week.
+
+    Args:
+        weekly_data: Current weekly data (all entries for the week)
+        previous_analysis: The stored summary for the same week, or None
+        model: Optional model override (default: routed on the delta)
+        temperature: Model temperature
+
+    Returns:
+        Dictionary with analysis results; "analysis_mode" is "incremental",
+        "unchanged" or "full"
+    """
+    return _run_flow(_update_flow(weekly_data, previous_analysis, model, temperature))
+
+async def analyze_weekly_update_async(weekly_data, previous_analysis, model=None, temperature=0.3):
+    """Async analyze_weekly_update using the AsyncOpenAI client"""
+    return await _run_flow_async(_update_flow(weekly_data, previous_analysis, model, temperature))
 
 def generate_summary_for_frontend(analysis):
     """
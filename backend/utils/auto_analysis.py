@@ -0,0 +1,332 @@
+"""
+Debounced Automatic Re-analysis
+
+Ingesting an entry marks its patient-week dirty; one aggregate + analyze run
+happens only after the week has been quiet for AUTO_ANALYSIS_DEBOUNCE_SECONDS,
+so a burst of entries costs a single (usually incremental) LLM call.
+
+Dirty weeks are marker files, so every gunicorn worker sees the same state:
+
+    data/<patient_id>/.derived/dirty/<week_start>_to_<week_end>.json
+
+Each write touches the marker (its mtime is the "last write" clock). When a
+worker's timer fires it re-checks the marker: if a later write moved the mtime
+it waits out the rest of the window, and otherwise it claims the week by
+renaming the marker. Only one worker can win the rename, so a week is never
+analyzed twice for the same burst. Entries written while a run is in progress
+create a fresh marker and trigger one follow-up run. A claim left behind by a
+worker that died mid-run (its pid is gone, or it is older than
+STALE_CLAIM_SECONDS) is turned back into a dirty marker by resume().
+
+Nothing starts at import: the server calls resume() from its startup hook
+(see app.start_background_runners), and only with AUTO_ANALYSIS_ENABLED=true.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from datetime import date, timedelta
+
+from utils.storage import WEEK_FILE_PATTERN, derived_dir, write_json
+from utils.usage import usage_context
+from utils.weekly_pipeline import aggregate_week_entries, analyze_and_save_week
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEBOUNCE_SECONDS = 300
+DIRTY_DIRNAME = 'dirty'
+CLAIM_SUFFIX = '.running-'
+STALE_CLAIM_SECONDS = 3600
+WEEKDAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+DIRTY_FILE_PATTERN = re.compile(r'^(\d{4}-\d{2}-\d{2})_to_(\d{4}-\d{2}-\d{2})\.json$')
+
+
+def week_bounds(patient_dir, date_str, week_start_day=None):
+    """
+    Week (start, end) that a date belongs to
+
+    Weeks that already exist on disk win, so ad-hoc ranges created through
+    /api/aggregate-week keep being refreshed; otherwise weeks start on
+    WEEK_START_DAY (default Sunday, matching the sample data).
+
+    Args:
+        patient_dir: Patient data directory
+        date_str: Entry date (YYYY-MM-DD)
+        week_start_day: Optional weekday name overriding WEEK_START_DAY
+
+    Returns:
+        Tuple (week_start, week_end) as YYYY-MM-DD strings
+    """
+    for filename in sorted(os.listdir(patient_dir)):
+        match = WEEK_FILE_PATTERN.match(filename)
+        if match and match.group(1) <= date_str <= match.group(2):
+            return match.group(1), match.group(2)
+
+    week_start, week_end = calendar_week(date.fromisoformat(date_str), week_start_day)
+    return week_start.isoformat(), week_end.isoformat()
+
+
+def calendar_week(day, week_start_day=None):
+    """
+    Calendar week (start, end) dates containing `day`
+
+    Args:
+        day: datetime.date
+        week_start_day: Optional weekday name overriding WEEK_START_DAY (default Sunday)
+
+    Returns:
+        Tuple of datetime.date (week_start, week_end)
+    """
+    start_day = (week_start_day or os.getenv('WEEK_START_DAY', 'sunday')).lower()
+    if start_day not in WEEKDAYS:
+        raise ValueError(f"WEEK_START_DAY must be one of {', '.join(WEEKDAYS)}")
+
+    week_start = day - timedelta(days=(day.weekday() - WEEKDAYS.index(start_day)) % 7)
+    return week_start, week_start + timedelta(days=6)
+
+
+def refresh_week(patient_id, patient_dir, week_start, week_end):
+    """
+    Aggregate and analyze one week, writing the weekly file and summary
+
+    Returns:
+        The analysis dictionary
+
+    Raises:
+        RuntimeError: If the LLM analysis failed (nothing is written)
+    """
+    weekly_data = aggregate_week_entries(patient_dir, patient_id, week_start, week_end)
+    analysis, _, _ = analyze_and_save_week(patient_dir, weekly_data, mode='auto')
+    if 'error' in analysis:
+        raise RuntimeError(f"{analysis['error']}: {analysis.get('exception', 'unknown error')}")
+    return analysis
+
+
+def _marker_path(patient_dir, week_start, week_end):
+    return os.path.join(derived_dir(patient_dir, DIRTY_DIRNAME), f"{week_start}_to_{week_end}.json")
+
+
+def _claim_is_stale(claim_path, max_age):
+    """True if the worker that claimed a week is gone or the claim is older than max_age"""
+    try:
+        age = time.time() - os.stat(claim_path).st_mtime
+    except FileNotFoundError:
+        return False
+    if age > max_age:
+        return True
+
+    try:
+        pid = int(claim_path.rsplit(CLAIM_SUFFIX, 1)[1].split('-', 1)[0])
+        os.kill(pid, 0)
+    except (ValueError, IndexError, ProcessLookupError):
+        return True
+    except PermissionError:
+        pass  # Alive, owned by another user
+    return False
+
+
+def _recover_claim(dirty_dir, filename, max_age=STALE_CLAIM_SECONDS):
+    """
+    Turn a stale claim back into a dirty marker
+
+    Returns:
+        The marker filename to schedule, or None if the claim is still live
+        (or another process recovered it first)
+    """
+    claim_path = os.path.join(dirty_dir, filename)
+    if not _claim_is_stale(claim_path, max_age):
+        return None
+
+    marker_name = filename.split(CLAIM_SUFFIX, 1)[0]
+    marker = os.path.join(dirty_dir, marker_name)
+    try:
+        if os.path.exists(marker):
+            # Newer writes already re-marked the week
+            os.remove(claim_path)
+            return None
+        os.rename(claim_path, marker)
+    except FileNotFoundError:
+        return None
+    logger.warning("Recovered abandoned re-analysis claim %s", claim_path)
+    return marker_name
+
+
+class ReanalysisDebouncer:
+    """Coalesces entry writes into one delayed re-analysis per patient-week"""
+
+    def __init__(self, debounce_seconds=DEFAULT_DEBOUNCE_SECONDS, runner=refresh_week,
+                 stale_claim_seconds=STALE_CLAIM_SECONDS):
+        self.debounce_seconds = float(debounce_seconds)
+        self.stale_claim_seconds = float(stale_claim_seconds)
+        self.runner = runner
+        self.lock = threading.Lock()
+        self.timers = {}
+        self.marks_total = 0
+        self.coalesced_total = 0
+        self.runs_total = 0
+        self.failures_total = 0
+        self.last_run = None
+
+    def mark_dirty(self, patient_id, patient_dir, dates):
+        """
+        Mark the weeks containing `dates` dirty and (re)start their quiet period
+
+        Args:
+            patient_id: Patient identifier
+            patient_dir: Patient data directory
+            dates: Entry dates (YYYY-MM-DD) that were just written
+
+        Returns:
+            List of (week_start, week_end) tuples that were marked
+        """
+        weeks = sorted({week_bounds(patient_dir, date_str) for date_str in dates if date_str})
+        for week_start, week_end in weeks:
+            write_json(_marker_path(patient_dir, week_start, week_end), {
+                "patient_id": patient_id,
+                "week_start": week_start,
+                "week_end": week_end,
+                "marked_at": time.time()
+            })
+            with self.lock:
+                self.marks_total += 1
+            self._schedule((patient_id, patient_dir, week_start, week_end), self.debounce_seconds)
+        return weeks
+
+    def resume(self, base_data_dir):
+        """
+        Schedule weeks left dirty by a previous process (e.g. after a restart)
+
+        Weeks claimed by a worker that was killed mid-run are scheduled again.
+
+        Returns:
+            Number of weeks scheduled
+        """
+        resumed = 0
+        for patient_id in sorted(os.listdir(base_data_dir)):
+            dirty_dir = os.path.join(base_data_dir, patient_id, '.derived', DIRTY_DIRNAME)
+            if not os.path.isdir(dirty_dir):
+                continue
+            for filename in sorted(os.listdir(dirty_dir)):
+                if CLAIM_SUFFIX in filename:
+                    filename = _recover_claim(dirty_dir, filename, self.stale_claim_seconds)
+                    if filename is None:
+                        continue
+                match = DIRTY_FILE_PATTERN.match(filename)
+                if not match:
+                    continue
+                week_start, week_end = match.groups()
+                self._schedule((patient_id, os.path.join(base_data_dir, patient_id), week_start, week_end),
+                               self.debounce_seconds)
+                resumed += 1
+        return resumed
+
+    def _schedule(self, key, delay):
+        with self.lock:
+            if key in self.timers:
+                # The pending timer re-reads the marker mtime when it fires
+                self.coalesced_total += 1
+                return
+            timer = threading.Timer(max(0.0, delay), self._fire, args=(key,))
+            timer.daemon = True
+            self.timers[key] = timer
+        timer.start()
+
+    def _fire(self, key):
+        patient_id, patient_dir, week_start, week_end = key
+        marker = _marker_path(patient_dir, week_start, week_end)
+
+        with self.lock:
+            self.timers.pop(key, None)
+
+        try:
+            quiet_for = time.time() - os.stat(marker).st_mtime
+        except FileNotFoundError:
+            return  # Another worker already ran this week
+
+        if quiet_for < self.debounce_seconds:
+            self._schedule(key, self.debounce_seconds - quiet_for)
+            return
+
+        claimed = f"{marker}{CLAIM_SUFFIX}{os.getpid()}-{threading.get_ident()}"
+        try:
+            os.rename(marker, claimed)
+        except FileNotFoundError:
+            return
+        os.utime(claimed)  # The claim's age starts now, not at the last write
+
+        try:
+            with usage_context(endpoint='auto_analysis'):
+                self.runner(patient_id, patient_dir, week_start, week_end)
+            os.remove(claimed)
+            with self.lock:
+                self.runs_total += 1
+                self.last_run = {"patient_id": patient_id, "week_start": week_start,
+                                 "week_end": week_end, "finished_at": time.time()}
+        except Exception:
+            logger.exception("Automatic re-analysis failed for %s %s to %s", patient_id, week_start, week_end)
+            with self.lock:
+                self.failures_total += 1
+            # Keep the week dirty (unless newer writes re-marked it) so the next write or restart retries
+            if os.path.exists(marker):
+                os.remove(claimed)
+            else:
+                os.replace(claimed, marker)
+
+    def pending(self):
+        """Weeks with a timer in this process"""
+        with self.lock:
+            return [
+                {"patient_id": key[0], "week_start": key[2], "week_end": key[3]}
+                for key in sorted(self.timers)
+            ]
+
+    def metrics(self):
+        pending = self.pending()
+        with self.lock:
+            return {
+                "enabled": auto_analysis_enabled(),
+                "debounce_seconds": self.debounce_seconds,
+                "pending_weeks": len(pending),
+                "pending": pending,
+                "marks_total": self.marks_total,
+                "coalesced_total": self.coalesced_total,
+                "runs_total": self.runs_total,
+                "failures_total": self.failures_total,
+                "last_run": self.last_run
+            }
+
+
+_debouncer = None
+_debouncer_lock = threading.Lock()
+
+
+def auto_analysis_enabled():
+    return os.getenv('AUTO_ANALYSIS_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+
+
+def get_debouncer():
+    """Return the process-wide debouncer, configured from environment variables"""
+    global _debouncer
+    if _debouncer is None:
+        with _debouncer_lock:
+            if _debouncer is None:
+                _debouncer = ReanalysisDebouncer(
+                    debounce_seconds=float(os.getenv('AUTO_ANALYSIS_DEBOUNCE_SECONDS', DEFAULT_DEBOUNCE_SECONDS))
+                )
+    return _debouncer
+
+
+def schedule_reanalysis(patient_id, patient_dir, entries):
+    """
+    Mark the weeks of freshly written entries for debounced re-analysis
+
+    Scheduling failures are logged and never fail the write itself.
+    """
+    if not auto_analysis_enabled():
+        return []
+    try:
+        return get_debouncer().mark_dirty(patient_id, patient_dir, [entry.get('date') for entry in entries])
+    except Exception:
+        logger.exception("Failed to schedule re-analysis for %s", patient_id)
+        return []
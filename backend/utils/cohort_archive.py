@@ -0,0 +1,502 @@
+"""
+Cohort Metrics Archive
+
+Cross-patient column store with one row per patient-week, so cohort questions
+("how did the caseload's mood move this quarter?", "which topics dominate
+across all patients?") are answered with NumPy over a few arrays instead of
+opening every summary file of every patient.
+
+Each row holds the week, the weekly `sentiment_score`, entry count, the
+number of low/moderate/high severity patterns, the week's concerns and its
+canonical topic counts (utils/topic_trends.canonicalize_topic). Topics and
+concern texts are stored sparsely as (row, value) pairs: topic_row / topic_id /
+topic_count and concern_row / concern_text.
+
+Storage: data/.archive/
+    cohort.npz       compacted columns
+    pending.jsonl    rows appended since the last compaction
+
+A summary write appends one JSON line to pending.jsonl (a single O_APPEND
+write, so gunicorn workers never rewrite the whole archive on the request
+path). Once the log passes COMPACT_BYTES it is folded into cohort.npz; a newer
+row for the same patient-week replaces the older one. Writers and readers hold
+a shared flock on archive.lock and compaction an exclusive one, so a reader
+never sees the new columns together with the old log or vice versa. A missing
+or outdated archive is rebuilt from the summary files on first use.
+"""
+import fcntl
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+from utils.metrics import record_cache
+from utils.storage import SUMMARY_FILE_PATTERN, atomic_write, from_day, summary_week_range, to_day
+from utils.timing import span
+from utils.topic_trends import canonicalize_topic
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIRNAME = '.archive'
+ARCHIVE_FILENAME = 'cohort.npz'
+PENDING_FILENAME = 'pending.jsonl'
+LOCK_FILENAME = 'archive.lock'
+STORE_VERSION = 2
+COMPACT_BYTES = 1_000_000
+SEVERITIES = ('low', 'moderate', 'high')
+
+_cache_lock = threading.Lock()
+_cache = {}
+
+
+def archive_dir(base_data_dir):
+    path = os.path.join(base_data_dir, ARCHIVE_DIRNAME)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+@contextmanager
+def _archive_lock(base_data_dir, exclusive=False, blocking=True):
+    """flock on archive.lock; yields False if non-blocking and already held"""
+    fd = os.open(os.path.join(archive_dir(base_data_dir), LOCK_FILENAME), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        mode = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+        try:
+            fcntl.flock(fd, mode if blocking else mode | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        yield True
+    finally:
+        os.close(fd)
+
+
+def summary_row(patient_id, filename, summary):
+    """Archive row for one summary file; None if the filename has no week range"""
+    week_range = summary_week_range(filename)
+    if not week_range:
+        return None
+    week_start, week_end = week_range
+
+    severities = [0, 0, 0]
+    for pattern in summary.get('patterns', []):
+        severity = str(pattern.get('severity', '')).lower()
+        if severity in SEVERITIES:
+            severities[SEVERITIES.index(severity)] += 1
+
+    topics = {}
+    for item in summary.get('key_topics', []):
+        topic = canonicalize_topic(item.get('topic'))
+        if not topic:
+            continue
+        try:
+            count = int(item.get('count', 1) or 0)
+        except (TypeError, ValueError):
+            count = 1
+        topics[topic] = topics.get(topic, 0) + count
+
+    score = summary.get('mood_trends', {}).get('sentiment_score')
+    try:
+        score = float(score) if score is not None else None
+    except (TypeError, ValueError):
+        score = None
+
+    return {
+        "patient_id": patient_id,
+        "week_start": week_start,
+        "week_end": week_end,
+        "score": score,
+        "entry_count": int(summary.get('entry_count', 0) or 0),
+        "severities": severities,
+        "concerns": len(summary.get('concerns') or []),
+        "concern_texts": [str(concern) for concern in summary.get('concerns') or []],
+        "topics": topics
+    }
+
+
+def _empty_columns():
+    return {
+        "patient_ids": np.zeros(0, dtype=str),
+        "topics": np.zeros(0, dtype=str),
+        "patient": np.zeros(0, dtype=np.int32),
+        "week_start": np.zeros(0, dtype=np.int32),
+        "week_end": np.zeros(0, dtype=np.int32),
+        "score": np.zeros(0, dtype=np.float32),
+        "entry_count": np.zeros(0, dtype=np.int32),
+        "severity": np.zeros((0, len(SEVERITIES)), dtype=np.int16),
+        "concerns": np.zeros(0, dtype=np.int16),
+        "topic_row": np.zeros(0, dtype=np.int32),
+        "topic_id": np.zeros(0, dtype=np.int32),
+        "topic_count": np.zeros(0, dtype=np.int32),
+        "concern_row": np.zeros(0, dtype=np.int32),
+        "concern_text": np.zeros(0, dtype=str)
+    }
+
+
+def _merge(columns, rows):
+    """
+    Fold rows (dicts from summary_row) into columns
+
+    Rows are applied in order after the existing columns; the last row for a
+    patient-week wins. Output is sorted by patient, then week.
+    """
+    if not rows:
+        return columns
+
+    patient_ids = list(columns['patient_ids'])
+    patient_index = {patient_id: i for i, patient_id in enumerate(patient_ids)}
+    topics = list(columns['topics'])
+    topic_index = {topic: i for i, topic in enumerate(topics)}
+
+    new_topic_rows, new_topic_ids, new_topic_counts = [], [], []
+    new_concern_rows, new_concern_texts = [], []
+    base_rows = len(columns['patient'])
+    for offset, row in enumerate(rows):
+        for concern in row.get('concern_texts', []):
+            new_concern_rows.append(base_rows + offset)
+            new_concern_texts.append(concern)
+        for topic, count in row['topics'].items():
+            if topic not in topic_index:
+                topic_index[topic] = len(topics)
+                topics.append(topic)
+            new_topic_rows.append(base_rows + offset)
+            new_topic_ids.append(topic_index[topic])
+            new_topic_counts.append(count)
+        if row['patient_id'] not in patient_index:
+            patient_index[row['patient_id']] = len(patient_ids)
+            patient_ids.append(row['patient_id'])
+
+    patient = np.concatenate([columns['patient'],
+                              np.array([patient_index[row['patient_id']] for row in rows], dtype=np.int32)])
+    week_start = np.concatenate([columns['week_start'],
+                                 np.array([to_day(row['week_start']) for row in rows], dtype=np.int32)])
+    merged = {
+        "week_end": np.concatenate([columns['week_end'],
+                                    np.array([to_day(row['week_end']) for row in rows], dtype=np.int32)]),
+        "score": np.concatenate([columns['score'], np.array(
+            [np.nan if row['score'] is None else row['score'] for row in rows], dtype=np.float32)]),
+        "entry_count": np.concatenate([columns['entry_count'],
+                                       np.array([row['entry_count'] for row in rows], dtype=np.int32)]),
+        "severity": np.concatenate([columns['severity'],
+                                    np.array([row['severities'] for row in rows], dtype=np.int16)]),
+        "concerns": np.concatenate([columns['concerns'], np.array([row['concerns'] for row in rows], dtype=np.int16)])
+    }
+
+    # Last occurrence of each (patient, week) key wins
+    keys = (patient.astype(np.int64) << 32) | week_start.astype(np.int64)
+    _, last_from_end = np.unique(keys[::-1], return_index=True)
+    keep = len(keys) - 1 - last_from_end
+    keep = keep[np.lexsort((week_start[keep], patient[keep]))]
+
+    new_position = np.full(len(keys), -1, dtype=np.int64)
+    new_position[keep] = np.arange(len(keep))
+    topic_row = new_position[np.concatenate([columns['topic_row'], np.array(new_topic_rows, dtype=np.int32)])]
+    topic_id = np.concatenate([columns['topic_id'], np.array(new_topic_ids, dtype=np.int32)])
+    topic_count = np.concatenate([columns['topic_count'], np.array(new_topic_counts, dtype=np.int32)])
+    live = topic_row >= 0
+    order = np.argsort(topic_row[live], kind='stable')
+    concern_row = new_position[np.concatenate([columns['concern_row'], np.array(new_concern_rows, dtype=np.int32)])]
+    concern_text = np.concatenate([columns['concern_text'], np.array(new_concern_texts, dtype=str)])
+    concern_live = concern_row >= 0
+    concern_order = np.argsort(concern_row[concern_live], kind='stable')
+
+    result = {
+        "patient_ids": np.array(patient_ids, dtype=str),
+        "topics": np.array(topics, dtype=str),
+        "patient": patient[keep],
+        "week_start": week_start[keep],
+        "topic_row": topic_row[live][order].astype(np.int32),
+        "topic_id": topic_id[live][order],
+        "topic_count": topic_count[live][order],
+        "concern_row": concern_row[concern_live][concern_order].astype(np.int32),
+        "concern_text": concern_text[concern_live][concern_order]
+    }
+    result.update({name: column[keep] for name, column in merged.items()})
+    return result
+
+
+def _save(base_data_dir, columns):
+    path = os.path.join(archive_dir(base_data_dir), ARCHIVE_FILENAME)
+    with atomic_write(path, 'wb') as f:
+        np.savez(f, version=np.array([STORE_VERSION], dtype=np.int32), **columns)
+
+
+def _read_pending(path):
+    rows = []
+    if not os.path.exists(path):
+        return rows
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                rows.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue  # A line cut short by a crash mid-write
+    return rows
+
+
+def _file_key(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def _load_unlocked(base_data_dir):
+    """Merged columns (cached by file identity), or None if cohort.npz is missing or outdated"""
+    directory = archive_dir(base_data_dir)
+    archive_path = os.path.join(directory, ARCHIVE_FILENAME)
+    pending_path = os.path.join(directory, PENDING_FILENAME)
+    key = (_file_key(archive_path), _file_key(pending_path))
+    if key[0] is None:
+        return None
+
+    with _cache_lock:
+        cached = _cache.get(directory)
+    record_cache('cohort_archive', bool(cached and cached[0] == key))
+    if cached and cached[0] == key:
+        return cached[1]
+
+    with np.load(archive_path) as stored:
+        if int(stored['version'][0]) != STORE_VERSION:
+            return None
+        columns = {name: stored[name] for name in _empty_columns()}
+    columns = _merge(columns, _read_pending(pending_path))
+
+    with _cache_lock:
+        _cache[directory] = (key, columns)
+    return columns
+
+
+def _patient_dirs(base_data_dir):
+    for name in sorted(os.listdir(base_data_dir)):
+        path = os.path.join(base_data_dir, name)
+        if not name.startswith('.') and os.path.isdir(path):
+            yield name, path
+
+
+def build_archive(base_data_dir):
+    """Rebuild the archive from every patient's summary files"""
+    rows = []
+    for patient_id, patient_dir in _patient_dirs(base_data_dir):
+        for filename in sorted(os.listdir(patient_dir)):
+            if SUMMARY_FILE_PATTERN.match(filename):
+                try:
+                    with open(os.path.join(patient_dir, filename), 'r') as f:
+                        row = summary_row(patient_id, filename, json.load(f))
+                except (OSError, json.JSONDecodeError):
+                    logger.warning("Skipping unreadable summary %s/%s", patient_id, filename)
+                    continue
+                if row:
+                    rows.append(row)
+
+    with _archive_lock(base_data_dir, exclusive=True):
+        # Rows logged while scanning are newer than what the scan read, so they go last
+        pending_path = os.path.join(archive_dir(base_data_dir), PENDING_FILENAME)
+        columns = _merge(_empty_columns(), rows + _read_pending(pending_path))
+        _save(base_data_dir, columns)
+        open(pending_path, 'w').close()
+    return columns
+
+
+def load_archive(base_data_dir):
+    """Current archive columns, building the archive on first use"""
+    with span('archive'):
+        with _archive_lock(base_data_dir):
+            columns = _load_unlocked(base_data_dir)
+        if columns is None:
+            columns = build_archive(base_data_dir)
+        return columns
+
+
+def compact(base_data_dir, blocking=False):
+    """Fold pending.jsonl into cohort.npz; skipped if another process is compacting"""
+    with _archive_lock(base_data_dir, exclusive=True, blocking=blocking) as acquired:
+        if not acquired:
+            return False
+        columns = _load_unlocked(base_data_dir)
+        if columns is None:
+            return False
+        _save(base_data_dir, columns)
+        open(os.path.join(archive_dir(base_data_dir), PENDING_FILENAME), 'w').close()
+        return True
+
+
+def record_summary(base_data_dir, patient_id, filename, summary):
+    """Append a patient's summary row to the archive under base_data_dir"""
+    row = summary_row(patient_id, filename, summary)
+    if row is None:
+        return
+
+    pending_path = os.path.join(archive_dir(base_data_dir), PENDING_FILENAME)
+    line = (json.dumps(row, separators=(',', ':')) + '\n').encode('utf-8')
+    with _archive_lock(base_data_dir):
+        fd = os.open(pending_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+            size = os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+
+    if size >= COMPACT_BYTES:
+        compact(base_data_dir)
+
+
+def _select(columns, start=None, end=None, patient_ids=None):
+    """Boolean row mask for weeks starting in [start, end] and the given patients"""
+    mask = np.ones(len(columns['patient']), dtype=bool)
+    if start:
+        mask &= columns['week_start'] >= to_day(start)
+    if end:
+        mask &= columns['week_start'] <= to_day(end)
+    if patient_ids is not None:
+        codes = np.flatnonzero(np.isin(columns['patient_ids'], list(patient_ids)))
+        mask &= np.isin(columns['patient'], codes)
+    return mask
+
+
+def _group_quantiles(groups, values, quantiles):
+    """Per-group linearly interpolated quantiles (groups sorted ascending, values sorted within each group)"""
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    counts = np.diff(np.r_[starts, len(groups)])
+    results = []
+    for q in quantiles:
+        position = q * (counts - 1)
+        below = np.floor(position).astype(np.int64)
+        above = np.minimum(below + 1, counts - 1)
+        fraction = position - below
+        results.append(values[starts + below] * (1 - fraction) + values[starts + above] * fraction)
+    return results
+
+
+def weekly_cohort_stats(base_data_dir, start=None, end=None, patient_ids=None):
+    """
+    Per-week aggregates across a cohort
+
+    Args:
+        base_data_dir: Data directory holding the patient directories
+        start, end: Optional inclusive range of week start dates (YYYY-MM-DD)
+        patient_ids: Optional iterable restricting the cohort
+
+    Returns:
+        Columnar dictionary: week_start, patients, entries, mean/p25/median/p75
+        sentiment score, and patients with a high-severity pattern or any concern
+    """
+    columns = load_archive(base_data_dir)
+    mask = _select(columns, start, end, patient_ids)
+    weeks = columns['week_start'][mask]
+    scores = columns['score'][mask]
+
+    unique_weeks, inverse, patients = np.unique(weeks, return_inverse=True, return_counts=True)
+    entries = np.bincount(inverse, weights=columns['entry_count'][mask], minlength=len(unique_weeks))
+    high = np.bincount(inverse, weights=columns['severity'][mask][:, 2] > 0, minlength=len(unique_weeks))
+    concerns = np.bincount(inverse, weights=columns['concerns'][mask] > 0, minlength=len(unique_weeks))
+
+    scored = ~np.isnan(scores)
+    scored_counts = np.bincount(inverse[scored], minlength=len(unique_weeks))
+    score_sums = np.bincount(inverse[scored], weights=scores[scored], minlength=len(unique_weeks))
+    means = np.full(len(unique_weeks), np.nan)
+    np.divide(score_sums, scored_counts, out=means, where=scored_counts > 0)
+
+    p25 = median = p75 = np.full(len(unique_weeks), np.nan)
+    if scored.any():
+        order = np.lexsort((scores[scored], inverse[scored]))
+        groups, sorted_scores = inverse[scored][order], scores[scored][order]
+        with_scores = np.unique(groups)
+        p25, median, p75 = (np.full(len(unique_weeks), np.nan) for _ in range(3))
+        for target, values in zip((p25, median, p75), _group_quantiles(groups, sorted_scores, (0.25, 0.5, 0.75))):
+            target[with_scores] = values
+
+    def rounded(values):
+        return [None if np.isnan(value) else round(float(value), 3) for value in values]
+
+    return {
+        "start": start,
+        "end": end,
+        "weeks": len(unique_weeks),
+        "week_start": [from_day(day) for day in unique_weeks],
+        "patients": patients.tolist(),
+        "entries": entries.astype(int).tolist(),
+        "mean_score": rounded(means),
+        "p25_score": rounded(p25),
+        "median_score": rounded(median),
+        "p75_score": rounded(p75),
+        "high_severity_patients": high.astype(int).tolist(),
+        "patients_with_concerns": concerns.astype(int).tolist()
+    }
+
+
+def cohort_topics(base_data_dir, start=None, end=None, patient_ids=None, limit=20):
+    """
+    Most frequent canonical topics across a cohort
+
+    Returns:
+        List of {"topic", "count", "patients", "weeks"}, highest count first
+    """
+    columns = load_archive(base_data_dir)
+    mask = _select(columns, start, end, patient_ids)
+    selected = mask[columns['topic_row']]
+    topic_ids = columns['topic_id'][selected]
+    topic_rows = columns['topic_row'][selected]
+    vocabulary = len(columns['topics'])
+
+    counts = np.bincount(topic_ids, weights=columns['topic_count'][selected], minlength=vocabulary)
+    weeks = np.bincount(topic_ids, minlength=vocabulary)
+    patient_pairs = np.unique((columns['patient'][topic_rows].astype(np.int64) << 32) | topic_ids)
+    patients = np.bincount((patient_pairs & 0xFFFFFFFF).astype(np.int64), minlength=vocabulary)
+
+    top = np.argsort(-counts, kind='stable')[:limit]
+    return [
+        {"topic": str(columns['topics'][i]), "count": int(counts[i]), "patients": int(patients[i]),
+         "weeks": int(weeks[i])}
+        for i in top if counts[i] > 0
+    ]
+
+
+def latest_weeks(base_data_dir, patient_ids):
+    """
+    Latest and previous analyzed week for each patient, in one pass over the archive
+
+    Args:
+        base_data_dir: Data directory holding the patient directories
+        patient_ids: Patients to report
+
+    Returns:
+        Dictionary patient_id -> {"week_start", "week_end", "score", "previous_week_start",
+        "previous_score", "severity_counts", "entry_count", "concerns"} for patients with at
+        least one analyzed week
+    """
+    columns = load_archive(base_data_dir)
+    rows = np.flatnonzero(_select(columns, patient_ids=patient_ids))
+    if not len(rows):
+        return {}
+
+    # Rows are sorted by patient, then week: each patient's last row is its latest week
+    patients = columns['patient'][rows]
+    last = rows[np.r_[patients[1:] != patients[:-1], True]]
+    has_previous = (last > 0) & (columns['patient'][np.maximum(last - 1, 0)] == columns['patient'][last])
+
+    concern_starts = np.searchsorted(columns['concern_row'], last, side='left')
+    concern_ends = np.searchsorted(columns['concern_row'], last, side='right')
+
+    def score(row):
+        value = columns['score'][row]
+        return None if np.isnan(value) else round(float(value), 3)
+
+    latest = {}
+    for i, row in enumerate(last):
+        previous = row - 1 if has_previous[i] else None
+        latest[str(columns['patient_ids'][columns['patient'][row]])] = {
+            "week_start": from_day(columns['week_start'][row]),
+            "week_end": from_day(columns['week_end'][row]),
+            "score": score(row),
+            "previous_week_start": from_day(columns['week_start'][previous]) if previous is not None else None,
+            "previous_score": score(previous) if previous is not None else None,
+            "severity_counts": dict(zip(SEVERITIES, columns['severity'][row].tolist())),
+            "entry_count": int(columns['entry_count'][row]),
+            "concerns": [str(text) for text in columns['concern_text'][concern_starts[i]:concern_ends[i]]]
+        }
+    return latest
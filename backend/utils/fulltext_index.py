@@ -0,0 +1,571 @@
+"""
+Inverted Full-Text Index
+
+Keyword search across a patient's entries and weekly analyses, or a whole
+therapist caseload, without grepping the data directory. Each patient has a
+positional inverted index on disk that is updated incrementally whenever an
+entry or summary is written.
+
+Indexed documents:
+    entry:<YYYY-MM-DD>            entry text
+    summary:<start>_to_<end>      patterns[].title, clinical_prompts, concerns
+
+Query syntax (case-insensitive terms, uppercase operators):
+    anxious work                  both terms (implicit AND)
+    mother OR mom                 either term
+    work NOT boss / work -boss    exclude documents
+    "panic attack"                exact phrase
+    anx*                          prefix match
+    (sleep OR insomnia) work      grouping
+
+Index layout: data/<patient_id>/.derived/fulltext/
+    index.json      postings and documents as of the last merge
+    delta.jsonl     documents written since, one JSON line each
+
+Saving the whole index re-serializes every posting, which grows with the
+patient's history, so a write only appends its documents to delta.jsonl (one
+O_APPEND write). Readers replay the delta over index.json; replay is idempotent
+because a document replaces any earlier one with the same id. Once the delta
+passes MERGE_BYTES the writer saves the merged index and empties the delta.
+Run scripts/bench_fulltext.py to compare the two write costs.
+"""
+import json
+import math
+import os
+import re
+import threading
+
+from utils.metrics import record_cache
+from utils.storage import SUMMARY_FILE_PATTERN, derived_dir, load_entries, patient_lock, summary_week_range, write_json
+
+INDEX_VERSION = 1
+INDEX_FILENAME = 'index.json'
+DELTA_FILENAME = 'delta.jsonl'
+MERGE_BYTES = 256_000
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+QUERY_PATTERN = re.compile(r'"[^"]*"|\(|\)|[^\s()"]+')
+
+# Position gap between summary fields so phrases never span two fields
+FIELD_GAP = 100
+
+SNIPPET_CHARS = 160
+
+_cache_lock = threading.Lock()
+_index_cache = {}
+_base_cache = {}
+
+
+class QuerySyntaxError(ValueError):
+    """Raised when a search query cannot be parsed"""
+
+
+def tokenize(text):
+    """Lowercase word tokens used for both indexing and queries"""
+    return TOKEN_PATTERN.findall((text or '').lower().replace('’', "'"))
+
+
+def entry_document(entry):
+    """Build the indexable document for a daily entry"""
+    return {
+        "id": f"entry:{entry['date']}",
+        "kind": "entry",
+        "date": entry['date'],
+        "fields": [entry.get('text', '')]
+    }
+
+
+def summary_document(filename, summary):
+    """Build the indexable document for a weekly summary file; None if the filename has no week range"""
+    week_range = summary_week_range(filename)
+    if not week_range:
+        return None
+    week_start, week_end = week_range
+    return {
+        "id": f"summary:{week_start}_to_{week_end}",
+        "kind": "summary",
+        "date": week_start,
+        "fields": (
+            [pattern.get('title', '') for pattern in summary.get('patterns', [])]
+            + list(summary.get('clinical_prompts', []))
+            + list(summary.get('concerns', []))
+        )
+    }
+
+
+class InvertedIndex:
+    """
+    Positional inverted index for one patient
+
+    postings: term -> {doc_id: [positions]}
+    docs:     doc_id -> {"kind", "date", "terms"}
+    """
+
+    def __init__(self, docs=None, postings=None):
+        self.docs = docs or {}
+        self.postings = postings or {}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get('docs'), data.get('postings'))
+
+    def to_dict(self):
+        return {"version": INDEX_VERSION, "docs": self.docs, "postings": self.postings}
+
+    def remove_document(self, doc_id):
+        doc = self.docs.pop(doc_id, None)
+        if not doc:
+            return
+        for term in doc['terms']:
+            term_postings = self.postings.get(term)
+            if term_postings is None:
+                continue
+            term_postings.pop(doc_id, None)
+            if not term_postings:
+                del self.postings[term]
+
+    def add_document(self, document):
+        """Index a document, replacing any previous version with the same id"""
+        doc_id = document['id']
+        self.remove_document(doc_id)
+
+        positions = {}
+        offset = 0
+        for field in document['fields']:
+            tokens = tokenize(field)
+            for position, token in enumerate(tokens, start=offset):
+                positions.setdefault(token, []).append(position)
+            offset += len(tokens) + FIELD_GAP
+
+        for term, term_positions in positions.items():
+            self.postings.setdefault(term, {})[doc_id] = term_positions
+
+        self.docs[doc_id] = {
+            "kind": document['kind'],
+            "date": document['date'],
+            "terms": sorted(positions)
+        }
+
+    # Query evaluation -------------------------------------------------
+
+    def _term(self, term):
+        if term.endswith('*') and len(term) > 1:
+            prefix = term[:-1]
+            matched = set()
+            for candidate, term_postings in self.postings.items():
+                if candidate.startswith(prefix):
+                    matched.update(term_postings)
+            return matched
+        return set(self.postings.get(term, ()))
+
+    def _positions(self, term):
+        """doc_id -> positions for a term; a prefix term merges every term it matches"""
+        if not (term.endswith('*') and len(term) > 1):
+            return self.postings.get(term)
+        merged = {}
+        for candidate, term_postings in self.postings.items():
+            if candidate.startswith(term[:-1]):
+                for doc_id, positions in term_postings.items():
+                    merged.setdefault(doc_id, []).extend(positions)
+        return merged or None
+
+    def _phrase(self, terms):
+        if not terms:
+            return set()
+        if len(terms) == 1:
+            return self._term(terms[0])
+
+        # Only the last term can be a prefix ("work-l*")
+        term_postings = [self.postings.get(term) for term in terms[:-1]] + [self._positions(terms[-1])]
+        if any(p is None for p in term_postings):
+            return set()
+
+        candidates = set(term_postings[0])
+        for p in term_postings[1:]:
+            candidates &= p.keys()
+
+        matched = set()
+        for doc_id in candidates:
+            starts = set(term_postings[0][doc_id])
+            for offset, p in enumerate(term_postings[1:], start=1):
+                starts &= {position - offset for position in p[doc_id]}
+                if not starts:
+                    break
+            if starts:
+                matched.add(doc_id)
+        return matched
+
+    def evaluate(self, node):
+        """Evaluate a parsed query tree to a set of doc ids"""
+        op = node[0]
+        if op == 'term':
+            return self._term(node[1])
+        if op == 'phrase':
+            return self._phrase(node[1])
+        if op == 'not':
+            return set(self.docs) - self.evaluate(node[1])
+        if op == 'and':
+            result = self.evaluate(node[1])
+            for child in node[2:]:
+                if not result:
+                    break
+                result &= self.evaluate(child)
+            return result
+        if op == 'or':
+            result = set()
+            for child in node[1:]:
+                result |= self.evaluate(child)
+            return result
+        raise QuerySyntaxError(f"Unknown query node: {op}")
+
+    def score(self, doc_id, terms):
+        """Term-frequency score of a matched document for ranking"""
+        total = 0.0
+        for term in terms:
+            if term.endswith('*'):
+                # Prefix terms only count as a single hit for ranking
+                total += 1.0
+                continue
+            positions = self.postings.get(term, {}).get(doc_id)
+            if positions:
+                total += 1.0 + math.log(len(positions))
+        return total
+
+    def search(self, query_tree, kinds=None):
+        """
+        Run a parsed query
+
+        Returns:
+            List of (doc_id, score) sorted by score then newest first
+        """
+        matched = self.evaluate(query_tree)
+        if kinds:
+            matched = {doc_id for doc_id in matched if self.docs[doc_id]['kind'] in kinds}
+        terms = positive_terms(query_tree)
+        ranked = [(doc_id, self.score(doc_id, terms)) for doc_id in matched]
+        ranked.sort(key=lambda item: (item[1], self.docs[item[0]]['date']), reverse=True)
+        return ranked
+
+
+# Query parsing ---------------------------------------------------------
+
+def parse_query(query):
+    """
+    Parse a query string into a tree of ('and'|'or'|'not'|'term'|'phrase', ...) tuples
+
+    Raises:
+        QuerySyntaxError: If the query is empty or malformed
+    """
+    tokens = QUERY_PATTERN.findall(query or '')
+    if not tokens:
+        raise QuerySyntaxError("Query is empty")
+
+    position = 0
+
+    def peek():
+        return tokens[position] if position < len(tokens) else None
+
+    def advance():
+        nonlocal position
+        position += 1
+        return tokens[position - 1]
+
+    def parse_or():
+        children = [parse_and()]
+        while peek() == 'OR':
+            advance()
+            children.append(parse_and())
+        return children[0] if len(children) == 1 else ('or', *children)
+
+    def parse_and():
+        children = [parse_unary()]
+        while peek() not in (None, ')', 'OR'):
+            if peek() == 'AND':
+                advance()
+            children.append(parse_unary())
+        return children[0] if len(children) == 1 else ('and', *children)
+
+    def parse_unary():
+        token = peek()
+        if token == 'NOT':
+            advance()
+            return ('not', parse_unary())
+        if token and token.startswith('-') and len(token) > 1:
+            advance()
+            tokens.insert(position, token[1:])
+            return ('not', parse_unary())
+        return parse_atom()
+
+    def parse_atom():
+        token = peek()
+        if token is None:
+            raise QuerySyntaxError("Query ends unexpectedly")
+        advance()
+        if token == '(':
+            node = parse_or()
+            if peek() != ')':
+                raise QuerySyntaxError("Missing closing parenthesis")
+            advance()
+            return node
+        if token == ')' or token in ('AND', 'OR'):
+            raise QuerySyntaxError(f"Unexpected '{token}'")
+        if token.startswith('"'):
+            return ('phrase', tokenize(token.strip('"')))
+
+        prefix = token.endswith('*')
+        terms = tokenize(token)
+        if not terms:
+            raise QuerySyntaxError(f"Nothing searchable in '{token}'")
+        if prefix:
+            terms[-1] += '*'
+        return ('term', terms[0]) if len(terms) == 1 else ('phrase', terms)
+
+    tree = parse_or()
+    if peek() is not None:
+        raise QuerySyntaxError(f"Unexpected '{peek()}'")
+    return tree
+
+
+def positive_terms(node):
+    """Terms that contribute to ranking (everything not under a NOT)"""
+    op = node[0]
+    if op == 'term':
+        return [node[1]]
+    if op == 'phrase':
+        return list(node[1])
+    if op == 'not':
+        return []
+    return [term for child in node[1:] for term in positive_terms(child)]
+
+
+# Persistence -------------------------------------------------------------
+
+def _index_path(patient_dir):
+    return os.path.join(derived_dir(patient_dir, 'fulltext'), INDEX_FILENAME)
+
+
+def _delta_path(patient_dir):
+    return os.path.join(derived_dir(patient_dir, 'fulltext'), DELTA_FILENAME)
+
+
+def _file_key(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def _read_base(path, base_key):
+    """Parse index.json (cached by file identity); None when outdated"""
+    with _cache_lock:
+        cached = _base_cache.get(path)
+    if cached and cached[0] == base_key:
+        return cached[1]
+
+    with open(path, 'r') as f:
+        data = json.load(f)
+    if data.get('version') != INDEX_VERSION:
+        return None
+
+    index = InvertedIndex.from_dict(data)
+    with _cache_lock:
+        _base_cache[path] = (base_key, index)
+    return index
+
+
+def _read_delta(path):
+    documents = []
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    documents.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue  # A line cut short by a crash mid-write
+    except FileNotFoundError:
+        pass
+    return documents
+
+
+def _read_index(patient_dir):
+    """Load a patient's index plus its delta segment (cached by file identity); None when missing or outdated"""
+    path = _index_path(patient_dir)
+    delta_path = _delta_path(patient_dir)
+    while True:
+        base_key = _file_key(path)
+        if base_key is None:
+            return None
+        key = (base_key, _file_key(delta_path))
+
+        with _cache_lock:
+            cached = _index_cache.get(path)
+        record_cache('fulltext_index', bool(cached and cached[0] == key))
+        if cached and cached[0] == key:
+            return cached[1]
+
+        base = _read_base(path, base_key)
+        if base is None:
+            return None
+        documents = _read_delta(delta_path)
+        # A merge replaces index.json before truncating the delta, so a changed
+        # base means the delta read above may already be empty: read both again
+        if _file_key(path) != base_key:
+            continue
+
+        index = base
+        if documents:
+            index = _copy_for_update(base)
+            for document in documents:
+                index.add_document(document)
+        with _cache_lock:
+            _index_cache[path] = (key, index)
+        return index
+
+
+def load_index(patient_dir):
+    """
+    Load a patient's index, building it from disk the first time
+
+    The build runs under the patient lock and re-checks once the lock is held,
+    so a read never saves a listing older than a concurrent writer's update.
+    """
+    index = _read_index(patient_dir)
+    if index is None:
+        with patient_lock(patient_dir):
+            index = _read_index(patient_dir)
+            if index is None:
+                index = build_index(patient_dir)
+    return index
+
+
+def save_index(patient_dir, index):
+    """Write the whole index to index.json and empty the delta segment (caller holds the patient lock)"""
+    path = _index_path(patient_dir)
+    delta_path = _delta_path(patient_dir)
+    # Compact encoding: indexes are machine-read and dominate disk use
+    write_json(path, index.to_dict(), indent=None)
+    open(delta_path, 'w').close()
+    base_key = _file_key(path)
+    with _cache_lock:
+        _base_cache[path] = (base_key, index)
+        _index_cache[path] = ((base_key, _file_key(delta_path)), index)
+
+
+def build_index(patient_dir):
+    """Rebuild a patient's index from every entry and summary on disk (caller holds the patient lock)"""
+    index = InvertedIndex()
+    for entry in load_entries(patient_dir):
+        index.add_document(entry_document(entry))
+    for filename in sorted(os.listdir(patient_dir)):
+        if SUMMARY_FILE_PATTERN.match(filename):
+            with open(os.path.join(patient_dir, filename), 'r') as f:
+                index.add_document(summary_document(filename, json.load(f)))
+    save_index(patient_dir, index)
+    return index
+
+
+def _copy_for_update(index):
+    """Shallow-copy so in-flight readers of the cached index never see a half-applied update"""
+    return InvertedIndex(
+        dict(index.docs),
+        {term: dict(term_postings) for term, term_postings in index.postings.items()}
+    )
+
+
+def index_documents(patient_dir, documents):
+    """
+    Add or replace documents in a patient's on-disk index (caller holds the patient lock)
+
+    The documents are appended to the delta segment in one write; once the
+    segment passes MERGE_BYTES the merged index is saved to index.json and the
+    segment emptied. None documents are skipped.
+    """
+    documents = [document for document in documents if document]
+    if not documents:
+        return
+    index = _copy_for_update(load_index(patient_dir))
+    for document in documents:
+        index.add_document(document)
+
+    delta_path = _delta_path(patient_dir)
+    lines = ''.join(json.dumps(document, separators=(',', ':')) + '\n' for document in documents)
+    fd = os.open(delta_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, lines.encode('utf-8'))
+        size = os.fstat(fd).st_size
+    finally:
+        os.close(fd)
+
+    if size >= MERGE_BYTES:
+        save_index(patient_dir, index)
+        return
+    path = _index_path(patient_dir)
+    with _cache_lock:
+        _index_cache[path] = ((_file_key(path), _file_key(delta_path)), index)
+
+
+def _document_text(patient_dir, doc_id):
+    kind, key = doc_id.split(':', 1)
+    if kind == 'entry':
+        path = os.path.join(patient_dir, f'{key}.json')
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                return json.load(f).get('text', '')
+        return ''
+
+    path = os.path.join(patient_dir, f'summary_{key}.json')
+    if not os.path.exists(path):
+        return ''
+    with open(path, 'r') as f:
+        return ' | '.join(summary_document(f'summary_{key}.json', json.load(f))['fields'])
+
+
+def _snippet(text, terms):
+    lowered = text.lower()
+    hits = [lowered.find(term.rstrip('*')) for term in terms]
+    hits = [hit for hit in hits if hit >= 0]
+    start = max(0, min(hits) - SNIPPET_CHARS // 3) if hits else 0
+    excerpt = text[start:start + SNIPPET_CHARS]
+    return ('…' if start > 0 else '') + excerpt + ('…' if start + SNIPPET_CHARS < len(text) else '')
+
+
+def search_caseload(patient_dirs, query, kinds=None, limit=20):
+    """
+    Search one or more patients' indexes
+
+    Args:
+        patient_dirs: Dictionary of patient_id -> patient directory
+        query: Query string (see module docstring for syntax)
+        kinds: Optional iterable restricting results to "entry" and/or "summary"
+        limit: Maximum number of results across all patients
+
+    Returns:
+        Dictionary with total match count and the top results
+
+    Raises:
+        QuerySyntaxError: If the query cannot be parsed
+    """
+    tree = parse_query(query)
+    terms = positive_terms(tree)
+    kinds = set(kinds) if kinds else None
+
+    matches = []
+    for patient_id, patient_dir in patient_dirs.items():
+        index = load_index(patient_dir)
+        for doc_id, score in index.search(tree, kinds):
+            matches.append((score, index.docs[doc_id]['date'], patient_id, doc_id, index.docs[doc_id]['kind']))
+
+    matches.sort(reverse=True)
+    results = []
+    for score, date, patient_id, doc_id, kind in matches[:limit]:
+        results.append({
+            "patient_id": patient_id,
+            "doc_id": doc_id,
+            "kind": kind,
+            "date": date,
+            "score": round(score, 3),
+            "snippet": _snippet(_document_text(patient_dirs[patient_id], doc_id), terms)
+        })
+
+    return {"query": query, "total": len(matches), "results": results}
@@ -2,16 +2,18 @@
 Google Doc Converter Utility
 
 Converts Google Docs journal entries into structured JSON format
+
+The Google client libraries are imported inside get_google_docs_service, so
+plain-text entries (and every other route) never load them.
 """
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
 import os
 import pickle
 import re
+import time
 from datetime import datetime
 
+from utils.metrics import GOOGLE_DOC_FETCH_SECONDS
+
 # Scopes required for reading Google Docs
 SCOPES = ['https://www.googleapis.com/auth/documents.readonly']
 
@@ -21,6 +23,10 @@ def get_google_docs_service():
 
     For MVP, this uses OAuth flow. In production, use service accounts.
     """
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    from google.auth.transport.requests import Request
+    from googleapiclient.discovery import build
+
     creds = None
 
     # Token file stores the user's access and refresh tokens
@@ -132,7 +138,13 @@ def convert_google_doc_to_json(doc_url, entry_date=None):
         service = get_google_docs_service()
 
         # Retrieve the document
-        document = service.documents().get(documentId=doc_id).execute()
+        started = time.perf_counter()
+        try:
+            document = service.documents().get(documentId=doc_id).execute()
+        except Exception:
+            GOOGLE_DOC_FETCH_SECONDS.labels(outcome='error').observe(time.perf_counter() - started)
+            raise
+        GOOGLE_DOC_FETCH_SECONDS.labels(outcome='ok').observe(time.perf_counter() - started)
 
         # Parse content
         parsed = parse_doc_content(document.get('body', {}).get('content', []))
@@ -0,0 +1,69 @@
+"""
+Derived Index Maintenance
+
+Single place the write paths (Flask routes and batch scripts) call after
+persisting entries, so every derived index stays current without each caller
+knowing which indexes exist. Index failures are logged and never fail the write
+itself; indexes can always be rebuilt from the files on disk.
+"""
+import logging
+
+from utils import cohort_archive, fulltext_index, semantic_search, sentiment_series, topic_trends
+
+logger = logging.getLogger(__name__)
+
+
+def on_entries_written(patient_dir, entries):
+    """
+    Refresh derived indexes after daily entries were saved
+
+    Args:
+        patient_dir: Patient data directory the entries were written to
+        entries: The saved entry dictionaries
+    """
+    try:
+        semantic_search.update_index(patient_dir, entries)
+    except Exception:
+        logger.exception("Failed to update search index for %s", patient_dir)
+
+    try:
+        fulltext_index.index_documents(patient_dir, [fulltext_index.entry_document(entry) for entry in entries])
+    except Exception:
+        logger.exception("Failed to update full-text index for %s", patient_dir)
+
+    try:
+        sentiment_series.record_entries(patient_dir, entries)
+    except Exception:
+        logger.exception("Failed to update sentiment series for %s", patient_dir)
+
+
+def on_summary_written(patient_dir, filename, summary, patient_id, base_data_dir):
+    """
+    Refresh derived indexes after a weekly summary was saved
+
+    Args:
+        patient_dir: Patient data directory the summary was written to
+        filename: Summary filename (summary_<start>_to_<end>.json)
+        summary: The saved analysis dictionary
+        patient_id: Patient the summary belongs to
+        base_data_dir: Data directory holding the cohort archive
+    """
+    try:
+        fulltext_index.index_documents(patient_dir, [fulltext_index.summary_document(filename, summary)])
+    except Exception:
+        logger.exception("Failed to update full-text index for %s", patient_dir)
+
+    try:
+        topic_trends.record_summary_topics(patient_dir, filename, summary)
+    except Exception:
+        logger.exception("Failed to update topic trends for %s", patient_dir)
+
+    try:
+        sentiment_series.record_week(patient_dir, filename, summary)
+    except Exception:
+        logger.exception("Failed to update sentiment series for %s", patient_dir)
+
+    try:
+        cohort_archive.record_summary(base_data_dir, patient_id, filename, summary)
+    except Exception:
+        logger.exception("Failed to update cohort archive for %s", patient_dir)
@@ -0,0 +1,60 @@
+"""
+OpenAI Client Factory
+
+One place that builds the OpenAI clients the analyzers use, so the sync
+(Flask) and async (ASGI) serving modes share configuration. Clients are
+reused so HTTP connections are kept alive between analyses. Retries are
+disabled in the SDK because utils/llm_scheduler.py owns retry policy.
+
+The SDK also reads OPENAI_BASE_URL, which points the app at a mock server
+for load tests.
+
+The openai package is imported on first use rather than at module load: it
+accounts for about half of the app's import time, and a worker that only
+serves reads should not pay for it on a cold start.
+"""
+import asyncio
+import os
+import threading
+
+_client = None
+_client_lock = threading.Lock()
+_async_clients = {}
+
+
+def _api_key():
+    api_key = os.getenv('OPENAI_API_KEY')
+    if not api_key:
+        raise Exception("OPENAI_API_KEY not found in environment variables")
+    return api_key
+
+
+def get_client():
+    """Process-wide synchronous OpenAI client"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from openai import OpenAI
+                _client = OpenAI(api_key=_api_key(), max_retries=0)
+    return _client
+
+
+def get_async_client():
+    """
+    AsyncOpenAI client for the running event loop
+
+    The underlying HTTP connection pool is bound to the loop it was first used
+    on, so each loop (normally one per ASGI worker) gets its own client.
+    """
+    from openai import AsyncOpenAI
+
+    loop = asyncio.get_running_loop()
+    with _client_lock:
+        client = _async_clients.get(loop)
+        if client is None:
+            # Drop clients whose loops have been closed (e.g. finished asyncio.run calls)
+            for stale in [key for key in _async_clients if key.is_closed()]:
+                del _async_clients[stale]
+            client = _async_clients[loop] = AsyncOpenAI(api_key=_api_key(), max_retries=0)
+    return client
@@ -0,0 +1,359 @@
+"""
+LLM Request Scheduler
+
+Shared rate limiting and retry layer for OpenAI calls. Every analyzer routes
+its requests through one scheduler per process so that requests-per-minute and
+tokens-per-minute budgets are respected, transient failures (429s, 5xx,
+connection resets) are retried with jittered exponential backoff, and the time
+callers spend waiting for budget is observable.
+
+Budgets are per process. Under gunicorn each worker has its own scheduler, so
+set LLM_REQUESTS_PER_MINUTE / LLM_TOKENS_PER_MINUTE to the account limit
+divided by the number of workers.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from utils.metrics import LLM_IN_FLIGHT, LLM_QUEUE_DEPTH
+
+DEFAULT_REQUESTS_PER_MINUTE = 500
+DEFAULT_TOKENS_PER_MINUTE = 30000
+DEFAULT_MAX_RETRIES = 5
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits and server errors
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+# OpenAI SDK exception names that carry no status code but are transient
+RETRYABLE_EXCEPTION_NAMES = {'APIConnectionError', 'APITimeoutError'}
+
+
+def estimate_tokens(text):
+    """
+    Cheap token estimate for budgeting (roughly 4 characters per token)
+
+    Args:
+        text: Prompt or completion text
+
+    Returns:
+        Estimated token count (at least 1)
+    """
+    return max(1, len(text or '') // 4)
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `rate_per_minute`"""
+
+    def __init__(self, rate_per_minute):
+        self.capacity = float(rate_per_minute)
+        self.refill_per_second = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self.updated_at
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_per_second)
+        self.updated_at = now
+
+    def reserve(self, amount):
+        """
+        Reserve tokens and return how long the caller must wait before using them
+
+        Reservations may drive the bucket negative; later callers then queue
+        behind earlier ones in arrival order.
+
+        Args:
+            amount: Tokens to take (capped at the bucket capacity)
+
+        Returns:
+            Seconds to wait before the reservation is covered
+        """
+        amount = min(float(amount), self.capacity)
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.refill_per_second
+
+    def adjust(self, delta):
+        """Return (positive delta) or charge (negative delta) tokens without waiting"""
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.capacity, self.tokens + delta)
+
+    def available(self):
+        """Tokens currently available"""
+        with self.lock:
+            self._refill(time.monotonic())
+            return self.tokens
+
+
+def get_retry_after(exc):
+    """
+    Extract a Retry-After delay (seconds) from an API exception, if present
+
+    Supports `retry-after-ms`, numeric `retry-after` and HTTP-date values.
+    """
+    response = getattr(exc, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get('retry-after-ms')
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000.0
+        except ValueError:
+            pass
+
+    retry_after = headers.get('retry-after')
+    if not retry_after:
+        return None
+
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def is_retryable(exc):
+    """Decide whether an exception from the LLM client is transient"""
+    # A 429 for an exhausted quota will not clear up by waiting
+    if getattr(exc, 'code', None) == 'insufficient_quota':
+        return False
+
+    status_code = getattr(exc, 'status_code', None)
+    if status_code in RETRYABLE_STATUS_CODES:
+        return True
+
+    return type(exc).__name__ in RETRYABLE_EXCEPTION_NAMES
+
+
+class LLMScheduler:
+    """
+    Rate-limit-aware executor for LLM calls
+
+    Usage:
+        scheduler = get_scheduler()
+        response = scheduler.execute(
+            lambda: client.chat.completions.create(...),
+            estimated_tokens=estimate_tokens(prompt) + 1500
+        )
+    """
+
+    def __init__(self, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+                 tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE,
+                 max_retries=DEFAULT_MAX_RETRIES, base_delay=1.0, max_delay=60.0,
+                 sleep=time.sleep):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+
+        # Set when the API tells us to back off so every caller pauses, not just the one that hit it
+        self.blocked_until = 0.0
+
+        self.lock = threading.Lock()
+        self.queue_depth = 0
+        self.in_flight = 0
+        self.requests_total = 0
+        self.retries_total = 0
+        self.failures_total = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def _reserve(self, estimated_tokens):
+        """Reserve budget for one request; returns seconds to wait before sending"""
+        return max(
+            self.request_bucket.reserve(1),
+            self.token_bucket.reserve(estimated_tokens),
+            self.blocked_until - time.monotonic()
+        )
+
+    def _acquire(self, estimated_tokens):
+        """Block until both budgets cover the request; returns seconds waited"""
+        wait = self._reserve(estimated_tokens)
+        if wait <= 0:
+            return 0.0
+
+        with self.lock:
+            self.queue_depth += 1
+        LLM_QUEUE_DEPTH.inc()
+        try:
+            self.sleep(wait)
+        finally:
+            LLM_QUEUE_DEPTH.dec()
+            with self.lock:
+                self.queue_depth -= 1
+        return wait
+
+    async def _acquire_async(self, estimated_tokens):
+        """Async _acquire: waits without blocking the event loop"""
+        wait = self._reserve(estimated_tokens)
+        if wait <= 0:
+            return 0.0
+
+        with self.lock:
+            self.queue_depth += 1
+        LLM_QUEUE_DEPTH.inc()
+        try:
+            await asyncio.sleep(wait)
+        finally:
+            LLM_QUEUE_DEPTH.dec()
+            with self.lock:
+                self.queue_depth -= 1
+        return wait
+
+    def _backoff_delay(self, attempt, exc):
+        """Full-jitter exponential backoff, never shorter than Retry-After"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        retry_after = get_retry_after(exc)
+        if retry_after is not None:
+            delay = max(delay, retry_after + random.uniform(0, self.base_delay))
+            with self.lock:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+        return delay
+
+    def _settle(self, estimated_tokens, response):
+        """Correct the token budget once the real usage is known"""
+        usage = getattr(response, 'usage', None)
+        total_tokens = getattr(usage, 'total_tokens', None)
+        if total_tokens:
+            self.token_bucket.adjust(estimated_tokens - total_tokens)
+
+    def _start_attempt(self, waited):
+        with self.lock:
+            self.requests_total += 1
+            self.in_flight += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+        LLM_IN_FLIGHT.inc()
+
+    def _failed_attempt(self, attempt, exc):
+        """Record a failed attempt; returns the retry delay, or None to give up"""
+        LLM_IN_FLIGHT.dec()
+        with self.lock:
+            self.in_flight -= 1
+        if attempt >= self.max_retries or not is_retryable(exc):
+            with self.lock:
+                self.failures_total += 1
+            return None
+
+        delay = self._backoff_delay(attempt, exc)
+        with self.lock:
+            self.retries_total += 1
+        return delay
+
+    def _finished_attempt(self, estimated_tokens, response):
+        LLM_IN_FLIGHT.dec()
+        with self.lock:
+            self.in_flight -= 1
+        self._settle(estimated_tokens, response)
+
+    def execute(self, call, estimated_tokens=0):
+        """
+        Run `call` within the rate budgets, retrying transient failures
+
+        Args:
+            call: Zero-argument callable performing the API request
+            estimated_tokens: Prompt + expected completion tokens for budgeting
+
+        Returns:
+            Whatever `call` returns
+
+        Raises:
+            The last exception once retries are exhausted or the error is not transient
+        """
+        attempt = 0
+        while True:
+            self._start_attempt(self._acquire(estimated_tokens))
+            try:
+                response = call()
+            except Exception as exc:
+                delay = self._failed_attempt(attempt, exc)
+                if delay is None:
+                    raise
+                attempt += 1
+                self.sleep(delay)
+                continue
+
+            self._finished_attempt(estimated_tokens, response)
+            return response
+
+    async def execute_async(self, call, estimated_tokens=0):
+        """
+        Async execute: `call` returns an awaitable (e.g. an AsyncOpenAI request)
+
+        Shares budgets and counters with execute(), so sync and async callers in
+        one process are limited together.
+        """
+        attempt = 0
+        while True:
+            self._start_attempt(await self._acquire_async(estimated_tokens))
+            try:
+                response = await call()
+            except Exception as exc:
+                delay = self._failed_attempt(attempt, exc)
+                if delay is None:
+                    raise
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+
+            self._finished_attempt(estimated_tokens, response)
+            return response
+
+    def metrics(self):
+        """Snapshot of scheduler state for health/metrics endpoints and scripts"""
+        with self.lock:
+            requests_total = self.requests_total
+            return {
+                "queue_depth": self.queue_depth,
+                "in_flight": self.in_flight,
+                "requests_total": requests_total,
+                "retries_total": self.retries_total,
+                "failures_total": self.failures_total,
+                "wait_seconds_total": round(self.wait_seconds_total, 3),
+                "wait_seconds_max": round(self.wait_seconds_max, 3),
+                "wait_seconds_avg": round(self.wait_seconds_total / requests_total, 3) if requests_total else 0.0,
+                "requests_per_minute_limit": self.requests_per_minute,
+                "tokens_per_minute_limit": self.tokens_per_minute,
+                "requests_available": round(self.request_bucket.available(), 1),
+                "tokens_available": round(self.token_bucket.available(), 1)
+            }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Return the process-wide scheduler, configured from environment variables"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = LLMScheduler(
+                    requests_per_minute=int(os.getenv('LLM_REQUESTS_PER_MINUTE', DEFAULT_REQUESTS_PER_MINUTE)),
+                    tokens_per_minute=int(os.getenv('LLM_TOKENS_PER_MINUTE', DEFAULT_TOKENS_PER_MINUTE)),
+                    max_retries=int(os.getenv('LLM_MAX_RETRIES', DEFAULT_MAX_RETRIES))
+                )
+    return _scheduler
@@ -5,8 +5,18 @@ Analyzes patterns across multiple weeks, months, or years of journal entries
 """
 import os
 import json
+import asyncio
+import time
 from datetime import datetime, timedelta
-from openai import OpenAI
+
+from utils.llm_client import get_async_client, get_client
+from utils.llm_scheduler import get_scheduler, estimate_tokens
+from utils.metrics import observe_llm_call
+from utils.timing import span, timed
+from utils.usage import record_usage
+
+# Expected completion size for a long-term analysis, used for token budgeting
+COMPLETION_TOKEN_ESTIMATE = 2000
 
 def get_all_entries_in_range(start_date, end_date, data_dir):
     """
@@ -39,6 +49,7 @@ def get_all_entries_in_range(start_date, end_date, data_dir):
 
     return all_entries
 
+@timed('read_summaries')
 def get_weekly_summaries_in_range(start_date, end_date, data_dir):
     """
     Collect all weekly summary files in a date range
@@ -81,31 +92,21 @@ def get_weekly_summaries_in_range(start_date, end_date, data_dir):
 
     return summaries
 
-def analyze_long_term_trends(start_date, end_date, data_dir, model="gpt-4o"):
-    """
-    Analyze trends across a longer time period (month/year)
+NO_SUMMARIES_ERROR = "No weekly summaries found in the specified range"
 
-    This function:
-    1. Collects all weekly summaries in the range
-    2. Uses GPT to identify meta-patterns across weeks
-    3. Tracks progression/regression of issues
-    4. Identifies long-term themes
-
-    Args:
-        start_date: Start date (YYYY-MM-DD)
-        end_date: End date (YYYY-MM-DD)
-        data_dir: Path to data directory
-        model: OpenAI model to use
+def build_long_term_prompt(start_date, end_date, data_dir):
+    """
+    Build the long-term analysis prompt for a date range
 
     Returns:
-        Dictionary with long-term analysis
+        Tuple (prompt, None), or (None, error dict) when there is nothing to analyze
     """
     # Get all weekly summaries
     weekly_summaries = get_weekly_summaries_in_range(start_date, end_date, data_dir)
 
     if not weekly_summaries:
-        return {
-            "error": "No weekly summaries found in the specified range",
+        return None, {
+            "error": NO_SUMMARIES_ERROR,
             "start_date": start_date,
             "end_date": end_date
         }
@@ -176,30 +177,71 @@ Return your analysis in JSON format:
 Weekly Summaries:
 {summaries_text}
 """
+    return prompt, None
+
+def _completion_args(prompt, model):
+    return {
+        "model": model,
+        "messages": [
+            {
+                "role": "system",
+                "content": "You are an expert clinical psychologist analyzing long-term patient journal patterns."
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ],
+        "temperature": 0.3,
+        "response_format": {"type": "json_object"}
+    }
 
-    # Call OpenAI API
-    api_key = os.getenv('OPENAI_API_KEY')
-    if not api_key:
-        raise Exception("OPENAI_API_KEY not found in environment variables")
+def _patient_of(data_dir):
+    return os.path.basename(os.path.normpath(data_dir))
 
-    client = OpenAI(api_key=api_key)
+def _failed(exception, start_date, end_date):
+    return {
+        "error": "Long-term analysis failed",
+        "exception": str(exception),
+        "period": f"{start_date} to {end_date}"
+    }
 
+def analyze_long_term_trends(start_date, end_date, data_dir, model="gpt-4o"):
+    """
+    Analyze trends across a longer time period (month/year)
+
+    This function:
+    1. Collects all weekly summaries in the range
+    2. Uses GPT to identify meta-patterns across weeks
+    3. Tracks progression/regression of issues
+    4. Identifies long-term themes
+
+    Args:
+        start_date: Start date (YYYY-MM-DD)
+        end_date: End date (YYYY-MM-DD)
+        data_dir: Path to data directory
+        model: OpenAI model to use
+
+    Returns:
+        Dictionary with long-term analysis
+    """
+    prompt, error = build_long_term_prompt(start_date, end_date, data_dir)
+    if error:
+        return error
+
+    # Call OpenAI API through the shared scheduler (it owns retries)
+    client = get_client()
+
+    started = time.perf_counter()
+    response = None
     try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an expert clinical psychologist analyzing long-term patient journal patterns."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            temperature=0.3,
-            response_format={"type": "json_object"}
-        )
+        with span('llm'):
+            response = get_scheduler().execute(
+                lambda: client.chat.completions.create(**_completion_args(prompt, model)),
+                estimated_tokens=estimate_tokens(prompt) + COMPLETION_TOKEN_ESTIMATE
+            )
+        observe_llm_call('long_term', model, started, response)
+        record_usage('long_term', model, started, response, patient_id=_patient_of(data_dir))
 
         analysis = json.loads(response.choices[0].message.content)
         analysis['analysis_date'] = datetime.now().strftime('%Y-%m-%d')
@@ -207,11 +249,40 @@ Weekly Summaries:
         return analysis
 
     except Exception as e:
-        return {
-            "error": "Long-term analysis failed",
-            "exception": str(e),
-            "period": f"{start_date} to {end_date}"
-        }
+        if response is None:
+            observe_llm_call('long_term', model, started, outcome='error')
+            record_usage('long_term', model, started, outcome='error', patient_id=_patient_of(data_dir))
+        return _failed(e, start_date, end_date)
+
+async def analyze_long_term_trends_async(start_date, end_date, data_dir, model="gpt-4o"):
+    """Async analyze_long_term_trends using the AsyncOpenAI client"""
+    prompt, error = build_long_term_prompt(start_date, end_date, data_dir)
+    if error:
+        return error
+
+    client = get_async_client()
+
+    started = time.perf_counter()
+    response = None
+    try:
+        with span('llm'):
+            response = await get_scheduler().execute_async(
+                lambda: client.chat.completions.create(**_completion_args(prompt, model)),
+                estimated_tokens=estimate_tokens(prompt) + COMPLETION_TOKEN_ESTIMATE
+            )
+        observe_llm_call('long_term', model, started, response)
+        record_usage('long_term', model, started, response, patient_id=_patient_of(data_dir))
+
+        analysis = json.loads(response.choices[0].message.content)
+        analysis['analysis_date'] = datetime.now().strftime('%Y-%m-%d')
+
+        return analysis
+
+    except Exception as e:
+        if response is None:
+            observe_llm_call('long_term', model, started, outcome='error')
+            record_usage('long_term', model, started, outcome='error', patient_id=_patient_of(data_dir))
+        return _failed(e, start_date, end_date)
 
 def format_weekly_summaries(summaries):
     """Format weekly summaries into text for GPT analysis"""
@@ -259,6 +330,18 @@ def compare_time_periods(period1_start, period1_end, period2_start, period2_end,
     period1_analysis = analyze_long_term_trends(period1_start, period1_end, data_dir, model)
     period2_analysis = analyze_long_term_trends(period2_start, period2_end, data_dir, model)
 
+    return _comparison(period1_start, period1_end, period1_analysis, period2_start, period2_end, period2_analysis)
+
+async def compare_time_periods_async(period1_start, period1_end, period2_start, period2_end, data_dir, model="gpt-4o"):
+    """Async compare_time_periods; both periods are analyzed concurrently"""
+    period1_analysis, period2_analysis = await asyncio.gather(
+        analyze_long_term_trends_async(period1_start, period1_end, data_dir, model),
+        analyze_long_term_trends_async(period2_start, period2_end, data_dir, model)
+    )
+
+    return _comparison(period1_start, period1_end, period1_analysis, period2_start, period2_end, period2_analysis)
+
+def _comparison(period1_start, period1_end, period1_analysis, period2_start, period2_end, period2_analysis):
     return {
         "period_1": {
             "range": f"{period1_start} to {period1_end}",
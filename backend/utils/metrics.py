@@ -0,0 +1,117 @@
+"""
+Prometheus Metrics
+
+Metric definitions shared by the routes and the LLM layer, exposed at
+/metrics in the Prometheus text format.
+
+Under gunicorn every worker is a separate process, so per-process registries
+would each report a fraction of the traffic. When PROMETHEUS_MULTIPROC_DIR is
+set (gunicorn.conf.py sets it), prometheus_client writes samples to files in
+that directory and render_metrics() merges them, so a scrape of any worker
+sees the whole server. gunicorn.conf.py clears the directory on start and
+marks exited workers dead.
+
+Cache hit ratio for a cache, as a PromQL query:
+
+    sum by (cache) (rate(cache_requests_total{result="hit"}[5m]))
+      / sum by (cache) (rate(cache_requests_total[5m]))
+"""
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+    multiprocess,
+)
+
+LLM_LATENCY_BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+FETCH_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds',
+    'API request latency by route',
+    ['method', 'route', 'status']
+)
+LLM_REQUEST_SECONDS = Histogram(
+    'llm_request_duration_seconds',
+    'LLM call latency (including scheduler waits and retries)',
+    ['model', 'analyzer', 'outcome'],
+    buckets=LLM_LATENCY_BUCKETS
+)
+LLM_TOKENS = Histogram(
+    'llm_tokens',
+    'Tokens per LLM call as reported by the API',
+    ['model', 'analyzer', 'kind'],
+    buckets=TOKEN_BUCKETS
+)
+GOOGLE_DOC_FETCH_SECONDS = Histogram(
+    'google_doc_fetch_duration_seconds',
+    'Google Docs API document fetch latency',
+    ['outcome'],
+    buckets=FETCH_BUCKETS
+)
+CACHE_REQUESTS = Counter(
+    'cache_requests',
+    'Cache lookups by cache and result (hit/miss)',
+    ['cache', 'result']
+)
+LLM_QUEUE_DEPTH = Gauge(
+    'llm_scheduler_queue_depth',
+    'Callers waiting for LLM rate budget',
+    multiprocess_mode='livesum'
+)
+LLM_IN_FLIGHT = Gauge(
+    'llm_scheduler_in_flight',
+    'LLM requests currently being sent',
+    multiprocess_mode='livesum'
+)
+
+
+def multiprocess_enabled():
+    return bool(os.getenv('PROMETHEUS_MULTIPROC_DIR'))
+
+
+def record_cache(cache, hit):
+    CACHE_REQUESTS.labels(cache=cache, result='hit' if hit else 'miss').inc()
+
+
+def observe_request(method, route, status, seconds):
+    HTTP_REQUEST_SECONDS.labels(method=method, route=route, status=str(status)).observe(seconds)
+
+
+def observe_llm_call(analyzer, model, started, response=None, outcome='ok'):
+    """
+    Record one LLM call
+
+    Args:
+        analyzer: Calling analyzer ("weekly", "long_term")
+        model: Model name
+        started: time.perf_counter() value taken before the call
+        response: Chat completion response (for token usage), if any
+        outcome: "ok" or "error"
+    """
+    LLM_REQUEST_SECONDS.labels(model=model, analyzer=analyzer, outcome=outcome).observe(
+        time.perf_counter() - started)
+
+    usage = getattr(response, 'usage', None)
+    for kind in ('prompt', 'completion'):
+        tokens = getattr(usage, f"{kind}_tokens", None)
+        if isinstance(tokens, int):
+            LLM_TOKENS.labels(model=model, analyzer=analyzer, kind=kind).observe(tokens)
+
+
+def render_metrics():
+    """Returns (body, content type) for the /metrics endpoint"""
+    if multiprocess_enabled():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
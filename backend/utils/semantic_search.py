@@ -0,0 +1,389 @@
+"""
+Local Semantic Search over Journal Entries
+
+Builds a per-patient vector index from entry text so therapists can ask
+questions like "when did she last mention her mother?" without reading every
+daily file. Embeddings are computed locally with a signed feature-hashing
+embedder (word stems, bigrams and a small concept map so "mom" finds "mother"),
+stored once per entry in a compact float16 NumPy matrix, and reused until the
+entry text changes. Queries are a brute-force dot product over the matrix.
+
+Index layout: data/<patient_id>/.derived/search/index.npz
+"""
+import hashlib
+import math
+import os
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from functools import lru_cache
+
+import numpy as np
+
+from utils.metrics import record_cache
+from utils.storage import atomic_write, derived_dir, list_entry_files, load_entries, patient_lock
+
+# Bump when features or dimensions change; stale indexes are rebuilt on load
+EMBEDDER_VERSION = 1
+EMBEDDING_DIM = 512
+
+INDEX_FILENAME = 'index.npz'
+
+TOKEN_PATTERN = re.compile(r"[a-z]+(?:'[a-z]+)?")
+
+STOPWORDS = {
+    'a', 'about', 'after', 'again', 'all', 'am', 'an', 'and', 'any', 'are', 'as', 'at',
+    'be', 'because', 'been', 'before', 'being', 'but', 'by', 'can', 'could', 'did', 'do',
+    'does', 'doing', 'for', 'from', 'had', 'has', 'have', 'he', 'her', 'here', 'hers',
+    'him', 'his', 'how', 'i', "i'm", "i've", 'if', 'in', 'into', 'is', 'it', "it's", 'its',
+    'just', 'last', 'me', 'mention', 'mentioned', 'more', 'my', 'myself', 'of', 'on', 'or',
+    'our', 'out', 'she', 'so', 'some', 'than', 'that', 'the', 'their', 'them', 'then',
+    'there', 'they', 'this', 'to', 'too', 'up', 'was', 'we', 'were', 'what', 'when',
+    'where', 'which', 'while', 'who', 'why', 'will', 'with', 'would', 'you', 'your'
+}
+
+# Surface words -> shared concept feature, so related wording lands nearby
+CONCEPTS = {
+    'mother': ('mom', 'mum', 'mommy', 'mother', 'mothers', "mom's", "mother's"),
+    'father': ('dad', 'daddy', 'father', 'fathers', "dad's", "father's"),
+    'partner': ('partner', 'wife', 'husband', 'boyfriend', 'girlfriend', 'spouse', 'fiance', 'fiancee'),
+    'sibling': ('sister', 'brother', 'sisters', 'brothers', 'sibling', 'siblings'),
+    'child': ('son', 'daughter', 'kid', 'kids', 'child', 'children', 'baby'),
+    'friend': ('friend', 'friends', 'friendship', 'buddy'),
+    'work': ('work', 'job', 'boss', 'manager', 'office', 'coworker', 'coworkers', 'colleague',
+             'colleagues', 'meeting', 'presentation', 'deadline', 'career', 'project'),
+    'therapy': ('therapy', 'therapist', 'session', 'counselor', 'homework'),
+    'sleep': ('sleep', 'slept', 'insomnia', 'bed', 'tired', 'exhausted', 'nightmare', 'nightmares'),
+    'anxiety': ('anxious', 'anxiety', 'panic', 'nervous', 'worried', 'worry', 'overwhelmed', 'dread'),
+    'sadness': ('sad', 'cried', 'crying', 'tears', 'depressed', 'lonely', 'empty', 'hopeless'),
+    'grief': ('grief', 'grieving', 'died', 'death', 'funeral', 'passed', 'loss', 'widow', 'widower'),
+    'anger': ('angry', 'mad', 'furious', 'frustrated', 'resentful', 'annoyed'),
+    'health': ('doctor', 'sick', 'pain', 'hospital', 'medication', 'meds', 'headache'),
+    'exercise': ('gym', 'run', 'ran', 'walk', 'walked', 'yoga', 'exercise', 'workout'),
+}
+_CONCEPT_LOOKUP = {word: concept for concept, words in CONCEPTS.items() for word in words}
+
+# Feature weights
+WORD_WEIGHT = 1.0
+CONCEPT_WEIGHT = 1.5
+BIGRAM_WEIGHT = 0.5
+
+# Matches below this cosine similarity are usually hash collisions, not meaning
+MIN_SCORE = 0.05
+
+SORT_ORDERS = ('relevance', 'recent')
+
+SNIPPET_CHARS = 160
+
+_cache_lock = threading.Lock()
+_index_cache = {}
+
+
+def _stem(token):
+    """Very light suffix stripping so 'crying'/'cried'/'cries' share a feature"""
+    for suffix in ('ing', 'ied', 'ies', 'ed', 'es', 's'):
+        if len(token) > len(suffix) + 3 and token.endswith(suffix):
+            return token[:-len(suffix)]
+    return token
+
+
+def _features(text):
+    tokens = [t for t in TOKEN_PATTERN.findall((text or '').lower().replace('’', "'")) if t not in STOPWORDS]
+    features = Counter()
+    stems = []
+    for token in tokens:
+        stem = _stem(token)
+        stems.append(stem)
+        features['w:' + stem] += WORD_WEIGHT
+        concept = _CONCEPT_LOOKUP.get(token)
+        if concept:
+            features['c:' + concept] += CONCEPT_WEIGHT
+    for first, second in zip(stems, stems[1:]):
+        features['b:' + first + '_' + second] += BIGRAM_WEIGHT
+    return features
+
+
+def _hash_feature(feature):
+    digest = zlib.crc32(feature.encode('utf-8'))
+    return digest % EMBEDDING_DIM, (1.0 if digest & 0x80000000 else -1.0)
+
+
+def embed_texts(texts):
+    """
+    Embed texts into L2-normalized hashed feature vectors
+
+    Args:
+        texts: List of strings
+
+    Returns:
+        float32 array of shape (len(texts), EMBEDDING_DIM)
+    """
+    matrix = np.zeros((len(texts), EMBEDDING_DIM), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for feature, weight in _features(text).items():
+            column, sign = _hash_feature(feature)
+            # Sublinear term frequency keeps one repeated word from dominating
+            matrix[row, column] += sign * (1.0 + math.log(weight)) if weight >= 1 else sign * weight
+
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+@lru_cache(maxsize=512)
+def _embed_query(query):
+    return embed_texts([query])[0]
+
+
+def _text_hash(text):
+    """64-bit content hash used to decide whether an entry needs re-embedding"""
+    return np.uint64(int.from_bytes(hashlib.sha1((text or '').encode('utf-8')).digest()[:8], 'little'))
+
+
+def _index_path(patient_dir):
+    return os.path.join(derived_dir(patient_dir, 'search'), INDEX_FILENAME)
+
+
+def _save_index(patient_dir, dates, hashes, vectors):
+    path = _index_path(patient_dir)
+    with atomic_write(path, 'wb') as f:
+        np.savez(
+            f,
+            version=np.array([EMBEDDER_VERSION, EMBEDDING_DIM], dtype=np.int32),
+            dates=np.array(dates, dtype='<U10'),
+            hashes=np.array(hashes, dtype=np.uint64),
+            vectors=vectors.astype(np.float16)
+        )
+
+
+def _read_index(patient_dir):
+    """Load an index from disk; returns None when missing or built by another embedder version"""
+    path = _index_path(patient_dir)
+    if not os.path.exists(path):
+        return None
+
+    mtime = os.stat(path).st_mtime_ns
+    with _cache_lock:
+        cached = _index_cache.get(path)
+    record_cache('semantic_index', bool(cached and cached['mtime'] == mtime))
+    if cached and cached['mtime'] == mtime:
+        return cached
+
+    with np.load(path) as stored:
+        version = stored['version'].tolist()
+        if version != [EMBEDDER_VERSION, EMBEDDING_DIM]:
+            return None
+        index = {
+            "mtime": mtime,
+            "dates": stored['dates'].tolist(),
+            "hashes": stored['hashes'],
+            # Queries run against float32; the float16 copy is only for storage
+            "vectors": stored['vectors'].astype(np.float32)
+        }
+
+    with _cache_lock:
+        _index_cache[path] = index
+    return index
+
+
+def update_index(patient_dir, entries):
+    """
+    Incrementally add or refresh entries in a patient's index
+
+    Entries whose text is unchanged keep their stored embedding; only new or
+    edited entries are embedded.
+
+    Args:
+        patient_dir: Patient data directory
+        entries: Entry dictionaries with "date" and "text" fields
+
+    Returns:
+        Number of entries (re-)embedded
+    """
+    index = _read_index(patient_dir)
+    if index is None:
+        return build_index(patient_dir)
+
+    rows = {date: i for i, date in enumerate(index['dates'])}
+    dates = list(index['dates'])
+    hashes = index['hashes'].tolist()
+    vectors = index['vectors'].copy()
+
+    changed = []
+    for entry in entries:
+        entry_hash = int(_text_hash(entry.get('text', '')))
+        row = rows.get(entry['date'])
+        if row is not None and hashes[row] == entry_hash:
+            continue
+        changed.append((entry, entry_hash))
+
+    if not changed:
+        return 0
+
+    new_vectors = embed_texts([entry.get('text', '') for entry, _ in changed])
+    appended = []
+    for (entry, entry_hash), vector in zip(changed, new_vectors):
+        row = rows.get(entry['date'])
+        if row is None:
+            rows[entry['date']] = len(dates) + len(appended)
+            appended.append(vector)
+            dates.append(entry['date'])
+            hashes.append(entry_hash)
+        else:
+            vectors[row] = vector
+            hashes[row] = entry_hash
+
+    if appended:
+        vectors = np.vstack([vectors, np.array(appended, dtype=np.float32)])
+
+    order = sorted(range(len(dates)), key=dates.__getitem__)
+    _save_index(patient_dir, [dates[i] for i in order], [hashes[i] for i in order], vectors[order])
+    return len(changed)
+
+
+def prune_index(patient_dir, dates):
+    """
+    Drop index rows for entries whose files no longer exist
+
+    Args:
+        patient_dir: Patient data directory
+        dates: Candidate entry dates (YYYY-MM-DD); rows are only dropped if the file is gone
+
+    Returns:
+        Number of rows removed
+    """
+    with patient_lock(patient_dir):
+        index = _read_index(patient_dir)
+        if index is None:
+            return 0
+        gone = {date for date in dates if not os.path.exists(os.path.join(patient_dir, f"{date}.json"))}
+        keep = [i for i, date in enumerate(index['dates']) if date not in gone]
+        if len(keep) == len(index['dates']):
+            return 0
+        _save_index(patient_dir, [index['dates'][i] for i in keep], index['hashes'][keep], index['vectors'][keep])
+        return len(index['dates']) - len(keep)
+
+
+def build_index(patient_dir):
+    """
+    Build a patient's index from every daily entry on disk
+
+    Callers hold the patient lock (write paths already do; reads use load_index).
+
+    Returns:
+        Number of entries embedded
+    """
+    entries = load_entries(patient_dir)
+    vectors = embed_texts([entry.get('text', '') for entry in entries])
+    _save_index(
+        patient_dir,
+        [entry['date'] for entry in entries],
+        [_text_hash(entry.get('text', '')) for entry in entries],
+        vectors
+    )
+    return len(entries)
+
+
+def load_index(patient_dir):
+    """
+    Current index for a read path, building it first if missing or outdated
+
+    The build runs under the patient lock and re-checks once the lock is held,
+    so it never saves a listing older than a concurrent writer's update.
+
+    Returns:
+        Index dictionary, or None when the patient has no entries
+    """
+    index = _read_index(patient_dir)
+    if index is None and list_entry_files(patient_dir):
+        with patient_lock(patient_dir):
+            index = _read_index(patient_dir)
+            if index is None:
+                build_index(patient_dir)
+                index = _read_index(patient_dir)
+    return index
+
+
+def _snippet(text, query):
+    """Short excerpt around the first query word found in the entry"""
+    lowered = text.lower()
+    position = -1
+    for token in TOKEN_PATTERN.findall(query.lower()):
+        if token in STOPWORDS:
+            continue
+        candidates = [token] + [word for word in CONCEPTS.get(_CONCEPT_LOOKUP.get(token, ''), ())]
+        hits = [lowered.find(candidate) for candidate in candidates]
+        hits = [hit for hit in hits if hit >= 0]
+        if hits:
+            position = min(hits)
+            break
+
+    if position < 0 or len(text) <= SNIPPET_CHARS:
+        return text[:SNIPPET_CHARS] + ('…' if len(text) > SNIPPET_CHARS else '')
+
+    start = max(0, position - SNIPPET_CHARS // 3)
+    excerpt = text[start:start + SNIPPET_CHARS]
+    return ('…' if start > 0 else '') + excerpt + ('…' if start + SNIPPET_CHARS < len(text) else '')
+
+
+def search_entries(patient_dir, query, limit=10, sort='relevance'):
+    """
+    Search a patient's entries by meaning
+
+    Args:
+        patient_dir: Patient data directory
+        query: Free-text question or keywords
+        limit: Maximum number of results
+        sort: "relevance" (best match first) or "recent" (newest match first)
+
+    Returns:
+        Dictionary with results (date, time, score, snippet), index size and timing
+
+    Raises:
+        ValueError: If sort is not one of SORT_ORDERS
+    """
+    if sort not in SORT_ORDERS:
+        raise ValueError(f"sort must be one of {', '.join(SORT_ORDERS)}")
+    started = time.perf_counter()
+
+    index = load_index(patient_dir)
+
+    results = []
+    if index is not None and len(index['dates']):
+        scores = index['vectors'] @ _embed_query(query)
+        candidates = np.flatnonzero(scores >= MIN_SCORE)
+        if sort == 'recent':
+            # Index rows are in date order, so every match newest first
+            candidates = candidates[::-1]
+        else:
+            candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+
+        # Walk past entries deleted since they were indexed so the page stays full
+        missing = []
+        for i in candidates:
+            if len(results) == limit:
+                break
+            try:
+                entry = load_entries(patient_dir, [f"{index['dates'][i]}.json"])[0]
+            except FileNotFoundError:
+                missing.append(index['dates'][i])
+                continue
+            results.append({
+                "date": entry.get('date'),
+                "time": entry.get('time'),
+                "score": round(float(scores[i]), 4),
+                "snippet": _snippet(entry.get('text', ''), query)
+            })
+
+        if missing:
+            prune_index(patient_dir, missing)
+            index = _read_index(patient_dir)
+
+    return {
+        "query": query,
+        "results": results,
+        "index_size": len(index['dates']) if index else 0,
+        "took_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
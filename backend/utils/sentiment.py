@@ -0,0 +1,256 @@
+"""
+Local Lexicon Sentiment Scorer
+
+Scores journal entries at ingestion time without an LLM call. Each entry gets a
+sentiment score in [-1, 1] and an emotion vector computed from a small clinical
+lexicon. Scoring is vectorized with NumPy over the token ids of many entries at
+once, so the whole archive can be rescored in bulk in seconds.
+"""
+import json
+import os
+import re
+
+import numpy as np
+
+from utils.storage import DAILY_ENTRY_PATTERN, patient_lock, write_json
+
+# Bump when the lexicon or scoring changes so stored scores can be recomputed
+LEXICON_VERSION = 1
+
+EMOTIONS = ('joy', 'sadness', 'anger', 'fear', 'shame', 'calm')
+
+# word -> (valence in [-3, 3], emotions it signals)
+LEXICON = {
+    # joy / positive affect
+    'happy': (2.5, ('joy',)), 'happier': (2.5, ('joy',)), 'happiness': (2.5, ('joy',)),
+    'joy': (3.0, ('joy',)), 'glad': (2.0, ('joy',)), 'excited': (2.0, ('joy',)),
+    'grateful': (2.5, ('joy',)), 'thankful': (2.0, ('joy',)), 'proud': (2.0, ('joy',)),
+    'love': (2.5, ('joy',)), 'loved': (2.5, ('joy',)), 'fun': (2.0, ('joy',)),
+    'laughed': (2.0, ('joy',)), 'laugh': (1.5, ('joy',)), 'smiled': (1.5, ('joy',)),
+    'good': (1.5, ('joy',)), 'great': (2.5, ('joy',)), 'better': (1.5, ('joy',)),
+    'best': (2.0, ('joy',)), 'nice': (1.5, ('joy',)), 'enjoyed': (2.0, ('joy',)),
+    'hope': (1.5, ('joy',)), 'hopeful': (2.0, ('joy',)), 'progress': (1.5, ('joy',)),
+    'accomplished': (2.0, ('joy',)), 'helped': (1.5, ('joy',)), 'win': (1.5, ('joy',)),
+    'normal': (0.5, ('calm',)), 'okay': (0.5, ('calm',)), 'fine': (0.5, ('calm',)),
+    # calm / coping
+    'calm': (2.0, ('calm',)), 'calmer': (2.0, ('calm',)), 'relaxed': (2.0, ('calm',)),
+    'peaceful': (2.5, ('calm',)), 'relief': (2.0, ('calm',)), 'relieved': (2.0, ('calm',)),
+    'safe': (1.5, ('calm',)), 'rested': (1.5, ('calm',)), 'breathing': (0.5, ('calm',)),
+    'mindfulness': (1.0, ('calm',)), 'meditated': (1.0, ('calm',)), 'boundaries': (1.0, ('calm',)),
+    # sadness
+    'sad': (-2.0, ('sadness',)), 'sadness': (-2.0, ('sadness',)), 'cried': (-2.0, ('sadness',)),
+    'crying': (-2.0, ('sadness',)), 'tears': (-1.5, ('sadness',)), 'lonely': (-2.0, ('sadness',)),
+    'alone': (-1.5, ('sadness',)), 'isolated': (-2.0, ('sadness',)), 'empty': (-2.0, ('sadness',)),
+    'miss': (-1.5, ('sadness',)), 'missed': (-1.0, ('sadness',)), 'missing': (-1.5, ('sadness',)),
+    'grief': (-2.5, ('sadness',)), 'grieving': (-2.5, ('sadness',)), 'loss': (-2.0, ('sadness',)),
+    'lost': (-1.5, ('sadness',)), 'depressed': (-3.0, ('sadness',)), 'down': (-1.0, ('sadness',)),
+    'hopeless': (-3.0, ('sadness',)), 'numb': (-2.0, ('sadness',)), 'tired': (-1.0, ('sadness',)),
+    'exhausted': (-2.0, ('sadness',)), 'heartbroken': (-3.0, ('sadness',)), 'hurt': (-2.0, ('sadness',)),
+    'bad': (-1.5, ('sadness',)), 'worse': (-2.0, ('sadness',)),
+    'worst': (-2.5, ('sadness',)), 'rough': (-1.5, ('sadness',)), 'hard': (-1.0, ('sadness',)),
+    'struggle': (-1.5, ('sadness',)), 'struggling': (-2.0, ('sadness',)), 'burnout': (-2.0, ('sadness',)),
+    # anger
+    'angry': (-2.5, ('anger',)), 'anger': (-2.5, ('anger',)), 'mad': (-2.0, ('anger',)),
+    'furious': (-3.0, ('anger',)), 'frustrated': (-2.0, ('anger',)), 'frustrating': (-2.0, ('anger',)),
+    'annoyed': (-1.5, ('anger',)), 'irritated': (-1.5, ('anger',)), 'resent': (-2.0, ('anger',)),
+    'resentful': (-2.0, ('anger',)), 'hate': (-2.5, ('anger',)), 'unfair': (-1.5, ('anger',)),
+    # fear / anxiety
+    'anxious': (-2.0, ('fear',)), 'anxiety': (-2.0, ('fear',)), 'worried': (-2.0, ('fear',)),
+    'worry': (-1.5, ('fear',)), 'scared': (-2.0, ('fear',)), 'afraid': (-2.0, ('fear',)),
+    'fear': (-2.0, ('fear',)), 'panic': (-2.5, ('fear',)), 'nervous': (-1.5, ('fear',)),
+    'overwhelmed': (-2.5, ('fear',)), 'stressed': (-2.0, ('fear',)), 'stress': (-1.5, ('fear',)),
+    'dread': (-2.5, ('fear',)), 'terrified': (-3.0, ('fear',)), 'froze': (-1.5, ('fear',)),
+    'insomnia': (-1.5, ('fear',)), 'racing': (-1.0, ('fear',)),
+    # shame / self-criticism
+    'ashamed': (-2.5, ('shame',)), 'shame': (-2.5, ('shame',)), 'embarrassed': (-2.0, ('shame',)),
+    'guilty': (-2.0, ('shame',)), 'guilt': (-2.0, ('shame',)), 'stupid': (-2.0, ('shame',)),
+    'failure': (-2.5, ('shame',)), 'failed': (-2.0, ('shame',)), 'worthless': (-3.0, ('shame', 'sadness')),
+    'inadequate': (-2.5, ('shame',)), 'judging': (-1.5, ('shame', 'fear')), 'judged': (-1.5, ('shame', 'fear')),
+    'messing': (-1.5, ('shame',)), 'mistake': (-1.5, ('shame',)),
+    'mistakes': (-1.5, ('shame',)), 'perfect': (0.5, ()), 'imperfect': (-1.0, ('shame',)),
+}
+
+# Tokens that flip the polarity of the next NEGATION_WINDOW tokens
+NEGATORS = (
+    'not', 'no', 'never', 'nothing', 'hardly', 'without', 'cannot',
+    "don't", "dont", "didn't", "didnt", "can't", "cant", "won't", "wont",
+    "isn't", "isnt", "wasn't", "wasnt", "couldn't", "couldnt", "doesn't", "doesnt"
+)
+NEGATION_WINDOW = 3
+NEGATION_WEIGHT = 0.75
+
+# Normalization constant: score = total / sqrt(total^2 + alpha)
+NORMALIZATION_ALPHA = 15.0
+
+NEUTRAL_THRESHOLD = 0.05
+
+TOKEN_PATTERN = re.compile(r"[a-z]+(?:'[a-z]+)?")
+
+
+def _build_tables():
+    """Compile the lexicon into dense lookup arrays indexed by token id (0 = unknown)"""
+    words = sorted(set(LEXICON) | set(NEGATORS))
+    vocab = {word: idx for idx, word in enumerate(words, start=1)}
+
+    valence = np.zeros(len(words) + 1, dtype=np.float32)
+    emotion_matrix = np.zeros((len(words) + 1, len(EMOTIONS)), dtype=np.float32)
+    is_negator = np.zeros(len(words) + 1, dtype=bool)
+
+    for word, (word_valence, word_emotions) in LEXICON.items():
+        idx = vocab[word]
+        valence[idx] = word_valence
+        for emotion in word_emotions:
+            emotion_matrix[idx, EMOTIONS.index(emotion)] = 1.0
+
+    for word in NEGATORS:
+        is_negator[vocab[word]] = True
+
+    return vocab, valence, emotion_matrix, is_negator
+
+
+_VOCAB, _VALENCE, _EMOTION_MATRIX, _IS_NEGATOR = _build_tables()
+
+
+def tokenize(text):
+    """Lowercase word tokens, keeping contractions together"""
+    return TOKEN_PATTERN.findall((text or '').lower().replace('’', "'"))
+
+
+def _encode(text):
+    vocab_get = _VOCAB.get
+    return np.fromiter((vocab_get(token, 0) for token in tokenize(text)), dtype=np.int32)
+
+
+def score_texts(texts):
+    """
+    Vectorized sentiment scoring for a batch of texts
+
+    Args:
+        texts: List of entry texts
+
+    Returns:
+        Tuple (scores, emotions): scores is a float array of shape (n,) in
+        [-1, 1]; emotions is an (n, len(EMOTIONS)) array where each row is the
+        share of emotional tokens signalling each emotion (rows sum to 0 or 1)
+    """
+    count = len(texts)
+    if count == 0:
+        return np.zeros(0, dtype=np.float32), np.zeros((0, len(EMOTIONS)), dtype=np.float32)
+
+    encoded = [_encode(text) for text in texts]
+    lengths = np.fromiter((len(ids) for ids in encoded), dtype=np.int64, count=count)
+    token_ids = np.concatenate(encoded)
+    doc_index = np.repeat(np.arange(count), lengths)
+
+    # A token is negated when a negator appears within the preceding window of the same entry
+    negator_mask = _IS_NEGATOR[token_ids]
+    negated = np.zeros(len(token_ids), dtype=bool)
+    for shift in range(1, NEGATION_WINDOW + 1):
+        if shift >= len(token_ids):
+            break
+        negated[shift:] |= negator_mask[:-shift] & (doc_index[shift:] == doc_index[:-shift])
+
+    polarity = np.where(negated, -NEGATION_WEIGHT, 1.0)
+    totals = np.bincount(doc_index, weights=_VALENCE[token_ids] * polarity, minlength=count).astype(np.float64)
+    scores = totals / np.sqrt(totals * totals + NORMALIZATION_ALPHA)
+
+    # Negated emotion words ("not anxious") do not count towards that emotion
+    emotion_hits = _EMOTION_MATRIX[token_ids] * (~negated)[:, None]
+    emotions = np.stack([
+        np.bincount(doc_index, weights=emotion_hits[:, column], minlength=count)
+        for column in range(len(EMOTIONS))
+    ], axis=1).astype(np.float64)
+    row_totals = emotions.sum(axis=1, keepdims=True)
+    emotions = np.divide(emotions, row_totals, out=np.zeros_like(emotions), where=row_totals > 0)
+
+    return scores.astype(np.float32), emotions.astype(np.float32)
+
+
+def sentiment_label(score):
+    """Map a score to the same labels the weekly analysis uses"""
+    if score > NEUTRAL_THRESHOLD:
+        return 'positive'
+    if score < -NEUTRAL_THRESHOLD:
+        return 'negative'
+    return 'neutral'
+
+
+def _sentiment_record(score, emotion_row):
+    return {
+        "score": round(float(score), 4),
+        "label": sentiment_label(score),
+        "emotions": {emotion: round(float(value), 3) for emotion, value in zip(EMOTIONS, emotion_row)},
+        "lexicon_version": LEXICON_VERSION
+    }
+
+
+def annotate_entries(entries):
+    """
+    Attach a `local_sentiment` record to each entry in place
+
+    Args:
+        entries: List of entry dictionaries with a "text" field
+
+    Returns:
+        The same list, for chaining
+    """
+    scores, emotions = score_texts([entry.get('text', '') for entry in entries])
+    for entry, score, emotion_row in zip(entries, scores, emotions):
+        entry['local_sentiment'] = _sentiment_record(score, emotion_row)
+    return entries
+
+
+def annotate_entry(entry):
+    """Attach a `local_sentiment` record to a single entry and return it"""
+    return annotate_entries([entry])[0]
+
+
+def rescore_archive(data_dir, force=False):
+    """
+    Recompute `local_sentiment` for every daily entry file under data_dir
+
+    Each patient's entries are read, scored in one vectorized batch and written
+    back under that patient's lock, so an entry saved concurrently is never
+    overwritten with stale content. Only files whose stored score is missing,
+    outdated or different are rewritten, and the patient's sentiment series
+    (utils/sentiment_series.py) is updated with them under the same lock.
+
+    Args:
+        data_dir: Base data directory containing one folder per patient
+        force: Rewrite every entry even if its stored record is current
+
+    Returns:
+        Dictionary with counts of entries scanned and files rewritten
+    """
+    # Imported here: sentiment_series imports this module for score_texts
+    from utils import sentiment_series
+
+    scanned = 0
+    rewritten = 0
+    for root, dirs, files in os.walk(data_dir):
+        dirs[:] = [d for d in dirs if not d.startswith('.')]
+        filenames = sorted(f for f in files if DAILY_ENTRY_PATTERN.match(f))
+        if not filenames:
+            continue
+
+        with patient_lock(root):
+            paths = [os.path.join(root, filename) for filename in filenames]
+            entries = []
+            for path in paths:
+                with open(path, 'r') as f:
+                    entries.append(json.load(f))
+
+            previous = [entry.get('local_sentiment') for entry in entries]
+            annotate_entries(entries)
+
+            changed = []
+            for path, entry, old_record in zip(paths, entries, previous):
+                if not force and old_record == entry['local_sentiment']:
+                    continue
+                write_json(path, entry)
+                changed.append(entry)
+            sentiment_series.record_entries(root, changed)
+        scanned += len(entries)
+        rewritten += len(changed)
+
+    return {"entries_scanned": scanned, "files_rewritten": rewritten}
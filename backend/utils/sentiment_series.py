@@ -0,0 +1,281 @@
+"""
+Sentiment Time Series
+
+Per-patient column store of sentiment values so charts over arbitrary ranges
+never have to open summary or entry files. Two series are kept:
+
+    entry   local lexicon score of each daily entry (utils/sentiment.py)
+    week    `mood_trends.sentiment_score` from each weekly analysis
+
+Both are stored as sorted NumPy columns (day number + score) and updated
+incrementally on every entry or summary write. Long ranges are downsampled on
+the server into equal-width time buckets (mean, min, max, count).
+
+Storage: data/<patient_id>/.derived/sentiment.npz
+"""
+import json
+import os
+import threading
+
+import numpy as np
+
+from utils.metrics import record_cache
+from utils.sentiment import score_texts
+from utils.storage import (
+    SUMMARY_FILE_PATTERN,
+    atomic_write,
+    derived_dir,
+    from_day,
+    load_entries,
+    patient_lock,
+    summary_week_range,
+    to_day,
+)
+
+STORE_VERSION = 1
+STORE_FILENAME = 'sentiment.npz'
+
+DEFAULT_MAX_POINTS = 200
+GRANULARITIES = ('entry', 'week')
+
+_cache_lock = threading.Lock()
+_store_cache = {}
+
+
+def _store_path(patient_dir):
+    return os.path.join(derived_dir(patient_dir), STORE_FILENAME)
+
+
+def _empty_columns():
+    return {
+        "entry_days": np.zeros(0, dtype=np.int32),
+        "entry_scores": np.zeros(0, dtype=np.float32),
+        "week_days": np.zeros(0, dtype=np.int32),
+        "week_end_days": np.zeros(0, dtype=np.int32),
+        "week_scores": np.zeros(0, dtype=np.float32),
+        "week_entry_counts": np.zeros(0, dtype=np.int32)
+    }
+
+
+def _save(patient_dir, columns):
+    path = _store_path(patient_dir)
+    with atomic_write(path, 'wb') as f:
+        np.savez(f, version=np.array([STORE_VERSION], dtype=np.int32), **columns)
+
+
+def _load(patient_dir):
+    """Load the store (cached by mtime); None when missing or outdated"""
+    path = _store_path(patient_dir)
+    if not os.path.exists(path):
+        return None
+
+    mtime = os.stat(path).st_mtime_ns
+    with _cache_lock:
+        cached = _store_cache.get(path)
+    record_cache('sentiment_series', bool(cached and cached[0] == mtime))
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    with np.load(path) as stored:
+        if int(stored['version'][0]) != STORE_VERSION:
+            return None
+        columns = {name: stored[name] for name in _empty_columns()}
+
+    with _cache_lock:
+        _store_cache[path] = (mtime, columns)
+    return columns
+
+
+def _upsert(days, values, new_days, new_values):
+    """Merge (day, value...) rows into sorted columns, new rows replacing same-day rows"""
+    keep = ~np.isin(days, new_days)
+    merged_days = np.concatenate([days[keep], new_days])
+    order = np.argsort(merged_days, kind='stable')
+    merged_values = [np.concatenate([column[keep], new])[order] for column, new in zip(values, new_values)]
+    return merged_days[order], merged_values
+
+
+def _entry_rows(entries):
+    """Day numbers and scores for entries, scoring any that lack a stored local score"""
+    scores = [None if not entry.get('local_sentiment') else entry['local_sentiment'].get('score') for entry in entries]
+    missing = [i for i, score in enumerate(scores) if score is None]
+    if missing:
+        computed, _ = score_texts([entries[i].get('text', '') for i in missing])
+        for i, score in zip(missing, computed):
+            scores[i] = float(score)
+
+    # Keep the last version of an entry if a batch repeats a date
+    by_day = {to_day(entry['date']): score for entry, score in zip(entries, scores)}
+    return np.array(list(by_day), dtype=np.int32), np.array(list(by_day.values()), dtype=np.float32)
+
+
+def _week_row(filename, summary):
+    week_range = summary_week_range(filename)
+    if not week_range:
+        return None
+    week_start, week_end = week_range
+    score = summary.get('mood_trends', {}).get('sentiment_score')
+    if score is None:
+        return None
+    return to_day(week_start), to_day(week_end), float(score), int(summary.get('entry_count', 0) or 0)
+
+
+def build_store(patient_dir):
+    """Rebuild a patient's sentiment columns from the entry and summary files (caller holds the patient lock)"""
+    columns = _empty_columns()
+    entries = load_entries(patient_dir)
+    if entries:
+        columns['entry_days'], columns['entry_scores'] = _entry_rows(entries)
+        order = np.argsort(columns['entry_days'])
+        columns['entry_days'] = columns['entry_days'][order]
+        columns['entry_scores'] = columns['entry_scores'][order]
+
+    weeks = []
+    for filename in os.listdir(patient_dir):
+        if SUMMARY_FILE_PATTERN.match(filename):
+            with open(os.path.join(patient_dir, filename), 'r') as f:
+                row = _week_row(filename, json.load(f))
+            if row:
+                weeks.append(row)
+    if weeks:
+        weeks.sort()
+        columns['week_days'] = np.array([row[0] for row in weeks], dtype=np.int32)
+        columns['week_end_days'] = np.array([row[1] for row in weeks], dtype=np.int32)
+        columns['week_scores'] = np.array([row[2] for row in weeks], dtype=np.float32)
+        columns['week_entry_counts'] = np.array([row[3] for row in weeks], dtype=np.int32)
+
+    _save(patient_dir, columns)
+    return columns
+
+
+def load_store(patient_dir):
+    """
+    Current sentiment columns for a read path, building them first if missing or outdated
+
+    The build runs under the patient lock and re-checks once the lock is held,
+    so a read never saves a listing older than a concurrent writer's update.
+    """
+    columns = _load(patient_dir)
+    if columns is None:
+        with patient_lock(patient_dir):
+            columns = _load(patient_dir)
+            if columns is None:
+                columns = build_store(patient_dir)
+    return columns
+
+
+def record_entries(patient_dir, entries):
+    """Upsert entry scores after daily entries were written (caller holds the patient lock)"""
+    if not entries:
+        return
+    columns = _load(patient_dir)
+    if columns is None:
+        build_store(patient_dir)
+        return
+    new_days, new_scores = _entry_rows(entries)
+    columns = dict(columns)
+    columns['entry_days'], (columns['entry_scores'],) = _upsert(
+        columns['entry_days'], [columns['entry_scores']], new_days, [new_scores]
+    )
+    _save(patient_dir, columns)
+
+
+def record_week(patient_dir, filename, summary):
+    """Upsert a week's LLM sentiment score after a summary was written (caller holds the patient lock)"""
+    row = _week_row(filename, summary)
+    if row is None:
+        return
+    columns = _load(patient_dir)
+    if columns is None:
+        build_store(patient_dir)
+        return
+    columns = dict(columns)
+    week_day, week_end_day, score, entry_count = row
+    columns['week_days'], (columns['week_end_days'], columns['week_scores'], columns['week_entry_counts']) = _upsert(
+        columns['week_days'],
+        [columns['week_end_days'], columns['week_scores'], columns['week_entry_counts']],
+        np.array([week_day], dtype=np.int32),
+        [np.array([week_end_day], dtype=np.int32), np.array([score], dtype=np.float32),
+         np.array([entry_count], dtype=np.int32)]
+    )
+    _save(patient_dir, columns)
+
+
+def downsample(days, scores, max_points):
+    """
+    Bucket a sorted series into at most max_points equal-width time buckets
+
+    Bucket k covers days d with k <= (d - first) * max_points / span < k + 1,
+    where span is the number of days from the first to the last point. Integer
+    arithmetic keeps every day in exactly one bucket and each reported start
+    day inside its bucket.
+
+    Returns:
+        Tuple of arrays (bucket_start_days, mean, min, max, count) for non-empty buckets
+    """
+    first = int(days[0])
+    span = int(days[-1]) + 1 - first
+    buckets = (days.astype(np.int64) - first) * max_points // span
+
+    # Days are sorted, so each bucket is a contiguous run and reduceat applies
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    counts = np.diff(np.r_[starts, len(days)])
+    means = np.add.reduceat(scores.astype(np.float64), starts) / counts
+    minimums = np.minimum.reduceat(scores, starts)
+    maximums = np.maximum.reduceat(scores, starts)
+    # First whole day of each bucket: ceil(k * span / max_points)
+    bucket_days = (first + (buckets[starts] * span + max_points - 1) // max_points).astype(np.int32)
+    return bucket_days, means, minimums, maximums, counts
+
+
+def get_sentiment_series(patient_dir, granularity='entry', start=None, end=None, max_points=DEFAULT_MAX_POINTS):
+    """
+    Compact sentiment series for a patient
+
+    Args:
+        patient_dir: Patient data directory
+        granularity: "entry" (local per-entry scores) or "week" (LLM weekly scores)
+        start, end: Optional inclusive date range (YYYY-MM-DD)
+        max_points: Downsample into at most this many buckets when exceeded
+
+    Returns:
+        Columnar dictionary: dates, scores (+ min, max, counts when downsampled)
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    if max_points < 1:
+        raise ValueError("points must be at least 1")
+
+    columns = load_store(patient_dir)
+
+    prefix = 'entry' if granularity == 'entry' else 'week'
+    days = columns[f'{prefix}_days']
+    scores = columns[f'{prefix}_scores']
+
+    lo = np.searchsorted(days, to_day(start), side='left') if start else 0
+    hi = np.searchsorted(days, to_day(end), side='right') if end else len(days)
+    days, scores = days[lo:hi], scores[lo:hi]
+
+    series = {
+        "granularity": granularity,
+        "start": start or (from_day(days[0]) if len(days) else None),
+        "end": end or (from_day(days[-1]) if len(days) else None),
+        "total_points": int(len(days)),
+        "downsampled": False
+    }
+
+    if len(days) <= max_points:
+        series["dates"] = [from_day(day) for day in days]
+        series["scores"] = [round(float(score), 4) for score in scores]
+        return series
+
+    bucket_days, means, minimums, maximums, counts = downsample(days, scores, max_points)
+    series.update({
+        "downsampled": True,
+        "dates": [from_day(day) for day in bucket_days],
+        "scores": [round(float(value), 4) for value in means],
+        "min": [round(float(value), 4) for value in minimums],
+        "max": [round(float(value), 4) for value in maximums],
+        "counts": counts.tolist()
+    })
+    return series
@@ -0,0 +1,204 @@
+"""
+Single-flight Deduplication
+
+Collapses concurrent identical calls (a double-click, a frontend retry) into
+one. Callers with the same key queue on a lock file; the first one runs the
+call and publishes its result to a short-lived result file, and the others
+return that result instead of repeating the work. Because both are plain
+files under the patient's .derived directory, this works across gunicorn
+workers as well as threads.
+
+    data/<patient_id>/.derived/inflight/<key>.lock
+    data/<patient_id>/.derived/inflight/<key>.json   (result, RESULT_TTL_SECONDS)
+
+Failed results (dicts with an "error" key) are not published, so a waiter
+retries the call itself rather than inheriting a transient failure.
+
+Old lock files are swept while locked. A caller that opened a lock file just
+before it was unlinked would otherwise hold a lock on an orphaned inode while
+the next caller locks a new file, so after acquiring, every caller checks that
+its file is still the one at the path and starts over if not.
+"""
+import asyncio
+import fcntl
+import hashlib
+import json
+import os
+import time
+
+from utils.metrics import record_cache
+from utils.storage import derived_dir, write_json
+
+INFLIGHT_DIRNAME = 'inflight'
+RESULT_TTL_SECONDS = float(os.getenv('SINGLE_FLIGHT_TTL_SECONDS', 60))
+WAIT_TIMEOUT_SECONDS = float(os.getenv('SINGLE_FLIGHT_WAIT_SECONDS', 600))
+POLL_INTERVAL_SECONDS = 0.05
+
+
+def flight_key(*parts):
+    """Stable key from JSON-serializable parts (e.g. patient, week, input data)"""
+    payload = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def _read_fresh_result(path, ttl):
+    try:
+        if time.time() - os.stat(path).st_mtime > ttl:
+            return None
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _sweep_expired(directory, ttl):
+    """Remove long-expired results and lock files nobody holds"""
+    cutoff = time.time() - max(ttl, 1.0) * 10
+    for filename in os.listdir(directory):
+        path = os.path.join(directory, filename)
+        try:
+            if os.stat(path).st_mtime > cutoff:
+                continue
+            if not filename.endswith('.lock'):
+                os.remove(path)
+                continue
+            with open(path, 'a') as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                # Only unlink the file we hold; another sweep may have replaced it
+                if _is_current(lock_file, path):
+                    os.remove(path)
+        except FileNotFoundError:
+            continue
+
+
+def _is_current(lock_file, path):
+    """True if an open lock file is still the file at `path` (not unlinked by a sweep)"""
+    try:
+        return os.fstat(lock_file.fileno()).st_ino == os.stat(path).st_ino
+    except FileNotFoundError:
+        return False
+
+
+def _try_lock(lock_file, key, deadline):
+    """Non-blocking flock attempt; raises TimeoutError once past `deadline`"""
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except BlockingIOError:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Timed out waiting for in-flight call {key}")
+        return False
+
+
+def _acquire(lock_path, key, deadline):
+    """Open and flock the lock file at `lock_path`, polling until it is free"""
+    while True:
+        lock_file = open(lock_path, 'a')
+        try:
+            while not _try_lock(lock_file, key, deadline):
+                time.sleep(POLL_INTERVAL_SECONDS)
+        except BaseException:
+            lock_file.close()
+            raise
+        if _is_current(lock_file, lock_path):
+            return lock_file
+        lock_file.close()
+
+
+async def _acquire_async(lock_path, key, deadline):
+    """_acquire that waits with asyncio.sleep"""
+    while True:
+        lock_file = open(lock_path, 'a')
+        try:
+            while not _try_lock(lock_file, key, deadline):
+                await asyncio.sleep(POLL_INTERVAL_SECONDS)
+        except BaseException:
+            lock_file.close()
+            raise
+        if _is_current(lock_file, lock_path):
+            return lock_file
+        lock_file.close()
+
+
+def _publish(directory, result_path, result, ttl):
+    """Share a successful result with late duplicates"""
+    if not (isinstance(result, dict) and 'error' in result):
+        write_json(result_path, result, indent=None)
+        _sweep_expired(directory, ttl)
+
+
+def run_single_flight(patient_dir, key, call, ttl=RESULT_TTL_SECONDS, wait_timeout=WAIT_TIMEOUT_SECONDS):
+    """
+    Run `call` once for concurrent callers sharing `key`
+
+    Args:
+        patient_dir: Patient data directory (scopes the lock and result files)
+        key: Flight key, see flight_key()
+        call: Zero-argument function returning a JSON-serializable dict
+        ttl: Seconds a finished result is shared with late duplicates
+        wait_timeout: Seconds to wait for the running call before giving up
+
+    Returns:
+        Tuple (result, shared) where shared is True if another caller's result was reused
+
+    Raises:
+        TimeoutError: If the running call did not finish within wait_timeout
+    """
+    directory = derived_dir(patient_dir, INFLIGHT_DIRNAME)
+    result_path = os.path.join(directory, f"{key}.json")
+
+    result = _read_fresh_result(result_path, ttl)
+    if result is not None:
+        record_cache('single_flight', True)
+        return result, True
+
+    lock_path = os.path.join(directory, f"{key}.lock")
+    with _acquire(lock_path, key, time.monotonic() + wait_timeout) as lock_file:
+        try:
+            # The call we waited on may have finished while we queued
+            result = _read_fresh_result(result_path, ttl)
+            if result is not None:
+                record_cache('single_flight', True)
+                return result, True
+
+            record_cache('single_flight', False)
+            result = call()
+            _publish(directory, result_path, result, ttl)
+            return result, False
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+async def run_single_flight_async(patient_dir, key, call, ttl=RESULT_TTL_SECONDS, wait_timeout=WAIT_TIMEOUT_SECONDS):
+    """
+    Async run_single_flight: `call` is a zero-argument coroutine function
+
+    Waiting polls with asyncio.sleep, so duplicates queue without blocking the
+    event loop. Shares lock and result files with the sync version, so sync and
+    async workers deduplicate against each other.
+    """
+    directory = derived_dir(patient_dir, INFLIGHT_DIRNAME)
+    result_path = os.path.join(directory, f"{key}.json")
+
+    result = _read_fresh_result(result_path, ttl)
+    if result is not None:
+        record_cache('single_flight', True)
+        return result, True
+
+    lock_path = os.path.join(directory, f"{key}.lock")
+    with await _acquire_async(lock_path, key, time.monotonic() + wait_timeout) as lock_file:
+        try:
+            result = _read_fresh_result(result_path, ttl)
+            if result is not None:
+                record_cache('single_flight', True)
+                return result, True
+
+            record_cache('single_flight', False)
+            result = await call()
+            _publish(directory, result_path, result, ttl)
+            return result, False
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,179 @@
+"""
+Patient Storage Helpers
+
+Shared helpers for the on-disk layout of a patient's data directory:
+
+    data/<patient_id>/
+        YYYY-MM-DD.json                  daily entries
+        week_<start>_to_<end>.json       aggregated weeks
+        summary_<start>_to_<end>.json    weekly analyses
+        .derived/                        indexes rebuilt from the files above
+
+Every writer replaces files atomically (write_json / write_text) while holding
+the patient's lock (patient_lock), so requests for different patients run in
+parallel and readers never see a partially written file.
+"""
+import fcntl
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from utils.timing import timed
+
+DERIVED_DIRNAME = '.derived'
+LOCK_FILENAME = 'patient.lock'
+DAILY_ENTRY_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}\.json$')
+WEEK_FILE_PATTERN = re.compile(r'^(?:week|summary)_(\d{4}-\d{2}-\d{2})_to_(\d{4}-\d{2}-\d{2})\.json$')
+SUMMARY_FILE_PATTERN = re.compile(r'^summary_(\d{4}-\d{2}-\d{2})_to_(\d{4}-\d{2}-\d{2})\.json$')
+
+EPOCH = date(1970, 1, 1)
+
+
+def summary_week_range(filename):
+    """(week_start, week_end) of a summary_<start>_to_<end>.json filename, or None"""
+    match = SUMMARY_FILE_PATTERN.match(filename)
+    return match.groups() if match else None
+
+
+def to_day(date_str):
+    """YYYY-MM-DD -> integer day number (days since 1970-01-01), for NumPy date columns"""
+    return date.fromisoformat(date_str).toordinal() - EPOCH.toordinal()
+
+
+def from_day(day):
+    """Integer day number -> YYYY-MM-DD"""
+    return (EPOCH + timedelta(days=int(day))).isoformat()
+
+
+def derived_dir(patient_dir, *parts):
+    """
+    Return (and create) a directory for derived data under a patient directory
+
+    Args:
+        patient_dir: Patient data directory
+        *parts: Optional sub-directory names
+
+    Returns:
+        Absolute path of the derived directory
+    """
+    path = os.path.join(patient_dir, DERIVED_DIRNAME, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def list_entry_files(patient_dir):
+    """Sorted daily entry filenames (YYYY-MM-DD.json) in a patient directory"""
+    return sorted(f for f in os.listdir(patient_dir) if DAILY_ENTRY_PATTERN.match(f))
+
+
+def load_entries(patient_dir, filenames=None):
+    """
+    Load daily entries from a patient directory in date order
+
+    Args:
+        patient_dir: Patient data directory
+        filenames: Optional subset of entry filenames to load
+
+    Returns:
+        List of entry dictionaries
+    """
+    entries = []
+    for filename in filenames if filenames is not None else list_entry_files(patient_dir):
+        with open(os.path.join(patient_dir, filename), 'r') as f:
+            entries.append(json.load(f))
+    return entries
+
+
+@timed('read_entries')
+def load_entries_in_range(patient_dir, start_date, end_date, exclude_dates=()):
+    """
+    Load daily entries dated within [start_date, end_date] with one directory scan
+
+    Args:
+        patient_dir: Patient data directory
+        start_date, end_date: Inclusive range (YYYY-MM-DD)
+        exclude_dates: Dates to skip (e.g. entries the caller already holds in memory)
+
+    Returns:
+        List of entry dictionaries in date order
+    """
+    filenames = [
+        filename for filename in list_entry_files(patient_dir)
+        if start_date <= filename[:10] <= end_date and filename[:10] not in exclude_dates
+    ]
+    return load_entries(patient_dir, filenames)
+
+
+@contextmanager
+def atomic_write(path, mode='w'):
+    """
+    Open a temporary file for writing and rename it over `path` on success
+
+    Readers never see a partial file, and the temporary file is removed if
+    writing fails.
+
+    Args:
+        path: Destination path
+        mode: File mode, 'w' for text or 'wb' for binary (e.g. np.savez)
+    """
+    tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    try:
+        with open(tmp_path, mode) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_text(path, text):
+    """Write a text file atomically (see atomic_write)"""
+    with atomic_write(path) as f:
+        f.write(text)
+
+
+def write_json(path, data, indent=2):
+    """Atomically write JSON (see write_text)"""
+    write_text(path, json.dumps(data, indent=indent))
+
+
+_held_locks = threading.local()
+
+
+@contextmanager
+def patient_lock(patient_dir):
+    """
+    Exclusive lock on one patient's files, across threads and worker processes
+
+    Uses flock on data/<patient_id>/.derived/patient.lock, so it is released
+    automatically if the process dies. Re-entrant within a thread, so helpers
+    that lock can be called from code that already holds the lock.
+
+    Args:
+        patient_dir: Patient data directory
+    """
+    key = os.path.realpath(patient_dir)
+    held = getattr(_held_locks, 'counts', None)
+    if held is None:
+        held = _held_locks.counts = {}
+
+    if held.get(key):
+        held[key] += 1
+        try:
+            yield
+        finally:
+            held[key] -= 1
+        return
+
+    with open(os.path.join(derived_dir(patient_dir), LOCK_FILENAME), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        held[key] = 1
+        try:
+            yield
+        finally:
+            held.pop(key, None)
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
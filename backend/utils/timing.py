@@ -0,0 +1,97 @@
+"""
+Request Timing Spans
+
+Lightweight per-request timing breakdown, reported as a Server-Timing header
+(visible in the browser's network panel) and optionally logged:
+
+    Server-Timing: registry;dur=0.4, listdir;dur=1.9;desc="x6", serialize;dur=0.2, total;dur=3.1
+
+Spans are collected in a context variable, so helpers such as
+load_patient_registry or the LLM request code can be wrapped with span() or
+@timed without passing anything through their signatures, and concurrent
+requests (threads or asyncio tasks) never mix their spans. Outside a request
+span() does nothing beyond two perf_counter calls.
+
+Repeated spans with the same name (one file read per summary, say) are summed
+and their count is shown in desc; spans that overlap (the two concurrent calls
+of compare_time_periods_async) can add up to more than the total.
+
+Set SERVER_TIMING_LOG_MS to log the breakdown of requests at least that slow
+(0 logs every request); it is logged at WARNING so it shows up without any
+logging configuration.
+"""
+import contextvars
+import functools
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+_spans = contextvars.ContextVar('server_timing_spans', default=None)
+
+
+def log_threshold_ms():
+    value = os.getenv('SERVER_TIMING_LOG_MS')
+    return float(value) if value not in (None, '') else None
+
+
+def start_request():
+    """
+    Begin collecting spans for the current request
+
+    Returns:
+        Tuple (token for finish_request, spans dict {name: [milliseconds, count]})
+    """
+    spans = {}
+    return _spans.set(spans), spans
+
+
+def finish_request(token):
+    """Stop collecting spans in this context"""
+    _spans.reset(token)
+
+
+@contextmanager
+def span(name):
+    """Time a block under `name` if a request is being timed"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        spans = _spans.get()
+        if spans is not None:
+            record = spans.setdefault(name, [0.0, 0])
+            record[0] += (time.perf_counter() - started) * 1000
+            record[1] += 1
+
+
+def timed(name):
+    """Decorator form of span()"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def server_timing_header(spans, total_ms):
+    """Format spans plus the request total as a Server-Timing header value"""
+    parts = []
+    for name, (duration_ms, count) in spans.items():
+        part = f"{name};dur={duration_ms:.1f}"
+        if count > 1:
+            part += f';desc="x{count}"'
+        parts.append(part)
+    parts.append(f"total;dur={total_ms:.1f}")
+    return ', '.join(parts)
+
+
+def log_request(method, path, status, header, total_ms):
+    """Log a request's breakdown if it is over SERVER_TIMING_LOG_MS"""
+    threshold = log_threshold_ms()
+    if threshold is not None and total_ms >= threshold:
+        logger.warning("Server-Timing %s %s %s: %s", method, path, status, header)
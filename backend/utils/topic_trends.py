@@ -0,0 +1,226 @@
+"""
+Topic Trend Aggregation
+
+Turns the per-week `key_topics` produced by the weekly analysis into a
+per-patient topic x week count matrix, so trends like "work" or "family" can
+be charted over months without another LLM call. Topic names are canonicalized
+("Job stress", "career" and "Work" all count as "work") and the matrix is
+updated incrementally each time a summary is written.
+
+Storage: data/<patient_id>/.derived/topics.json
+"""
+import json
+import os
+import re
+
+from utils.storage import derived_dir, patient_lock, summary_week_range, write_json
+
+STORE_VERSION = 1
+STORE_FILENAME = 'topics.json'
+
+# Canonical topic -> spellings the model tends to use for it
+TOPIC_ALIASES = {
+    'work': ('work', 'job', 'jobs', 'career', 'workplace', 'employment', 'office', 'work stress',
+             'work-life balance', 'work life balance', 'productivity', 'boss', 'coworkers', 'colleagues'),
+    'family': ('family', 'family relationships', 'family dynamics', 'parents', 'mother', 'father',
+               'mom', 'dad', 'siblings', 'children', 'parenting'),
+    'relationships': ('relationships', 'relationship', 'romantic relationships', 'partner', 'dating',
+                      'marriage', 'spouse'),
+    'friendship': ('friendship', 'friendships', 'friends', 'social support'),
+    'social': ('social', 'social life', 'social interactions', 'social isolation', 'isolation',
+               'loneliness', 'socializing'),
+    'self-worth': ('self-worth', 'self worth', 'self-esteem', 'self esteem', 'self-image',
+                   'self-criticism', 'self criticism', 'perfectionism'),
+    'anxiety': ('anxiety', 'anxiousness', 'worry', 'panic', 'panic attacks', 'stress'),
+    'mood': ('mood', 'mental health', 'depression', 'sadness', 'low mood', 'emotions', 'emotional state'),
+    'grief': ('grief', 'loss', 'bereavement', 'mourning', 'death'),
+    'sleep': ('sleep', 'sleep issues', 'insomnia', 'rest', 'fatigue'),
+    'health': ('health', 'physical health', 'illness', 'medical', 'medication'),
+    'exercise': ('exercise', 'physical activity', 'fitness', 'gym'),
+    'therapy': ('therapy', 'therapy sessions', 'counseling', 'treatment', 'therapeutic homework'),
+    'boundaries': ('boundaries', 'boundary setting', 'setting boundaries'),
+    'coping': ('coping', 'coping strategies', 'coping mechanisms', 'self-care', 'self care', 'mindfulness'),
+}
+_ALIAS_LOOKUP = {alias: canonical for canonical, aliases in TOPIC_ALIASES.items() for alias in aliases}
+
+
+def canonicalize_topic(name):
+    """
+    Normalize a model-produced topic name to a canonical topic
+
+    Args:
+        name: Raw topic string, e.g. "Work Stress" or "family_relationships"
+
+    Returns:
+        Canonical topic name (lowercase), or '' for empty input
+    """
+    topic = re.sub(r'[_/]+', ' ', (name or '').strip().lower())
+    topic = re.sub(r'\s*&\s*', ' and ', topic)
+    topic = re.sub(r'[^a-z0-9\- ]+', '', topic)
+    topic = re.sub(r'\s+', ' ', topic).strip()
+    if not topic:
+        return ''
+
+    if topic in _ALIAS_LOOKUP:
+        return _ALIAS_LOOKUP[topic]
+
+    # Plural fallback ("relationships" -> "relationship") before giving up
+    if topic.endswith('s') and topic[:-1] in _ALIAS_LOOKUP:
+        return _ALIAS_LOOKUP[topic[:-1]]
+
+    # "stress at work", "job stress": prefer a canonical word, then any alias word
+    words = topic.replace('-', ' ').split()
+    for word in words:
+        if word in TOPIC_ALIASES:
+            return word
+    for word in words:
+        if word in _ALIAS_LOOKUP:
+            return _ALIAS_LOOKUP[word]
+
+    return topic
+
+
+def _store_path(patient_dir):
+    return os.path.join(derived_dir(patient_dir), STORE_FILENAME)
+
+
+def _week_column(summary):
+    """Canonical topic -> {"count", "sentiment", "raw"} for one summary"""
+    column = {}
+    for item in summary.get('key_topics', []):
+        topic = canonicalize_topic(item.get('topic'))
+        if not topic:
+            continue
+        try:
+            count = int(item.get('count', 1) or 0)
+        except (TypeError, ValueError):
+            count = 1
+        cell = column.setdefault(topic, {"count": 0, "sentiment": item.get('sentiment'), "raw": []})
+        cell['count'] += count
+        if item.get('topic') not in cell['raw']:
+            cell['raw'].append(item.get('topic'))
+    return column
+
+
+def _empty_store():
+    return {"version": STORE_VERSION, "weeks": {}}
+
+
+def _load_store(patient_dir):
+    path = _store_path(patient_dir)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        store = json.load(f)
+    return store if store.get('version') == STORE_VERSION else None
+
+
+def build_topic_store(patient_dir):
+    """Rebuild a patient's topic matrix from every summary on disk (caller holds the patient lock)"""
+    store = _empty_store()
+    for filename in sorted(os.listdir(patient_dir)):
+        week_range = summary_week_range(filename)
+        if not week_range:
+            continue
+        week_start, week_end = week_range
+        with open(os.path.join(patient_dir, filename), 'r') as f:
+            summary = json.load(f)
+        store['weeks'][week_start] = {"week_end": week_end, "topics": _week_column(summary)}
+    write_json(_store_path(patient_dir), store, indent=None)
+    return store
+
+
+def record_summary_topics(patient_dir, filename, summary):
+    """
+    Replace one week's column in the topic matrix after a summary is written
+
+    Called by the write paths with the patient lock held.
+
+    Args:
+        patient_dir: Patient data directory
+        filename: Summary filename (summary_<start>_to_<end>.json)
+        summary: The saved analysis dictionary
+    """
+    week_range = summary_week_range(filename)
+    if not week_range:
+        return
+    week_start, week_end = week_range
+
+    store = _load_store(patient_dir)
+    if store is None:
+        # The new summary is already on disk, so a full build includes it
+        build_topic_store(patient_dir)
+        return
+    store['weeks'][week_start] = {"week_end": week_end, "topics": _week_column(summary)}
+    write_json(_store_path(patient_dir), store, indent=None)
+
+
+def load_topic_store(patient_dir):
+    """
+    Current topic matrix for a read path, building it first if missing or outdated
+
+    The build runs under the patient lock and re-checks once the lock is held,
+    so a read never saves a listing older than a concurrent writer's update.
+    """
+    store = _load_store(patient_dir)
+    if store is None:
+        with patient_lock(patient_dir):
+            store = _load_store(patient_dir) or build_topic_store(patient_dir)
+    return store
+
+
+def get_topic_series(patient_dir, start=None, end=None, top=None, topics=None):
+    """
+    Topic x week count matrix for a patient
+
+    Args:
+        patient_dir: Patient data directory
+        start: Optional first week start (YYYY-MM-DD, inclusive)
+        end: Optional last week start (YYYY-MM-DD, inclusive)
+        top: Optional number of topics to keep, ranked by total count in range
+        topics: Optional list of topic names to restrict to (canonicalized)
+
+    Returns:
+        Dictionary with the week axis and one row per topic
+    """
+    store = load_topic_store(patient_dir)
+
+    weeks = sorted(
+        week for week in store['weeks']
+        if (not start or week >= start) and (not end or week <= end)
+    )
+    wanted = {canonicalize_topic(topic) for topic in topics} if topics else None
+
+    rows = {}
+    for column, week in enumerate(weeks):
+        for topic, cell in store['weeks'][week]['topics'].items():
+            if wanted is not None and topic not in wanted:
+                continue
+            row = rows.setdefault(topic, {
+                "topic": topic,
+                "counts": [0] * len(weeks),
+                "sentiment": [None] * len(weeks),
+                "aliases": set()
+            })
+            row['counts'][column] = cell['count']
+            row['sentiment'][column] = cell.get('sentiment')
+            row['aliases'].update(alias for alias in cell.get('raw', []) if alias)
+
+    series = []
+    for row in rows.values():
+        row['total'] = sum(row['counts'])
+        row['weeks_present'] = sum(1 for count in row['counts'] if count)
+        row['aliases'] = sorted(row['aliases'])
+        series.append(row)
+
+    series.sort(key=lambda row: (-row['total'], row['topic']))
+    if top:
+        series = series[:top]
+
+    return {
+        "weeks": [
+            {"week_start": week, "week_end": store['weeks'][week].get('week_end')}
+            for week in weeks
+        ],
+        "topics": series
+    }
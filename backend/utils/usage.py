@@ -0,0 +1,210 @@
+"""
+LLM Usage Ledger
+
+Append-only record of every LLM call, kept so expensive code paths and
+per-patient spend can be found after the fact:
+
+    data/.usage/usage-YYYY-MM.jsonl
+
+One JSON line per call: time, day, patient, endpoint, analyzer, model,
+prompt/completion/cached tokens, latency, estimated cost and outcome. Each line
+is written with a single O_APPEND write, so gunicorn workers and background
+runners can share the file without a lock. Files rotate monthly to keep range
+queries cheap.
+
+The patient and endpoint are not threaded through the analyzer signatures:
+callers set them with usage_context() (the Flask request hooks, the ASGI
+middleware, the background runners) and record_usage() reads them back.
+"""
+import contextvars
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+USAGE_DIRNAME = '.usage'
+GROUP_BY_FIELDS = ('patient', 'therapist', 'day', 'model', 'endpoint')
+
+# USD per million tokens: (input, cached input, output); matched by longest model prefix
+MODEL_PRICES = {
+    'gpt-4o-mini': (0.15, 0.075, 0.60),
+    'gpt-4o': (2.50, 1.25, 10.00),
+    'gpt-4.1-mini': (0.40, 0.10, 1.60),
+    'gpt-4.1': (2.00, 0.50, 8.00),
+}
+
+_context = contextvars.ContextVar('usage_context', default={})
+
+
+def ledger_dir():
+    """Ledger directory: USAGE_LEDGER_DIR, else .usage under the data directory"""
+    base_data_dir = os.getenv('BASE_DATA_DIR') or os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
+    return os.getenv('USAGE_LEDGER_DIR') or os.path.join(base_data_dir, USAGE_DIRNAME)
+
+
+def set_usage_context(**fields):
+    """Attribute later LLM calls in this context to these fields; returns a token for reset_usage_context"""
+    return _context.set({**_context.get(), **{k: v for k, v in fields.items() if v is not None}})
+
+
+def reset_usage_context(token):
+    _context.reset(token)
+
+
+@contextmanager
+def usage_context(**fields):
+    """Attribute LLM calls made inside the block (patient_id, endpoint) to these fields"""
+    token = set_usage_context(**fields)
+    try:
+        yield
+    finally:
+        reset_usage_context(token)
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens, cached_tokens=0):
+    """Estimated USD cost of one call; None for models without a price"""
+    matches = [name for name in MODEL_PRICES if (model or '').startswith(name)]
+    if not matches:
+        return None
+    input_price, cached_price, output_price = MODEL_PRICES[max(matches, key=len)]
+    cost = ((prompt_tokens - cached_tokens) * input_price + cached_tokens * cached_price
+            + completion_tokens * output_price) / 1_000_000
+    return round(cost, 6)
+
+
+def record_usage(analyzer, model, started, response=None, outcome='ok', patient_id=None):
+    """
+    Append one LLM call to the ledger
+
+    Args:
+        analyzer: Calling analyzer ("weekly", "long_term")
+        model: Requested model
+        started: time.perf_counter() value taken before the call
+        response: Chat completion response (for token usage), if any
+        outcome: "ok" or "error"
+        patient_id: Patient to charge (default: from usage_context)
+
+    A ledger that cannot be written is logged, never raised: usage tracking must
+    not fail an analysis.
+    """
+    usage = getattr(response, 'usage', None)
+    prompt_tokens = getattr(usage, 'prompt_tokens', None) or 0
+    completion_tokens = getattr(usage, 'completion_tokens', None) or 0
+    cached_tokens = getattr(getattr(usage, 'prompt_tokens_details', None), 'cached_tokens', None) or 0
+    now = datetime.now(timezone.utc)
+    context = _context.get()
+
+    record = {
+        "ts": now.isoformat(timespec='seconds'),
+        "day": now.date().isoformat(),
+        "patient_id": patient_id or context.get('patient_id'),
+        "endpoint": context.get('endpoint'),
+        "analyzer": analyzer,
+        "model": model,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "cached_tokens": cached_tokens,
+        "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+        "cost_usd": estimate_cost(model, prompt_tokens, completion_tokens, cached_tokens),
+        "outcome": outcome
+    }
+
+    directory = ledger_dir()
+    line = (json.dumps(record, separators=(',', ':')) + '\n').encode('utf-8')
+    try:
+        os.makedirs(directory, exist_ok=True)
+        fd = os.open(os.path.join(directory, f"usage-{now:%Y-%m}.jsonl"), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+    except OSError:
+        logger.exception("Could not write LLM usage record")
+
+
+def _month_files(directory, start, end):
+    if not os.path.isdir(directory):
+        return []
+    first = start[:7] if start else ''
+    last = end[:7] if end else '9999-99'
+    return sorted(
+        os.path.join(directory, filename)
+        for filename in os.listdir(directory)
+        if filename.startswith('usage-') and filename.endswith('.jsonl')
+        and first <= filename[len('usage-'):-len('.jsonl')] <= last
+    )
+
+
+def load_usage(start=None, end=None):
+    """Ledger records with start <= day <= end (YYYY-MM-DD, both optional)"""
+    records = []
+    for path in _month_files(ledger_dir(), start, end):
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # A line cut short by a crash mid-write
+                if (not start or record['day'] >= start) and (not end or record['day'] <= end):
+                    records.append(record)
+    return records
+
+
+def summarize_usage(records, group_by='patient', therapist_of=None):
+    """
+    Aggregate ledger records
+
+    Args:
+        records: Records from load_usage
+        group_by: One of GROUP_BY_FIELDS
+        therapist_of: Mapping patient_id -> therapist (needed for "therapist")
+
+    Returns:
+        Dictionary with overall totals and one row per group, most expensive first
+        ("day" groups are in date order)
+    """
+    if group_by not in GROUP_BY_FIELDS:
+        raise ValueError(f"group_by must be one of {', '.join(GROUP_BY_FIELDS)}")
+    therapist_of = therapist_of or {}
+
+    def key_of(record):
+        if group_by == 'therapist':
+            return therapist_of.get(record.get('patient_id'))
+        if group_by == 'patient':
+            return record.get('patient_id')
+        return record.get(group_by)
+
+    def empty():
+        return {"calls": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0,
+                "cost_usd": 0.0, "latency_ms_total": 0.0}
+
+    totals = empty()
+    groups = defaultdict(empty)
+    for record in records:
+        for row in (totals, groups[key_of(record)]):
+            row['calls'] += 1
+            row['errors'] += record.get('outcome') != 'ok'
+            for field in ('prompt_tokens', 'completion_tokens', 'cached_tokens'):
+                row[field] += record.get(field) or 0
+            row['cost_usd'] += record.get('cost_usd') or 0.0
+            row['latency_ms_total'] += record.get('latency_ms') or 0.0
+
+    def finish(row):
+        latency_total = row.pop('latency_ms_total')
+        row['cost_usd'] = round(row['cost_usd'], 4)
+        row['latency_ms_avg'] = round(latency_total / row['calls'], 1) if row['calls'] else 0.0
+        return row
+
+    rows = [dict(finish(row), key=key) for key, row in groups.items()]
+    if group_by == 'day':
+        rows.sort(key=lambda row: row['key'] or '')
+    else:
+        rows.sort(key=lambda row: row['cost_usd'], reverse=True)
+
+    return {"group_by": group_by, "totals": finish(totals), "groups": rows}
+
@@ -0,0 +1,257 @@
+"""
+Weekly Pipeline Steps
+
+The aggregate -> analyze -> save steps for one patient-week, shared by the
+Flask routes and the background re-analysis scheduler so every path writes
+the same files and refreshes the same derived indexes.
+"""
+import json
+import os
+from datetime import datetime
+
+from anyio import to_thread
+
+from utils.analyzer import (
+    analyze_weekly_entries,
+    analyze_weekly_entries_async,
+    analyze_weekly_update,
+    analyze_weekly_update_async,
+)
+from utils.indexing import on_entries_written, on_summary_written
+from utils.single_flight import flight_key, run_single_flight, run_single_flight_async
+from utils.storage import load_entries_in_range, patient_lock, write_json
+from utils.timing import span
+from utils.usage import usage_context
+
+ANALYSIS_MODES = ('auto', 'full')
+
+
+def _patient_of(patient_dir):
+    return os.path.basename(os.path.normpath(patient_dir))
+
+
+def _data_dir_of(patient_dir, base_data_dir):
+    return base_data_dir or os.path.dirname(os.path.normpath(patient_dir))
+
+
+def week_filename(week_start, week_end):
+    return f"week_{week_start}_to_{week_end}.json"
+
+
+def summary_filename(week_start, week_end):
+    return f"summary_{week_start}_to_{week_end}.json"
+
+
+def build_weekly_data(patient_dir, patient_id, week_start, week_end, new_entries=()):
+    """
+    Weekly data from the entries on disk merged with entries not yet saved
+
+    Reads the date range with a single directory scan and writes nothing, so a
+    pipeline can carry freshly converted entries in memory until one batched
+    write at the end (see persist_week).
+
+    Args:
+        patient_dir: Patient data directory
+        patient_id: Patient identifier stored in the weekly data
+        week_start, week_end: Inclusive date range (YYYY-MM-DD)
+        new_entries: Unsaved entries; they replace on-disk entries with the same date
+
+    Returns:
+        Weekly data dictionary with entries in date order
+    """
+    # Validate the range before touching the disk
+    datetime.strptime(week_start, '%Y-%m-%d')
+    datetime.strptime(week_end, '%Y-%m-%d')
+
+    in_range = {entry['date']: entry for entry in new_entries if week_start <= entry['date'] <= week_end}
+    entries = load_entries_in_range(patient_dir, week_start, week_end, exclude_dates=in_range)
+    entries.extend(in_range.values())
+    entries.sort(key=lambda entry: entry['date'])
+
+    return {
+        "patient_id": patient_id,
+        "week_start": week_start,
+        "week_end": week_end,
+        "entries": entries
+    }
+
+
+def aggregate_week_entries(patient_dir, patient_id, week_start, week_end):
+    """
+    Collect the daily entries in a date range and write the weekly file
+
+    Args:
+        patient_dir: Patient data directory
+        patient_id: Patient identifier stored in the weekly file
+        week_start, week_end: Inclusive date range (YYYY-MM-DD)
+
+    Returns:
+        The weekly data dictionary that was written
+    """
+    # Hold the lock so the weekly file matches the entries on disk
+    with patient_lock(patient_dir):
+        weekly_data = build_weekly_data(patient_dir, patient_id, week_start, week_end)
+        write_json(os.path.join(patient_dir, week_filename(week_start, week_end)), weekly_data)
+    return weekly_data
+
+
+def persist_week(patient_dir, weekly_data, new_entries=(), analysis=None, base_data_dir=None):
+    """
+    Write new entries, the weekly file and the summary in one locked batch
+
+    The summary is only written for a successful, changed analysis; entries and
+    the weekly file are saved even when the analysis failed.
+
+    Args:
+        patient_dir: Patient data directory
+        weekly_data: Weekly data built by build_weekly_data
+        new_entries: Entries to save as daily files
+        analysis: Optional analysis result for the week
+        base_data_dir: Data directory holding the patient directories (for the
+            cohort archive); defaults to the parent of patient_dir
+    """
+    filename = summary_filename(weekly_data['week_start'], weekly_data['week_end'])
+    save_summary = bool(analysis) and 'error' not in analysis and analysis.get('analysis_mode') != 'unchanged'
+
+    with span('write'), patient_lock(patient_dir):
+        for entry in new_entries:
+            write_json(os.path.join(patient_dir, f"{entry['date']}.json"), entry)
+        write_json(os.path.join(patient_dir, week_filename(weekly_data['week_start'], weekly_data['week_end'])),
+                   weekly_data)
+        if save_summary:
+            write_json(os.path.join(patient_dir, filename), analysis)
+
+        if new_entries:
+            on_entries_written(patient_dir, list(new_entries))
+        if save_summary:
+            on_summary_written(patient_dir, filename, analysis, weekly_data['patient_id'],
+                               _data_dir_of(patient_dir, base_data_dir))
+
+
+def _previous_summary(patient_dir, weekly_data, mode):
+    """Summary filename and the stored summary to update (None for a full run)"""
+    if mode not in ANALYSIS_MODES:
+        raise ValueError(f"mode must be one of {', '.join(ANALYSIS_MODES)}")
+
+    filename = summary_filename(weekly_data['week_start'], weekly_data['week_end'])
+    summary_filepath = os.path.join(patient_dir, filename)
+
+    previous_analysis = None
+    if mode == 'auto' and os.path.exists(summary_filepath):
+        with open(summary_filepath, 'r') as f:
+            previous_analysis = json.load(f)
+    return filename, previous_analysis
+
+
+def run_weekly_analysis(patient_dir, weekly_data, mode='auto'):
+    """
+    Analyze a week, reusing the stored summary when only a few entries changed
+
+    Args:
+        patient_dir: Patient data directory
+        weekly_data: Aggregated weekly data
+        mode: "auto" (incremental when a summary exists) or "full"
+
+    Returns:
+        Tuple (analysis, summary_filename)
+    """
+    filename, previous_analysis = _previous_summary(patient_dir, weekly_data, mode)
+    with usage_context(patient_id=_patient_of(patient_dir)):
+        if previous_analysis is None:
+            return analyze_weekly_entries(weekly_data), filename
+        return analyze_weekly_update(weekly_data, previous_analysis), filename
+
+
+async def run_weekly_analysis_async(patient_dir, weekly_data, mode='auto'):
+    """Async run_weekly_analysis using the AsyncOpenAI client (the stored summary is read in a worker thread)"""
+    filename, previous_analysis = await to_thread.run_sync(_previous_summary, patient_dir, weekly_data, mode)
+    with usage_context(patient_id=_patient_of(patient_dir)):
+        if previous_analysis is None:
+            return await analyze_weekly_entries_async(weekly_data), filename
+        return await analyze_weekly_update_async(weekly_data, previous_analysis), filename
+
+
+def save_weekly_summary(patient_dir, patient_id, filename, analysis, base_data_dir=None):
+    """Write a summary and refresh derived indexes; unchanged weeks are left as is"""
+    if analysis.get('analysis_mode') == 'unchanged':
+        return
+
+    with span('write'), patient_lock(patient_dir):
+        write_json(os.path.join(patient_dir, filename), analysis)
+        on_summary_written(patient_dir, filename, analysis, patient_id, _data_dir_of(patient_dir, base_data_dir))
+
+
+def _week_flight_key(patient_dir, weekly_data, mode):
+    return flight_key('weekly_analysis', _patient_of(patient_dir),
+                      weekly_data['week_start'], weekly_data['week_end'], mode, weekly_data.get('entries', []))
+
+
+def _save_analysis(patient_dir, weekly_data, filename, analysis, new_entries, base_data_dir):
+    if new_entries is not None:
+        persist_week(patient_dir, weekly_data, new_entries, analysis, base_data_dir)
+    elif 'error' not in analysis:
+        save_weekly_summary(patient_dir, weekly_data['patient_id'], filename, analysis, base_data_dir)
+
+
+def analyze_and_save_week(patient_dir, weekly_data, mode='auto', new_entries=None, base_data_dir=None):
+    """
+    Analyze and save a week, sharing the work between identical concurrent requests
+
+    Duplicate requests (same patient, week, mode and entries) that arrive while
+    the first is still running wait for it and return its analysis instead of
+    making another LLM call (see utils/single_flight.py).
+
+    Args:
+        patient_dir: Patient data directory
+        weekly_data: Weekly data to analyze
+        mode: "auto" or "full"
+        new_entries: Optional unsaved entries; when given (even empty), the
+            entries, weekly file and summary are written together by persist_week.
+            Entries and the weekly file are written even if the analysis raises.
+        base_data_dir: Data directory holding the patient directories; defaults
+            to the parent of patient_dir
+
+    Returns:
+        Tuple (analysis, summary_filename, shared)
+    """
+    filename = summary_filename(weekly_data['week_start'], weekly_data['week_end'])
+
+    def analyze_and_save():
+        try:
+            analysis, _ = run_weekly_analysis(patient_dir, weekly_data, mode)
+        except Exception:
+            # Keep the converted entries even when the analysis raises
+            if new_entries is not None:
+                persist_week(patient_dir, weekly_data, new_entries, None, base_data_dir)
+            raise
+        _save_analysis(patient_dir, weekly_data, filename, analysis, new_entries, base_data_dir)
+        return analysis
+
+    analysis, shared = run_single_flight(patient_dir, _week_flight_key(patient_dir, weekly_data, mode),
+                                         analyze_and_save)
+    return analysis, filename, shared
+
+
+async def analyze_and_save_week_async(patient_dir, weekly_data, mode='auto', new_entries=None, base_data_dir=None):
+    """
+    Async analyze_and_save_week
+
+    The LLM calls run on the event loop; the locked file writes run in a worker
+    thread so waiting on the patient lock never blocks other requests.
+    """
+    filename = summary_filename(weekly_data['week_start'], weekly_data['week_end'])
+
+    async def analyze_and_save():
+        try:
+            analysis, _ = await run_weekly_analysis_async(patient_dir, weekly_data, mode)
+        except Exception:
+            if new_entries is not None:
+                await to_thread.run_sync(persist_week, patient_dir, weekly_data, new_entries, None, base_data_dir)
+            raise
+        await to_thread.run_sync(_save_analysis, patient_dir, weekly_data, filename, analysis, new_entries,
+                                 base_data_dir)
+        return analysis
+
+    analysis, shared = await run_single_flight_async(patient_dir, _week_flight_key(patient_dir, weekly_data, mode),
+                                                     analyze_and_save)
+    return analysis, filename, shared
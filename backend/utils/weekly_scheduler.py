@@ -0,0 +1,277 @@
+"""
+Scheduled Weekly Analysis
+
+Closes each patient's week at local midnight in the patient's registry
+`timezone` and pre-computes the weekly summary before the next session.
+
+Load is spread in two ways: patients in different timezones close their weeks
+at different UTC times, and each patient gets a stable offset within
+WEEKLY_SCHEDULER_SPREAD_HOURS after midnight (hashed from the patient id), so a
+caseload in one timezone does not all hit the LLM at 00:00.
+
+The runner is a polling thread rather than one timer per patient: every tick it
+works out which patients have a closed, not-yet-analyzed week, which also
+catches up on weeks missed while the server was down. Under gunicorn every
+worker starts the thread but only the one holding an flock on
+data/.weekly_scheduler.lock runs weeks; if it exits another worker takes over.
+Progress is stored in data/.weekly_scheduler.json.
+
+The scheduler is opt-in (WEEKLY_SCHEDULER_ENABLED=true) and is started from the
+server's startup hook (see app.start_background_runners), never at import.
+"""
+import fcntl
+import json
+import logging
+import os
+import threading
+import zlib
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from utils.auto_analysis import calendar_week, refresh_week
+from utils.storage import DAILY_ENTRY_PATTERN, write_json
+from utils.usage import usage_context
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SPREAD_HOURS = 6
+DEFAULT_TICK_SECONDS = 60
+DEFAULT_RETRY_SECONDS = 900
+LOCK_FILENAME = '.weekly_scheduler.lock'
+STATE_FILENAME = '.weekly_scheduler.json'
+
+
+def patient_zone(patient):
+    """ZoneInfo for a registry record, falling back to UTC for missing/unknown zones"""
+    try:
+        return ZoneInfo(patient.get('timezone') or 'UTC')
+    except (ZoneInfoNotFoundError, ValueError):
+        logger.warning("Unknown timezone %r for %s; using UTC", patient.get('timezone'), patient.get('id'))
+        return timezone.utc
+
+
+def spread_offset(patient_id, spread_seconds):
+    """Stable per-patient delay after local midnight"""
+    if spread_seconds <= 0:
+        return timedelta(0)
+    return timedelta(seconds=zlib.crc32(patient_id.encode('utf-8')) % int(spread_seconds))
+
+
+def due_week(patient, now_utc, spread_seconds, week_start_day=None):
+    """
+    Most recent week whose scheduled run time has passed
+
+    Args:
+        patient: Registry record with "id" and optional "timezone"
+        now_utc: Current aware datetime
+        spread_seconds: Width of the post-midnight spread window
+        week_start_day: Optional weekday name overriding WEEK_START_DAY
+
+    Returns:
+        Tuple (week_start, week_end, run_at_utc) with dates as YYYY-MM-DD
+    """
+    zone = patient_zone(patient)
+    offset = spread_offset(patient['id'], spread_seconds)
+    local_today = now_utc.astimezone(zone).date()
+    current_start, _ = calendar_week(local_today, week_start_day)
+
+    # The previous week closes at local midnight on the current week's first day
+    week_start = current_start - timedelta(days=7)
+    run_at = datetime(current_start.year, current_start.month, current_start.day, tzinfo=zone) + offset
+    if now_utc < run_at:
+        week_start -= timedelta(days=7)
+        run_at -= timedelta(days=7)
+
+    week_end = week_start + timedelta(days=6)
+    return week_start.isoformat(), week_end.isoformat(), run_at.astimezone(timezone.utc)
+
+
+class WeeklyAnalysisScheduler:
+    """Leader-elected polling loop that analyzes each patient's closed week once"""
+
+    def __init__(self, base_data_dir, registry_loader, runner=refresh_week,
+                 spread_hours=DEFAULT_SPREAD_HOURS, tick_seconds=DEFAULT_TICK_SECONDS,
+                 retry_seconds=DEFAULT_RETRY_SECONDS, clock=None):
+        self.base_data_dir = base_data_dir
+        self.registry_loader = registry_loader
+        self.runner = runner
+        self.spread_seconds = float(spread_hours) * 3600
+        self.tick_seconds = float(tick_seconds)
+        self.retry_seconds = float(retry_seconds)
+        self.clock = clock or (lambda: datetime.now(timezone.utc))
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.lock_file = None
+        self.runs_total = 0
+        self.skipped_total = 0
+        self.failures_total = 0
+
+    @property
+    def state_path(self):
+        return os.path.join(self.base_data_dir, STATE_FILENAME)
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def is_leader(self):
+        return self.lock_file is not None
+
+    def _try_become_leader(self):
+        if self.lock_file is not None:
+            return True
+        lock_file = open(os.path.join(self.base_data_dir, LOCK_FILENAME), 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self.lock_file = lock_file
+        return True
+
+    def start(self):
+        """Start the polling thread (idempotent)"""
+        with self.lock:
+            if self.thread is not None:
+                return
+            os.makedirs(self.base_data_dir, exist_ok=True)
+            self.thread = threading.Thread(target=self._loop, name='weekly-analysis-scheduler', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _loop(self):
+        while not self.stop_event.is_set():
+            try:
+                if self._try_become_leader():
+                    self.tick()
+            except Exception:
+                logger.exception("Weekly analysis scheduler tick failed")
+            self.stop_event.wait(self.tick_seconds)
+
+    def tick(self):
+        """Run every patient week that is due; returns the weeks attempted"""
+        now = self.clock()
+        state = self._load_state()
+        attempted = []
+
+        for patient in self.registry_loader():
+            patient_id = patient.get('id')
+            if not patient_id:
+                continue
+
+            week_start, week_end, _ = due_week(patient, now, self.spread_seconds)
+            record = state.get(patient_id, {})
+            if record.get('last_week_start', '') >= week_start:
+                continue
+            if record.get('failed_week_start') == week_start and \
+                    now.timestamp() - record.get('last_attempt', 0) < self.retry_seconds:
+                continue
+
+            attempted.append((patient_id, week_start, week_end))
+            state[patient_id] = self._run_week(patient_id, week_start, week_end, record, now)
+            write_json(self.state_path, state)
+
+        return attempted
+
+    def _run_week(self, patient_id, week_start, week_end, record, now):
+        patient_dir = os.path.join(self.base_data_dir, patient_id)
+        record = {key: value for key, value in record.items() if key != 'failed_week_start'}
+        record['last_attempt'] = now.timestamp()
+
+        if not self._has_entries(patient_dir, week_start, week_end):
+            with self.lock:
+                self.skipped_total += 1
+            record['last_week_start'] = week_start
+            return record
+
+        try:
+            with usage_context(endpoint='weekly_scheduler'):
+                self.runner(patient_id, patient_dir, week_start, week_end)
+        except Exception:
+            logger.exception("Scheduled analysis failed for %s %s to %s", patient_id, week_start, week_end)
+            with self.lock:
+                self.failures_total += 1
+            record['failed_week_start'] = week_start
+            return record
+
+        with self.lock:
+            self.runs_total += 1
+        record['last_week_start'] = week_start
+        record['last_run'] = now.isoformat()
+        return record
+
+    @staticmethod
+    def _has_entries(patient_dir, week_start, week_end):
+        if not os.path.isdir(patient_dir):
+            return False
+        return any(
+            week_start <= filename[:-len('.json')] <= week_end
+            for filename in os.listdir(patient_dir)
+            if DAILY_ENTRY_PATTERN.match(filename)
+        )
+
+    def status(self):
+        """Leader flag, counters and each patient's next scheduled run"""
+        now = self.clock()
+        state = self._load_state()
+        patients = []
+        for patient in self.registry_loader():
+            patient_id = patient.get('id')
+            if not patient_id:
+                continue
+            week_start, week_end, run_at = due_week(patient, now, self.spread_seconds)
+            last_week_start = state.get(patient_id, {}).get('last_week_start')
+            if last_week_start and last_week_start >= week_start:
+                # Already done; the next run closes the current week
+                next_start = date.fromisoformat(week_start) + timedelta(days=7)
+                week_start = next_start.isoformat()
+                week_end = (next_start + timedelta(days=6)).isoformat()
+                run_at += timedelta(days=7)
+            patients.append({
+                "patient_id": patient_id,
+                "timezone": patient.get('timezone') or 'UTC',
+                "next_week_start": week_start,
+                "next_week_end": week_end,
+                "next_run_at": run_at.isoformat(),
+                "last_week_start": last_week_start
+            })
+
+        with self.lock:
+            return {
+                "enabled": weekly_scheduler_enabled(),
+                "leader": self.is_leader(),
+                "spread_hours": self.spread_seconds / 3600,
+                "runs_total": self.runs_total,
+                "skipped_total": self.skipped_total,
+                "failures_total": self.failures_total,
+                "patients": patients
+            }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def weekly_scheduler_enabled():
+    return os.getenv('WEEKLY_SCHEDULER_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+
+
+def get_weekly_scheduler(base_data_dir, registry_loader):
+    """Return the process-wide scheduler, configured from environment variables"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = WeeklyAnalysisScheduler(
+                    base_data_dir,
+                    registry_loader,
+                    spread_hours=float(os.getenv('WEEKLY_SCHEDULER_SPREAD_HOURS', DEFAULT_SPREAD_HOURS)),
+                    tick_seconds=float(os.getenv('WEEKLY_SCHEDULER_TICK_SECONDS', DEFAULT_TICK_SECONDS))
+                )
+    return _scheduler